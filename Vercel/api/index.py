@@ -1,9 +1,27 @@
+import time
+STARTED = time.perf_counter()
+
 import os
-from flask import Flask, jsonify, request, Blueprint
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import json
+import re
+import sys
+import threading
+import click
+from flask import (Flask, jsonify, request, Blueprint, make_response, Response,
+                   g, has_request_context, stream_with_context)
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy import case, event, select, text, update
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from sqlalchemy.pool import NullPool
 from functools import wraps
 
 # Initialize Flask app
@@ -14,18 +32,53 @@ CORS(app, resources={
     r"/api/*": {
         "origins": ["*"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "X-User-ID"]
+        "allow_headers": ["Content-Type", "X-User-ID"],
+        "expose_headers": ["Server-Timing"]
     }
 })
 
 # Database Configuration
-database_uri = os.environ.get('DATABASE_URL_UNPOOLED') or os.environ.get(
-    'DATABASE_URL', 'sqlite:///sweetshop.db')
+#
+# DB_POOL_MODE picks how serverless instances reach Postgres:
+#   pool  - (default) a small pool of direct connections (DATABASE_URL_UNPOOLED)
+#           kept across warm invocations, pinged before use and recycled
+#           before the server or a NAT silently drops them
+#   proxy - every request connects to a pooling proxy (PgBouncer, the Neon or
+#           Supabase pooler) at DATABASE_URL and closes on release (NullPool),
+#           so bursts of instances never hold Postgres connections idle
+# Either way the engine opens no connection until the first query.
+DB_POOL_MODES = ('pool', 'proxy')
+db_pool_mode = os.environ.get('DB_POOL_MODE', 'pool')
+if db_pool_mode not in DB_POOL_MODES:
+    raise RuntimeError(f'DB_POOL_MODE must be one of {", ".join(DB_POOL_MODES)}')
+
+if db_pool_mode == 'proxy':
+    database_uri = os.environ.get('DATABASE_URL', 'sqlite:///sweetshop.db')
+else:
+    database_uri = os.environ.get('DATABASE_URL_UNPOOLED') or os.environ.get(
+        'DATABASE_URL', 'sqlite:///sweetshop.db')
 # Fix postgres:// to postgresql:// for SQLAlchemy
 if database_uri.startswith('postgres://'):
     database_uri = database_uri.replace('postgres://', 'postgresql://', 1)
 
+
+def engine_options(mode, uri):
+    """SQLAlchemy engine options for a DB_POOL_MODE"""
+    if uri.startswith('sqlite'):
+        return {}
+    if mode == 'proxy':
+        return {'poolclass': NullPool}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 1)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 300)),
+        'pool_pre_ping': True
+    }
+
+
 app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(db_pool_mode, database_uri)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get(
     'SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -33,6 +86,28 @@ app.config['SECRET_KEY'] = os.environ.get(
 # Initialize SQLAlchemy
 db = SQLAlchemy(app)
 
+
+@event.listens_for(Engine, 'do_connect')
+def timed_connect(dialect, conn_rec, cargs, cparams):
+    """Open a DBAPI connection and charge the time to the current request"""
+    start = time.perf_counter()
+    connection = dialect.connect(*cargs, **cparams)
+    if has_request_context():
+        g.db_connects = g.get('db_connects', 0) + 1
+        g.db_connect_ms = g.get('db_connect_ms', 0.0) + (
+            time.perf_counter() - start) * 1000
+    return connection
+
+
+@app.after_request
+def add_connect_timing(response):
+    """Report new-connection time so the DB_POOL_MODE choice can be measured"""
+    response.headers.add(
+        'Server-Timing',
+        f'db-connect;dur={g.get("db_connect_ms", 0.0):.1f};'
+        f'desc="{db_pool_mode} x{g.get("db_connects", 0)}"')
+    return response
+
 # Models
 
 
@@ -46,11 +121,15 @@ class Sweet(db.Model):
     price = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Integer, default=0)
     category = db.Column(db.String(50))
-    image_url = db.Column(db.String(100000))
+    image_url = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_sweets_user_id_category', 'user_id', 'category'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -66,6 +145,17 @@ class Sweet(db.Model):
         }
 
 
+class Image(db.Model):
+    __tablename__ = 'images'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    content_type = db.Column(db.String(100), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    thumbnail = db.Column(db.LargeBinary)
+    thumbnail_type = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class Customer(db.Model):
     __tablename__ = 'customers'
 
@@ -100,7 +190,7 @@ class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(128), nullable=False, index=True)
     customer_id = db.Column(db.Integer, db.ForeignKey(
-        'customers.id'), nullable=False)
+        'customers.id'), nullable=False, index=True)
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')
     order_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -108,6 +198,11 @@ class Order(db.Model):
     order_items = db.relationship(
         'OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_orders_user_id_status', 'user_id', 'status'),
+        db.Index('ix_orders_user_id_order_date', 'user_id', 'order_date', 'id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -126,9 +221,9 @@ class OrderItem(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey(
-        'orders.id'), nullable=False)
+        'orders.id'), nullable=False, index=True)
     sweet_id = db.Column(db.Integer, db.ForeignKey(
-        'sweets.id'), nullable=False)
+        'sweets.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
 
@@ -167,6 +262,311 @@ def require_auth(f):
     return decorated_function
 
 
+# Image store
+IMAGE_URL_PREFIX = '/api/images/'
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+THUMBNAIL_SIZE = (320, 320)
+CACHE_MAX_AGE = 365 * 24 * 3600
+# Served back from the API origin, so only raster formats whose bytes are
+# checked: SVG and anything else that can carry script is refused
+IMAGE_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp')
+TYPE_ALIASES = {'image/jpg': 'image/jpeg', 'image/pjpeg': 'image/jpeg'}
+
+DATA_URL_RE = re.compile(
+    r'^data:(?P<type>image/[\w.+-]+)(?:;[\w=-]+)*;base64,(?P<data>.*)$', re.S)
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ImageError(Exception):
+    """Raised for uploads that are not acceptable images"""
+
+
+def parse_data_url(value):
+    """Split a base64 image data URL into (content_type, bytes)"""
+    match = DATA_URL_RE.match(value)
+    if not match:
+        raise ImageError('Only base64 image data URLs are supported')
+    try:
+        data = base64.b64decode(match.group('data'), validate=True)
+    except (binascii.Error, ValueError):
+        raise ImageError('Invalid base64 image data')
+    return match.group('type'), data
+
+
+def sniff_image_type(data):
+    """Content type given by the image's magic bytes, or None"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def make_thumbnail(data):
+    """Decode an image and downscale it to THUMBNAIL_SIZE.
+
+    Decoding doubles as validation. Pillow is imported on first use so it
+    stays off the cold-start path.
+    """
+    from PIL import Image as PILImage
+    try:
+        with PILImage.open(io.BytesIO(data)) as img:
+            img.thumbnail(THUMBNAIL_SIZE)
+            out = io.BytesIO()
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img.save(out, format='PNG', optimize=True)
+                return out.getvalue(), 'image/png'
+            img.convert('RGB').save(out, format='JPEG', quality=85)
+            return out.getvalue(), 'image/jpeg'
+    except Exception:
+        raise ImageError('Image data could not be decoded')
+
+
+def store_image(data, content_type):
+    """Store image bytes once under their SHA-256 and return the hash"""
+    content_type = TYPE_ALIASES.get(content_type, content_type)
+    if content_type not in IMAGE_TYPES:
+        raise ImageError('Image must be PNG, JPEG, GIF or WebP')
+    if not data:
+        raise ImageError('Image is empty')
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ImageError('Image is larger than 5 MB')
+    if sniff_image_type(data) != content_type:
+        raise ImageError(f'File is not a valid {content_type} image')
+
+    digest = hashlib.sha256(data).hexdigest()
+    if db.session.get(Image, digest) is None:
+        thumbnail, thumbnail_type = make_thumbnail(data)
+        db.session.add(Image(
+            hash=digest,
+            content_type=content_type,
+            data=data,
+            thumbnail=thumbnail,
+            thumbnail_type=thumbnail_type
+        ))
+    return digest
+
+
+def image_reference(value):
+    """Replace an inline data URL with a short /api/images/<hash> reference"""
+    if not value or not value.startswith('data:'):
+        return value
+    content_type, data = parse_data_url(value)
+    return IMAGE_URL_PREFIX + store_image(data, content_type)
+
+
+# Inventory
+class StockError(ValueError):
+    """Raised when order lines are invalid or cannot be fulfilled"""
+
+
+def parse_order_lines(items):
+    """Validate order items into an insertion-ordered {sweet_id: quantity}"""
+    if not isinstance(items, (list, type(None))):
+        raise StockError('items must be a list')
+    lines = {}
+    for item in items or []:
+        try:
+            sweet_id = int(item['sweet_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise StockError('Each item needs an integer sweet_id and quantity')
+        if quantity < 1:
+            raise StockError(f'Quantity for sweet {sweet_id} must be positive')
+        if sweet_id in lines:
+            raise StockError(f'Duplicate sweet_id {sweet_id} in order items')
+        lines[sweet_id] = quantity
+    return lines
+
+
+def reserve_stock(user_id, lines):
+    """Look up and decrement stock for every order line in two statements.
+
+    The sweets are fetched with a single IN query (row-locked in id order on
+    databases that support SELECT ... FOR UPDATE) and decremented with one
+    conditional UPDATE that only touches rows still holding enough stock.
+    A rowcount short of the number of lines means another checkout got
+    there first, so the caller's transaction must be rolled back.
+
+    Returns {sweet_id: Sweet} with the ids, names and prices used to price
+    the order.
+    """
+    if not lines:
+        return {}
+    sweets = {sweet.id: sweet for sweet in (
+        Sweet.query
+        .options(load_only(Sweet.id, Sweet.name, Sweet.price, Sweet.quantity))
+        .filter(Sweet.user_id == user_id, Sweet.id.in_(lines))
+        .order_by(Sweet.id)
+        .with_for_update()
+        .all())}
+    for sweet_id in lines:
+        if sweet_id not in sweets:
+            raise StockError(f'Sweet with ID {sweet_id} not found')
+
+    needed = case(lines, value=Sweet.id)
+    result = db.session.execute(
+        update(Sweet)
+        .where(Sweet.user_id == user_id,
+               Sweet.id.in_(lines),
+               Sweet.quantity >= needed)
+        .values(quantity=Sweet.quantity - needed)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(lines):
+        short = [sweets[sweet_id].name for sweet_id, quantity in lines.items()
+                 if sweets[sweet_id].quantity < quantity]
+        raise StockError(
+            f"Insufficient stock for {', '.join(short) or 'one or more sweets'}")
+    return sweets
+
+
+def restore_stock(lines):
+    """Atomically add order line quantities back to their sweets"""
+    if not lines:
+        return
+    db.session.execute(
+        update(Sweet)
+        .where(Sweet.id.in_(lines))
+        .values(quantity=Sweet.quantity + case(lines, value=Sweet.id))
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Order export
+EXPORT_BATCH_SIZE = 1000
+FLUSH_ROWS = 500
+
+CSV_COLUMNS = (
+    'order_id', 'order_date', 'status', 'total_amount',
+    'customer_id', 'customer_name', 'customer_email',
+    'item_id', 'sweet_id', 'sweet_name', 'quantity', 'price', 'subtotal'
+)
+
+
+class ExportError(Exception):
+    """Raised for invalid export parameters"""
+
+
+def parse_date_range(date_from, date_to):
+    """Parse ISO from/to bounds; a bare `to` date includes that whole day"""
+    try:
+        start = datetime.fromisoformat(date_from) if date_from else None
+        end = datetime.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        raise ExportError('from and to must be ISO 8601 dates')
+    if end is not None and len(date_to) == 10:
+        end += timedelta(days=1)
+    return start, end
+
+
+def export_rows(user_id, start=None, end=None):
+    """Stream one row per order line, joined with its order, customer and sweet.
+
+    Orders without lines still yield one row with empty item columns. The
+    result is read in EXPORT_BATCH_SIZE batches from a server-side cursor
+    where the driver supports one.
+    """
+    stmt = (
+        select(Order.id, Order.order_date, Order.status, Order.total_amount,
+               Customer.id, Customer.name, Customer.email,
+               OrderItem.id, OrderItem.sweet_id, Sweet.name,
+               OrderItem.quantity, OrderItem.price)
+        .select_from(Order)
+        .join(Customer, Customer.id == Order.customer_id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Sweet, Sweet.id == OrderItem.sweet_id)
+        .where(Order.user_id == user_id)
+        .order_by(Order.order_date, Order.id, OrderItem.id)
+    )
+    if start is not None:
+        stmt = stmt.where(Order.order_date >= start)
+    if end is not None:
+        stmt = stmt.where(Order.order_date < end)
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        quantity, price = row[10], row[11]
+        yield tuple(row) + (
+            quantity * price if quantity is not None else None,)
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow((row[0], row[1].isoformat()) + row[2:])
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    """One JSON object per order, with its lines nested under items"""
+    lines = []
+    order = None
+    for row in rows:
+        if order is None or order['id'] != row[0]:
+            if order is not None:
+                lines.append(json.dumps(order) + '\n')
+                if len(lines) >= FLUSH_ROWS:
+                    yield ''.join(lines)
+                    lines = []
+            order = {
+                'id': row[0],
+                'order_date': row[1].isoformat(),
+                'status': row[2],
+                'total_amount': row[3],
+                'customer': {'id': row[4], 'name': row[5], 'email': row[6]},
+                'items': []
+            }
+        if row[7] is not None:
+            order['items'].append({
+                'id': row[7], 'sweet_id': row[8], 'sweet_name': row[9],
+                'quantity': row[10], 'price': row[11], 'subtotal': row[12]
+            })
+    if order is not None:
+        lines.append(json.dumps(order) + '\n')
+    yield ''.join(lines)
+
+
+def export_response(user_id, fmt, date_from=None, date_to=None):
+    """Streaming attachment of the tenant's orders in csv or ndjson"""
+    if fmt not in ('csv', 'ndjson'):
+        raise ExportError('format must be csv or ndjson')
+    start, end = parse_date_range(date_from, date_to)
+    rows = export_rows(user_id, start, end)
+    if fmt == 'csv':
+        body, mimetype = csv_chunks(rows), 'text/csv'
+    else:
+        body, mimetype = ndjson_chunks(rows), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=orders.{fmt}'}
+    )
+
+
+def order_query(user_id):
+    """Order query that eager-loads everything Order.to_dict() touches.
+
+    The customer is joined into the main SELECT and the line items are
+    fetched, together with their sweets, by a single extra IN query, so
+    serializing any number of orders costs a fixed two statements.
+    """
+    return Order.query.filter_by(user_id=user_id).options(
+        joinedload(Order.customer),
+        selectinload(Order.order_items).joinedload(OrderItem.sweet)
+    )
+
+
 # Routes
 @app.route('/')
 @app.route('/api')
@@ -189,8 +589,12 @@ def index():
 
 @app.route('/api/health')
 def health_check():
-    """API health check"""
-    return jsonify({'status': 'healthy', 'message': 'Sweet Shop API is running'})
+    """API health check with this instance's cold-start timings"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Sweet Shop API is running',
+        'startup': startup
+    })
 
 
 # Sweet Routes
@@ -231,7 +635,7 @@ def create_sweet():
             price=data['price'],
             quantity=data.get('stock', data.get('quantity', 0)),
             category=data.get('category', ''),
-            image_url=data.get('image_url', '')
+            image_url=image_reference(data.get('image_url', ''))
         )
         db.session.add(sweet)
         db.session.commit()
@@ -256,7 +660,8 @@ def update_sweet(id):
         sweet.quantity = data.get(
             'stock', data.get('quantity', sweet.quantity))
         sweet.category = data.get('category', sweet.category)
-        sweet.image_url = data.get('image_url', sweet.image_url)
+        sweet.image_url = image_reference(
+            data.get('image_url', sweet.image_url))
 
         db.session.commit()
         return jsonify(sweet.to_dict())
@@ -285,6 +690,54 @@ def delete_sweet(id):
         return jsonify({'error': str(e)}), 400
 
 
+# Image Routes
+@app.route('/api/images', methods=['POST'])
+@require_auth
+def upload_image():
+    """Store an image (multipart `file` or JSON `data_url`) by content hash"""
+    try:
+        upload = request.files.get('file')
+        if upload:
+            digest = store_image(upload.read(MAX_IMAGE_BYTES + 1), upload.mimetype)
+        else:
+            data = request.get_json(silent=True) or {}
+            content_type, image = parse_data_url(data.get('data_url', ''))
+            digest = store_image(image, content_type)
+        db.session.commit()
+    except ImageError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except IntegrityError:
+        # A concurrent upload of the same bytes stored this hash first
+        db.session.rollback()
+    return jsonify({'hash': digest, 'url': IMAGE_URL_PREFIX + digest}), 201
+
+
+@app.route('/api/images/<hash>', methods=['GET'])
+def get_image(hash):
+    """Serve a stored image; `size=thumb` returns the server-made thumbnail"""
+    image = db.session.get(Image, hash) if HASH_RE.match(hash) else None
+    if image is None or image.content_type not in IMAGE_TYPES:
+        return jsonify({'error': 'Image not found'}), 404
+
+    data, content_type, etag = image.data, image.content_type, hash
+    if request.args.get('size') == 'thumb':
+        if not image.thumbnail:
+            return jsonify({'error': 'No thumbnail was made for this image'}), 404
+        data, content_type = image.thumbnail, image.thumbnail_type
+        etag = f'{hash}-thumb'
+
+    response = make_response(data)
+    response.content_type = content_type
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = "default-src 'none'"
+    return response.make_conditional(request)
+
+
 # Customer Routes
 @app.route('/api/customers', methods=['GET'])
 @require_auth
@@ -381,19 +834,34 @@ def get_orders():
     """Get all orders with optional customer filter"""
     user_id = get_user_id()
     customer_id = request.args.get('customer_id')
-    query = Order.query.filter_by(user_id=user_id)
+    query = order_query(user_id)
     if customer_id:
         query = query.filter_by(customer_id=customer_id)
     orders = query.all()
     return jsonify([order.to_dict() for order in orders])
 
 
+@app.route('/api/orders/export', methods=['GET'])
+@require_auth
+def export_orders():
+    """Stream order history with line items as CSV or NDJSON"""
+    try:
+        return export_response(
+            get_user_id(),
+            request.args.get('format', 'csv'),
+            request.args.get('from'),
+            request.args.get('to')
+        )
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @app.route('/api/orders/<int:id>', methods=['GET'])
 @require_auth
 def get_order(id):
     """Get a single order by ID"""
     user_id = get_user_id()
-    order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
+    order = order_query(user_id).filter_by(id=id).first_or_404()
     return jsonify(order.to_dict())
 
 
@@ -405,46 +873,41 @@ def create_order():
     data = request.get_json()
 
     try:
+        try:
+            customer_id = int(data.get('customer_id'))
+        except (TypeError, ValueError):
+            raise ValueError('customer_id must be an integer')
+        customer = Customer.query.filter_by(id=customer_id, user_id=user_id).first()
+        if customer is None:
+            return jsonify({'error': 'Customer not found'}), 400
+        lines = parse_order_lines(data.get('items', []))
+        sweets = reserve_stock(user_id, lines)
+
         order = Order(
             user_id=user_id,
-            customer_id=data['customer_id'],
+            customer_id=customer.id,
             total_amount=0,
             status=data.get('status', 'pending')
         )
-        db.session.add(order)
-        db.session.flush()
-
         total = 0
-        for item_data in data.get('items', []):
-            sweet = Sweet.query.filter_by(
-                id=item_data['sweet_id'], user_id=user_id).first()
-            if not sweet:
-                raise ValueError(
-                    f"Sweet with ID {item_data['sweet_id']} not found")
-
-            if sweet.quantity < item_data['quantity']:
-                raise ValueError(f"Insufficient stock for {sweet.name}")
-
-            order_item = OrderItem(
-                order_id=order.id,
-                sweet_id=item_data['sweet_id'],
-                quantity=item_data['quantity'],
-                price=sweet.price
-            )
-            db.session.add(order_item)
-            sweet.quantity -= item_data['quantity']
-            total += sweet.price * item_data['quantity']
+        for sweet_id, quantity in lines.items():
+            price = sweets[sweet_id].price
+            order.order_items.append(OrderItem(
+                sweet_id=sweet_id,
+                quantity=quantity,
+                price=price
+            ))
+            total += price * quantity
 
         order.total_amount = total
+        db.session.add(order)
         db.session.commit()
 
+        order = order_query(user_id).filter_by(id=order.id).one()
         return jsonify(order.to_dict()), 201
     except ValueError as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 400
 
 
 @app.route('/api/orders/<int:id>', methods=['PUT'])
@@ -452,7 +915,7 @@ def create_order():
 def update_order(id):
     """Update order status"""
     user_id = get_user_id()
-    order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
+    order = order_query(user_id).filter_by(id=id).first_or_404()
     data = request.get_json()
 
     try:
@@ -469,13 +932,11 @@ def update_order(id):
 def delete_order(id):
     """Delete an order and restore inventory"""
     user_id = get_user_id()
-    order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
+    order = order_query(user_id).filter_by(id=id).first_or_404()
 
     try:
-        for item in order.order_items:
-            sweet = Sweet.query.get(item.sweet_id)
-            if sweet:
-                sweet.quantity += item.quantity
+        restore_stock({item.sweet_id: item.quantity
+                       for item in order.order_items})
 
         db.session.delete(order)
         db.session.commit()
@@ -519,22 +980,142 @@ def get_categories():
     return jsonify([cat[0] for cat in categories if cat[0]])
 
 
-# Initialize database tables
-with app.app_context():
+@app.cli.command('migrate-images')
+def migrate_images_command():
+    """Move inline base64 images out of sweets.image_url into the image store"""
+    migrated = 0
+    last_id = 0
+    while True:
+        sweets = (Sweet.query
+                  .filter(Sweet.id > last_id, Sweet.image_url.like('data:%'))
+                  .order_by(Sweet.id)
+                  .limit(100)
+                  .all())
+        if not sweets:
+            break
+        for sweet in sweets:
+            last_id = sweet.id
+            try:
+                sweet.image_url = image_reference(sweet.image_url)
+                migrated += 1
+            except ImageError as e:
+                click.echo(f'Skipping sweet {sweet.id}: {e}')
+        db.session.commit()
+    click.echo(f'Migrated {migrated} sweet image(s)')
+
+
+@app.cli.command('connect-check')
+@click.option('--requests', 'count', default=10, help='Number of requests')
+def connect_check_command(count):
+    """Time connection setup over simulated requests in the current DB_POOL_MODE"""
+    click.echo(f'mode={db_pool_mode} url={db.engine.url!r}')
+    total = 0.0
+    for number in range(1, count + 1):
+        with app.app_context(), app.test_request_context():
+            start = time.perf_counter()
+            db.session.execute(text('SELECT 1'))
+            db.session.remove()
+            elapsed = (time.perf_counter() - start) * 1000
+            connect_ms = g.get('db_connect_ms', 0.0)
+            total += connect_ms
+            click.echo(f'{number:>4}  connect {connect_ms:8.2f} ms  '
+                       f'request {elapsed:8.2f} ms  new={g.get("db_connects", 0)}')
+    click.echo(f'Average connect time {total / count:.2f} ms over {count} request(s)')
+
+
+# Cold-start report: module import time and the cost of the first request,
+# printed once per instance and returned by /api/health
+startup = {'import_ms': None, 'first_request_ms': None}
+_first_request_started = None
+
+
+@app.before_request
+def start_first_request_timer():
+    global _first_request_started
+    if _first_request_started is None:
+        _first_request_started = time.perf_counter()
+
+
+@app.after_request
+def record_first_request(response):
+    if startup['first_request_ms'] is None and _first_request_started is not None:
+        startup['first_request_ms'] = round(
+            (time.perf_counter() - _first_request_started) * 1000, 1)
+        print(f"Startup: import {startup['import_ms']} ms, "
+              f"first request {startup['first_request_ms']} ms",
+              file=sys.stderr, flush=True)
+    return response
+
+
+# Schema bootstrap. `flask --app api/index init-db` creates or upgrades the
+# schema explicitly; a cold start only reads the recorded version (one query)
+# on its first request and runs the same bootstrap if the schema is behind.
+SCHEMA_VERSION = 2
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def schema_version():
+    """Version recorded in schema_migrations, 0 if never bootstrapped"""
     try:
-        db.create_all()
-        print("Database tables created successfully")
-
-        # Migration: Update image_url column to TEXT if it exists as VARCHAR
+        return db.session.execute(
+            text('SELECT MAX(version) FROM schema_migrations')).scalar() or 0
+    except DBAPIError:
+        db.session.rollback()
+        return 0
+
+
+def init_database():
+    """Create tables and indexes, then record SCHEMA_VERSION"""
+    db.create_all()
+    if db.engine.dialect.name == 'postgresql':
+        # Sweets from before the image store may still hold inline data URLs
+        db.session.execute(
+            text('ALTER TABLE sweets ALTER COLUMN image_url TYPE TEXT'))
+    # create_all skips indexes on tables that already exist
+    for index in (Sweet.__table__.indexes | Order.__table__.indexes
+                  | OrderItem.__table__.indexes):
+        index.create(db.session.connection(), checkfirst=True)
+    db.session.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, '
+        'description VARCHAR(200) NOT NULL, '
+        'applied_at TIMESTAMP NOT NULL)'))
+    db.session.execute(
+        text('INSERT INTO schema_migrations (version, description, applied_at) '
+             'VALUES (:version, :description, :applied_at)'),
+        {'version': SCHEMA_VERSION, 'description': 'Vercel schema bootstrap',
+         'applied_at': datetime.utcnow()})
+    db.session.commit()
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the database schema"""
+    version = schema_version()
+    if version >= SCHEMA_VERSION:
+        click.echo(f'Schema is already at version {version}')
+        return
+    init_database()
+    click.echo(f'Schema upgraded from version {version} to {SCHEMA_VERSION}')
+
+
+@app.before_request
+def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
         try:
-            db.session.execute(
-                db.text("ALTER TABLE sweets ALTER COLUMN image_url TYPE TEXT"))
-            db.session.commit()
-            print("Migration: Updated image_url to TEXT type")
-        except Exception as migration_error:
+            if schema_version() < SCHEMA_VERSION:
+                init_database()
+                app.logger.info('Database schema bootstrapped to version %s', SCHEMA_VERSION)
+        except IntegrityError:
+            # Another instance recorded the same version first
             db.session.rollback()
-            print(
-                f"Migration note (may already be applied): {migration_error}")
+        _schema_ready = True
 
-    except Exception as e:
-        print(f"Error creating tables: {e}")
+
+startup['import_ms'] = round((time.perf_counter() - STARTED) * 1000, 1)
@@ -2,6 +2,14 @@ const { useState, useEffect } = React;
 
 const API_URL = '/api';
 
+// Stored images are referenced as /api/images/<hash>; resolve them against
+// API_URL and optionally ask the server for its thumbnail rendition.
+const imageSrc = (url, size) => {
+    if (!url || !url.startsWith('/api/images/')) return url;
+    const src = API_URL + url.slice('/api'.length);
+    return size ? `${src}?size=${size}` : src;
+};
+
 axios.interceptors.request.use(function (config) {
     const user = window.currentUser;
     if (user && user.uid) {
@@ -274,7 +282,7 @@ function Sweets({ showNotification, showConfirm }) {
                         <div key={sweet.id} className="product-card">
                             <div className="product-image">
                                 {sweet.image_url ? (
-                                    <img src={sweet.image_url} alt={sweet.name} />
+                                    <img src={imageSrc(sweet.image_url, 'thumb')} alt={sweet.name} />
                                 ) : (
                                     <span style={{ fontSize: '80px' }}>🍬</span>
                                 )}
@@ -332,25 +340,28 @@ function SweetModal({ sweet, onClose, onSuccess }) {
     });
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
-    const [imagePreview, setImagePreview] = useState(sweet?.image_url || '');
+    const [imagePreview, setImagePreview] = useState(imageSrc(sweet?.image_url) || '');
 
     const handleChange = (e) => {
         const { name, value } = e.target;
         setFormData({ ...formData, [name]: value });
         if (name === 'image_url') {
-            setImagePreview(value);
+            setImagePreview(imageSrc(value));
         }
     };
 
-    const handleImageUpload = (e) => {
+    const handleImageUpload = async (e) => {
         const file = e.target.files[0];
         if (file) {
-            const reader = new FileReader();
-            reader.onloadend = () => {
-                setFormData({ ...formData, image_url: reader.result });
-                setImagePreview(reader.result);
-            };
-            reader.readAsDataURL(file);
+            const upload = new FormData();
+            upload.append('file', file);
+            try {
+                const response = await axios.post(`${API_URL}/images`, upload);
+                setFormData({ ...formData, image_url: response.data.url });
+                setImagePreview(imageSrc(response.data.url));
+            } catch (err) {
+                setError(err.response?.data?.error || 'Failed to upload image');
+            }
         }
     };
 
@@ -401,7 +412,7 @@ function SweetModal({ sweet, onClose, onSuccess }) {
                     </div>
                     <div className="form-group">
                         <label className="form-label">Upload Image</label>
-                        <input type="file" accept="image/*" className="form-input" onChange={handleImageUpload} />
+                        <input type="file" accept="image/png,image/jpeg,image/gif,image/webp" className="form-input" onChange={handleImageUpload} />
                         <div style={{ marginTop: '12px' }}>
                             <label className="form-label">Or Enter Image URL</label>
                             <input type="text" name="image_url" className="form-input" placeholder="https://example.com/sweet.jpg" value={formData.image_url} onChange={handleChange} />
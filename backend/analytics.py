@@ -0,0 +1,279 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import click
+from flask import request
+from flask.cli import with_appcontext
+from sqlalchemy import delete, desc, func, insert, select, update
+from cache import bump_versions
+from database import db
+from models import DailySales, Order, OrderItem, Sweet
+from stats import tenant_ids
+
+GRANULARITIES = ('day', 'week', 'month')
+# Periods in a revenue series when ?from= is not given
+DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12}
+MAX_PERIODS = 1000
+DEFAULT_TOP = 10
+MAX_TOP = 100
+REVENUE_TOLERANCE = 1e-6
+
+
+class AnalyticsError(Exception):
+    """Raised for malformed analytics query parameters"""
+
+
+def period_start(day, granularity):
+    """First day of the day, ISO week (Monday) or month containing day"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def shift_period(start, granularity, periods):
+    """The period start `periods` periods after (or, negative, before) start"""
+    if granularity == 'month':
+        month = start.year * 12 + start.month - 1 + periods
+        return date(month // 12, month % 12 + 1, 1)
+    return start + timedelta(days=periods * (7 if granularity == 'week' else 1))
+
+
+def _upsert():
+    """INSERT that adds to an existing (user_id, day, sweet_id) row, or None"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(DailySales)
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'day', 'sweet_id'],
+        set_={'quantity': DailySales.quantity + stmt.excluded.quantity,
+              'revenue': DailySales.revenue + stmt.excluded.revenue})
+
+
+def record_sales(user_id, when, lines, sign=1):
+    """Add an order's lines to the daily rollup in the current transaction.
+
+    lines are (sweet_id, quantity, price) tuples. sign=-1 takes a deleted
+    order back out; rows left without units are removed. Called by the
+    order write handlers before they commit, like adjust_stats().
+    """
+    totals = defaultdict(lambda: [0, 0.0])
+    for sweet_id, quantity, price in lines:
+        totals[sweet_id][0] += sign * quantity
+        totals[sweet_id][1] += sign * quantity * price
+    if not totals:
+        return
+    day = when.date()
+    rows = [{'user_id': user_id, 'day': day, 'sweet_id': sweet_id,
+             'quantity': quantity, 'revenue': revenue}
+            for sweet_id, (quantity, revenue) in totals.items()]
+    stmt = _upsert()
+    if stmt is not None:
+        db.session.execute(stmt, rows)
+    else:
+        for row in rows:
+            result = db.session.execute(
+                update(DailySales)
+                .where(DailySales.user_id == user_id, DailySales.day == day,
+                       DailySales.sweet_id == row['sweet_id'])
+                .values(quantity=DailySales.quantity + row['quantity'],
+                        revenue=DailySales.revenue + row['revenue'])
+                .execution_options(synchronize_session=False))
+            if result.rowcount == 0:
+                db.session.execute(insert(DailySales), [row])
+    if sign < 0:
+        db.session.execute(
+            delete(DailySales)
+            .where(DailySales.user_id == user_id, DailySales.day == day,
+                   DailySales.sweet_id.in_(list(totals)), DailySales.quantity <= 0)
+            .execution_options(synchronize_session=False))
+
+
+def sales_query(user_id=None):
+    """(user_id, day, sweet_id, quantity, revenue) aggregated from the order lines"""
+    day = func.date(Order.order_date)
+    query = (select(Order.user_id, day, OrderItem.sweet_id,
+                    func.sum(OrderItem.quantity),
+                    func.sum(OrderItem.quantity * OrderItem.price))
+             .join(OrderItem, OrderItem.order_id == Order.id)
+             .group_by(Order.user_id, day, OrderItem.sweet_id))
+    if user_id is not None:
+        query = query.where(Order.user_id == user_id)
+    return query
+
+
+def rebuild_sales(connection, user_id=None):
+    """Rebuild the rollup of one tenant, or of all, from the order lines"""
+    table = DailySales.__table__
+    clear = delete(table)
+    if user_id is not None:
+        clear = clear.where(table.c.user_id == user_id)
+    connection.execute(clear)
+    connection.execute(insert(table).from_select(
+        ['user_id', 'day', 'sweet_id', 'quantity', 'revenue'], sales_query(user_id)))
+
+
+def check_sales(user_id):
+    """Rollup rows that differ from the order lines, as {(day, sweet_id): ...}"""
+    actual = {(day if isinstance(day, date) else date.fromisoformat(day), sweet_id):
+              (quantity, revenue)
+              for _, day, sweet_id, quantity, revenue
+              in db.session.execute(sales_query(user_id))}
+    stored = {(row.day, row.sweet_id): (row.quantity, row.revenue)
+              for row in db.session.scalars(
+                  select(DailySales).where(DailySales.user_id == user_id))}
+    drift = {}
+    for key in actual.keys() | stored.keys():
+        a, s = actual.get(key, (0, 0.0)), stored.get(key, (0, 0.0))
+        if a[0] != s[0] or abs(a[1] - s[1]) > REVENUE_TOLERANCE:
+            drift[key] = {'stored': s, 'actual': a}
+    return drift
+
+
+def _parse_day(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise AnalyticsError(f'{name} must be a date (YYYY-MM-DD)')
+
+
+def _parse_int(name, default, maximum):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise AnalyticsError(f'{name} must be an integer')
+    if number < 1:
+        raise AnalyticsError(f'{name} must be positive')
+    return min(number, maximum)
+
+
+def _in_range(query, start, end):
+    if start is not None:
+        query = query.where(DailySales.day >= start)
+    if end is not None:
+        query = query.where(DailySales.day <= end)
+    return query
+
+
+def revenue_window_day():
+    """Today's UTC date when ?to= is missing and the revenue window ends
+    today, so validators and cache keys roll over at midnight"""
+    return None if request.args.get('to') else datetime.utcnow().date().isoformat()
+
+
+def revenue_series(user_id):
+    """Units and revenue per period from the rollup, one entry per period.
+
+    ?granularity=day|week|month (default day); ?from= and ?to= are
+    inclusive dates, defaulting to the last DEFAULT_PERIODS periods up to
+    today (UTC). Periods without sales are reported as zero.
+    """
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise AnalyticsError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    end = _parse_day('to') or datetime.utcnow().date()
+    start = _parse_day('from') or shift_period(
+        period_start(end, granularity), granularity, 1 - DEFAULT_PERIODS[granularity])
+    if start > end:
+        raise AnalyticsError('from must not be after to')
+
+    buckets = defaultdict(lambda: [0, 0.0])
+    rows = db.session.execute(_in_range(
+        select(DailySales.day, func.sum(DailySales.quantity), func.sum(DailySales.revenue))
+        .where(DailySales.user_id == user_id), start, end)
+        .group_by(DailySales.day))
+    for day, quantity, revenue in rows:
+        bucket = buckets[period_start(day, granularity)]
+        bucket[0] += quantity
+        bucket[1] += revenue
+
+    series = []
+    period = period_start(start, granularity)
+    while period <= end:
+        if len(series) == MAX_PERIODS:
+            raise AnalyticsError(f'at most {MAX_PERIODS} periods per request')
+        quantity, revenue = buckets.get(period, (0, 0.0))
+        series.append({'period': period.isoformat(), 'quantity': quantity,
+                       'revenue': round(revenue, 2)})
+        period = shift_period(period, granularity, 1)
+    return {
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'total_quantity': sum(p['quantity'] for p in series),
+        'total_revenue': round(sum(b[1] for b in buckets.values()), 2),
+        'series': series
+    }
+
+
+def top_sweets(user_id):
+    """Best-selling sweets from the rollup in one query.
+
+    ?by=revenue|quantity (default revenue), ?limit= (default DEFAULT_TOP),
+    and optional inclusive ?from= / ?to= dates (default all time).
+    """
+    by = request.args.get('by', 'revenue')
+    if by not in ('revenue', 'quantity'):
+        raise AnalyticsError('by must be revenue or quantity')
+    limit = _parse_int('limit', DEFAULT_TOP, MAX_TOP)
+    totals = _in_range(
+        select(DailySales.sweet_id,
+               func.sum(DailySales.quantity).label('quantity'),
+               func.sum(DailySales.revenue).label('revenue'))
+        .where(DailySales.user_id == user_id),
+        _parse_day('from'), _parse_day('to')
+    ).group_by(DailySales.sweet_id).subquery()
+    rows = db.session.execute(
+        select(Sweet.id, Sweet.name, Sweet.category, totals.c.quantity, totals.c.revenue)
+        .join(totals, totals.c.sweet_id == Sweet.id)
+        .where(totals.c.quantity > 0)
+        .order_by(desc(totals.c[by]), Sweet.id)
+        .limit(limit))
+    return [{'sweet_id': sweet_id, 'name': name, 'category': category,
+             'quantity': quantity, 'revenue': round(revenue, 2)}
+            for sweet_id, name, category, quantity, revenue in rows]
+
+
+@click.group('analytics')
+def analytics_cli():
+    """Maintain the daily_sales rollup"""
+
+
+@analytics_cli.command('backfill')
+@click.option('--tenant', help='only this user_id')
+@with_appcontext
+def backfill_command(tenant):
+    """Rebuild the rollup from the order lines"""
+    rebuild_sales(db.session.connection(), tenant)
+    for user_id in [tenant] if tenant else tenant_ids():
+        bump_versions(user_id, 'orders')
+    db.session.commit()
+    count = db.session.scalar(select(func.count()).select_from(DailySales))
+    click.echo(f'daily_sales has {count} row(s)')
+
+
+@analytics_cli.command('check')
+@click.option('--tenant', help='only this user_id')
+@with_appcontext
+def check_command(tenant):
+    """Report tenants whose rollup differs from their order lines"""
+    inconsistent = 0
+    for user_id in [tenant] if tenant else tenant_ids():
+        drift = check_sales(user_id)
+        if drift:
+            inconsistent += 1
+            click.echo(f'{user_id}: {len(drift)} row(s) differ, e.g. {next(iter(drift.items()))}')
+    click.echo(f'{inconsistent} inconsistent tenant(s)')
+    if inconsistent:
+        raise SystemExit(1)
@@ -1,7 +1,21 @@
+from startup import StartupTimer  # First, so the import timer starts before Flask loads
 import os
 from flask import Flask
 from flask_cors import CORS
+from analytics import analytics_cli
+from cache import response_cache
+from changes import changes_cli
+from compression import compression
 from database import db
+from datagen import seed_cli
+from events import broker
+from images import images_cli
+from metrics import metrics
+from migrations import db_cli, schema_guard
+from query_budget import budgets_cli
+from routes import bp
+from serializers import json_provider
+from stats import stats_cli
 
 
 def create_app():
@@ -11,7 +25,8 @@ def create_app():
         r"/api/*": {
             "origins": ["*"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "X-User-ID"]
+            "allow_headers": ["Content-Type", "X-User-ID", "If-None-Match", "Last-Event-ID"],
+            "expose_headers": ["ETag"]
         }
     })
 
@@ -20,26 +35,49 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = os.environ.get(
         'SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get(
+        'RESPONSE_CACHE', '1') != '0'
+    app.config['RESPONSE_CACHE_TTL'] = int(
+        os.environ.get('RESPONSE_CACHE_TTL', 60))
+    app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', '1') != '0'
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS', '1') != '0'
+    app.config['QUERY_BUDGET'] = os.environ.get('QUERY_BUDGET', 'off')
+    app.config['ASYNC_DATABASE_URI'] = os.environ.get('ASYNC_DATABASE_URL')
+    app.config['ASYNC_POOL_SIZE'] = int(os.environ.get('ASYNC_POOL_SIZE', 10))
+    app.config['JSON_ENCODER'] = os.environ.get('JSON_ENCODER', 'auto')
+    app.config['COMPRESSION_ENABLED'] = os.environ.get('COMPRESSION', '1') != '0'
+    app.config['COMPRESSION_MIN_SIZE'] = int(
+        os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    app.config['STREAM_HEARTBEAT'] = int(os.environ.get('STREAM_HEARTBEAT', 15))
+    app.config['STREAM_MAX_CONNECTIONS'] = int(
+        os.environ.get('STREAM_MAX_CONNECTIONS', 100))
+
+    app.json = json_provider(app)
 
     db.init_app(app)
 
-    from routes import bp
+    startup = StartupTimer()
+    startup.init_app(app)
+    schema_guard.init_app(app)
+    compression.init_app(app)
+    response_cache.init_app(app)
+    broker.init_app(app)
+    metrics.init_app(app)
+
     app.register_blueprint(bp, url_prefix='/api')
 
-    with app.app_context():
-        db.create_all()
-        from models import Sweet
-        if Sweet.query.count() == 0:
-            seed_initial_data()
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(budgets_cli)
+    app.cli.add_command(changes_cli)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(seed_cli)
+    app.cli.add_command(stats_cli)
 
+    startup.ready()
     return app
 
 
-def seed_initial_data():
-    """Initialize database with sample data (removed - data is user-specific now)"""
-    pass
-
-
 app = create_app()
 
 
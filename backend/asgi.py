@@ -0,0 +1,336 @@
+"""ASGI entry point: uvicorn asgi:application
+
+The hot read routes run as coroutines on an async SQLAlchemy engine; every
+other request is served by the WSGI app on a thread pool.
+"""
+import asyncio
+import io
+import sys
+from functools import wraps
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import Response, abort, current_app, g, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request
+from app import app
+from cache import remember_versions, request_etag, response_cache, validated, versions_query
+from database import db
+from models import (Customer, Order, Sweet, TenantStats, CUSTOMER_FIELDS, ORDER_EXPANDS,
+                    ORDER_FIELDS, SWEET_FIELDS)
+from pagination import PaginationError, keyset, parse_limit, split_page
+from projection import project, requested_expand, requested_fields
+from query_budget import QueryBudget
+import repository
+from routes import get_user_id, order_query
+from stats import recompute_stats
+
+# SQLAlchemy backend name -> async driver
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+# Flask endpoint -> (coroutine view, predicate on request.args that sends
+# the request to the WSGI app instead)
+ASYNC_VIEWS = {}
+
+
+def async_url(url):
+    """The app's SQLAlchemy URL with the matching async driver"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f'No async driver for {url.get_backend_name()}; '
+                           f'set ASYNC_DATABASE_URL')
+    return url.set(drivername=driver)
+
+
+def async_view(endpoint, sync_if=None):
+    """Serve a Flask endpoint with a coroutine taking (session, **view_args)"""
+    def decorator(f):
+        ASYNC_VIEWS[endpoint] = (f, sync_if)
+        return f
+    return decorator
+
+
+def streamed(args):
+    return args.get('stream') in ('1', 'true')
+
+
+async def load_versions(session, user_id, entities):
+    """Fetch the tenant's versions into the request memo read by cache.py"""
+    if (user_id, tuple(entities)) not in g.get('tenant_versions', {}):
+        rows = await session.execute(versions_query(user_id, entities))
+        remember_versions(user_id, entities, rows.all())
+
+
+def require_auth(f):
+    """Coroutine form of routes.require_auth"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        try:
+            get_user_id()
+            return await f(*args, **kwargs)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 401
+    return decorated_function
+
+
+def conditional_get(*entities):
+    """Coroutine form of cache.conditional_get"""
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(session, *args, **kwargs):
+            user_id = request.headers.get('X-User-ID')
+            await load_versions(session, user_id, entities)
+            etag = request_etag(user_id, entities)
+
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(await f(session, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return validated(response, etag)
+        return decorated_function
+    return decorator
+
+
+def cached(*entities):
+    """Coroutine form of ResponseCache.cached, sharing its backend"""
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(session, *args, **kwargs):
+            if not response_cache.enabled:
+                return await f(session, *args, **kwargs)
+            user_id = request.headers.get('X-User-ID')
+            await load_versions(session, user_id, entities)
+            key = response_cache.key(user_id, entities)
+            entry = response_cache.lookup(key)
+            if entry is not None:
+                return response_cache.response(entry)
+            return response_cache.store(
+                key, current_app.make_response(await f(session, *args, **kwargs)))
+        return decorated_function
+    return decorator
+
+
+def build_stats(user_id):
+    """get_stats() for a tenant that has no row yet, as a dict"""
+    stats = recompute_stats(user_id)
+    db.session.commit()
+    return stats.to_dict()
+
+
+async def first_or_404(session, query):
+    row = (await session.scalars(query.limit(1))).first()
+    if row is None:
+        abort(404)
+    return row
+
+
+async def fetch_rows(session, statement):
+    """Coroutine form of pagination.execute(statement).all()"""
+    connection = await session.connection()
+    return (await connection.execute(statement)).all()
+
+
+async def rendered(session, listing, rows):
+    """Coroutine form of pagination.rendered"""
+    children = listing.children(rows)
+    child_rows = () if children is None else await fetch_rows(session, children)
+    return listing.render(rows, child_rows)
+
+
+async def list_response(session, listing):
+    """Coroutine form of pagination.list_response, without stream=1"""
+    args = request.args
+    try:
+        if 'limit' not in args and 'cursor' not in args:
+            rows = await fetch_rows(session, listing.statement)
+            return jsonify(await rendered(session, listing, rows))
+        limit = parse_limit(args.get('limit'))
+        rows, next_cursor = split_page(await fetch_rows(session, keyset(
+            listing.statement, listing.keys, limit, args.get('cursor'))), listing.keys, limit)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'items': await rendered(session, listing, rows),
+        'next_cursor': next_cursor
+    })
+
+
+@async_view('api.get_sweets', sync_if=streamed)
+@require_auth
+@conditional_get('sweets')
+@cached('sweets')
+async def get_sweets(session):
+    return await list_response(session, repository.sweets(
+        get_user_id(), requested_fields(SWEET_FIELDS), request.args.get('category')))
+
+
+@async_view('api.get_sweet')
+@require_auth
+async def get_sweet(session, id):
+    user_id = get_user_id()
+    fields = requested_fields(SWEET_FIELDS)
+    sweet = await first_or_404(session, project(
+        select(Sweet), Sweet, SWEET_FIELDS, fields).filter_by(id=id, user_id=user_id))
+    return jsonify(sweet.to_dict(fields))
+
+
+@async_view('api.get_customers', sync_if=streamed)
+@require_auth
+@conditional_get('customers')
+@cached('customers')
+async def get_customers(session):
+    return await list_response(session, repository.customers(
+        get_user_id(), requested_fields(CUSTOMER_FIELDS)))
+
+
+@async_view('api.get_customer')
+@require_auth
+async def get_customer(session, id):
+    user_id = get_user_id()
+    fields = requested_fields(CUSTOMER_FIELDS)
+    customer = await first_or_404(session, project(
+        select(Customer), Customer, CUSTOMER_FIELDS, fields).filter_by(id=id, user_id=user_id))
+    return jsonify(customer.to_dict(fields))
+
+
+@async_view('api.get_orders', sync_if=streamed)
+@require_auth
+@conditional_get('orders', 'customers', 'sweets')
+async def get_orders(session):
+    return await list_response(session, repository.orders(
+        get_user_id(), requested_fields(ORDER_FIELDS), requested_expand(ORDER_EXPANDS),
+        request.args.get('customer_id')))
+
+
+@async_view('api.get_order')
+@require_auth
+async def get_order(session, id):
+    user_id = get_user_id()
+    fields = requested_fields(ORDER_FIELDS)
+    expand = requested_expand(ORDER_EXPANDS)
+    order = await first_or_404(session, order_query(
+        user_id, fields, expand, base=select(Order)).filter_by(id=id))
+    return jsonify(order.to_dict(fields, expand))
+
+
+@async_view('api.get_dashboard_stats',
+            sync_if=lambda args: 'check' in args or 'recompute' in args)
+@require_auth
+@cached('sweets', 'customers', 'orders', 'stats')
+async def get_dashboard_stats(session):
+    user_id = get_user_id()
+    stats = await session.get(TenantStats, user_id)
+    if stats is not None:
+        return jsonify(stats.to_dict())
+    # The first read builds the row; rare enough to run on a thread
+    return jsonify(await asyncio.to_thread(build_stats, user_id))
+
+
+class AsyncApp:
+    """ASGI application serving a Flask app's routes.
+
+    GET requests for an endpoint in ASYNC_VIEWS run as a coroutine on an
+    AsyncSession inside the Flask request context, so before/after-request
+    hooks, CORS, error handlers, query budgets and metrics behave as in
+    the WSGI app. Everything else, including HEAD, OPTIONS and stream=1,
+    is handed to the WSGI app on a pool of `workers` threads.
+    """
+
+    def __init__(self, app, workers=10):
+        self.app = app
+        self.wsgi = WSGIMiddleware(app, workers=workers)
+        missing = set(ASYNC_VIEWS).difference(app.view_functions)
+        if missing:
+            raise RuntimeError(f"Async views for unknown endpoints: {', '.join(sorted(missing))}")
+        with app.app_context():
+            url = app.config['ASYNC_DATABASE_URI'] or async_url(db.engine.url)
+        pool_size = app.config['ASYNC_POOL_SIZE']
+        self.engine = create_async_engine(url, pool_size=pool_size, max_overflow=0)
+        self.slots = asyncio.Semaphore(pool_size)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return await self.wsgi(scope, receive, send)
+
+        environ = build_environ(scope, io.BytesIO())
+        try:
+            endpoint, view_args = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return await self.wsgi(scope, receive, send)
+        view, sync_if = ASYNC_VIEWS.get(endpoint, (None, None))
+        if view is None or (sync_if is not None and sync_if(Request(environ).args)):
+            return await self.wsgi(scope, receive, send)
+
+        # Admit as many views as there are pooled connections; the rest
+        # wait in FIFO order instead of all sharing the CPU, which keeps the
+        # tail latency flat under high fan-out
+        async with self.slots:
+            response = await self.dispatch(environ, view)
+        app_iter, status, headers = response.get_wsgi_response(environ)
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers]
+        })
+        await send({'type': 'http.response.body', 'body': b''.join(app_iter)})
+
+    async def dispatch(self, environ, view):
+        """Flask's wsgi_app and full_dispatch_request around an awaited view"""
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await self.call_view(view)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                return app.handle_exception(e)
+            except:  # noqa: E722
+                error = sys.exc_info()[1]
+                raise
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def call_view(self, view):
+        """Run view under the Flask view's route_budget"""
+        statements, repeats = current_app.view_functions[request.endpoint].query_budget
+        mode = current_app.config.get('QUERY_BUDGET', 'off')
+        async with self.sessions() as session:
+            if mode == 'off':
+                return await view(session, **request.view_args)
+            with QueryBudget(statements, repeats, mode, label=request.endpoint):
+                return await view(session, **request.view_args)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncApp(app)
@@ -0,0 +1,15 @@
+"""Benchmarks for the Sweet Shop API.
+
+Run from the backend directory, e.g. ``python -m bench.payload``.
+
+load            concurrent endpoint mix: p50/p95/p99, RPS, queries/request
+compare         diff two ``load --json`` reports
+asgi            sync vs. async serving: RPS and p99 under high fan-out
+payload         full vs. projected response size and latency
+compression     CPU vs. bytes of each Content-Encoding and level
+search          search endpoint latency on 100k-row tenants
+serialize       rows/s of to_dict() vs. compiled serializers and orjson
+repository      peak memory and CPU of ORM vs. Core list loading
+metrics_overhead  cost of the /api/metrics instrumentation
+stress_orders   concurrent checkouts never oversell stock
+"""
@@ -0,0 +1,206 @@
+"""Sync (WSGI thread pool) vs. async (asgi.py) serving under high fan-out.
+
+    python -m bench.asgi --concurrency 16,64,256 --duration 10
+    python -m bench.asgi --mix list_sweets=1,order_detail=1 --cache
+
+Seeds the same tenants as bench.load into DATABASE_URL (a throwaway SQLite
+file by default) and serves it twice with uvicorn in a subprocess, so
+only the handler model differs:
+
+    sync   the Flask app behind a2wsgi's pool of --workers threads
+    async  asgi:application (async views, other routes on --workers threads)
+
+Each --concurrency level opens that many keep-alive connections from one
+asyncio client and reports sustained requests per second and p50/p99/max
+latency. The response cache is off unless --cache, so reads hit the
+database. The default mix is read-only; add create_order=1 to include
+writes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench_asgi.db')
+
+from bench.load import (TENANT_PREFIX, HTTPTransport, build_request, parse_mix,  # noqa: E402
+                        percentile, seed, tenant_ids)
+
+MODES = ('sync', 'async')
+DEFAULT_MIX = 'list_sweets=4,list_orders=3,sweet_detail=3,order_detail=3,dashboard=2'
+
+
+def serve(mode, port, workers):
+    """Run one server in this process until it is terminated"""
+    import uvicorn
+    from app import app
+    if mode == 'async':
+        from asgi import AsyncApp
+        application = AsyncApp(app, workers=workers)
+    else:
+        from a2wsgi import WSGIMiddleware
+        application = WSGIMiddleware(app, workers=workers)
+    uvicorn.run(application, host='127.0.0.1', port=port, log_level='warning',
+                lifespan='on' if mode == 'async' else 'off')
+
+
+def start_server(mode, port, workers, cache):
+    env = dict(os.environ, RESPONSE_CACHE='1' if cache else '0')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'bench.asgi', '--serve', mode, '--port', str(port),
+         '--workers', str(workers)], env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            status, _ = HTTPTransport(f'http://127.0.0.1:{port}').request('GET', '/api/health', {})
+            if status == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit(f'{mode} server did not start on port {port}')
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split(b' ', 2)[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding' and b'chunked' in value.lower():
+            chunked = True
+    if not chunked:
+        await reader.readexactly(length)
+        return status
+    while True:
+        size = int((await reader.readline()).split(b';')[0], 16)
+        await reader.readexactly(size + 2)
+        if size == 0:
+            return status
+
+
+async def client(port, tenants, mix, deadline, seed, samples, errors):
+    """One keep-alive connection issuing requests back to back"""
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        user_id, ids = rng.choice(tenants)
+        method, path, body = build_request(name, user_id, ids, rng)
+        payload = b'' if body is None else json.dumps(body).encode()
+        head = (f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nX-User-ID: {user_id}\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n')
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(head.encode() + payload)
+            status = await read_response(reader)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            status = None
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+        samples.append(time.perf_counter() - start)
+        if status is None or status >= 400:
+            errors[name] += 1
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port, tenants, mix, concurrency, seconds, seed):
+    samples, errors = [], defaultdict(int)
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, tenants, mix, deadline, seed + i, samples, errors)
+                           for i in range(concurrency)))
+    return samples, errors, time.perf_counter() - start
+
+
+def summarize(samples, errors, elapsed):
+    values = sorted(samples)
+    return {
+        'requests': len(values),
+        'errors': sum(errors.values()),
+        'rps': round(len(values) / elapsed, 1),
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default='16,64,256',
+                        help='comma-separated open connections per run')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--workers', type=int, default=10,
+                        help='WSGI threads per server')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tenants', type=int, default=4)
+    parser.add_argument('--sweets', type=int, default=200)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.port, args.workers)
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    from app import app
+    from migrations import upgrade
+    with app.app_context():
+        upgrade()
+        seed(args.tenants, args.sweets, args.customers, args.orders, args.seed)
+
+    results = {}
+    print(f"{'mode':<7}{'conns':>6}{'requests':>10}{'errors':>8}{'rps':>9}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for mode in args.modes.split(','):
+        process = start_server(mode, args.port, args.workers, args.cache)
+        try:
+            setup = HTTPTransport(f'http://127.0.0.1:{args.port}')
+            tenants = [(f'{TENANT_PREFIX}{t}', tenant_ids(setup, f'{TENANT_PREFIX}{t}'))
+                       for t in range(args.tenants)]
+            for level in levels:
+                if args.warmup:
+                    asyncio.run(drive(args.port, tenants, mix, level, args.warmup, args.seed))
+                r = summarize(*asyncio.run(drive(
+                    args.port, tenants, mix, level, args.duration, args.seed)))
+                results[f'{mode}@{level}'] = r
+                print(f"{mode:<7}{level:>6}{r['requests']:>10}{r['errors']:>8}{r['rps']:>9}"
+                      f"{r['p50_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}", flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'mix': mix, 'results': results},
+                      f, indent=2, sort_keys=True)
+        print(f'Wrote {args.json}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Compare two bench.load --json reports scenario by scenario.
+
+    python -m bench.compare before.json after.json
+
+Prints each metric as before -> after with the relative change; latency
+and queries going down, or rps going up, is an improvement.
+"""
+import argparse
+import json
+
+METRICS = ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'errors')
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return ''
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    for name in sorted(set(before['scenarios']) | set(after['scenarios'])):
+        old = before['scenarios'].get(name, {})
+        new = after['scenarios'].get(name, {})
+        print(name)
+        for metric in METRICS:
+            a, b = old.get(metric), new.get(metric)
+            print(f'  {metric:<22}{str(a):>10} -> {str(b):<10}{change(a, b):>9}')
+    a, b = before['total']['rps'], after['total']['rps']
+    print(f"total rps {a} -> {b} {change(a, b)}")
+
+
+if __name__ == '__main__':
+    main()
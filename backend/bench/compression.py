@@ -0,0 +1,109 @@
+"""CPU vs. bytes of each Content-Encoding and level on real list bodies.
+
+    python -m bench.compression --sweets 5000 --orders 2000
+    python -m bench.compression --encodings gzip,zstd --repeat 5
+
+Seeds one tenant into DATABASE_URL (a throwaway SQLite file by default),
+fetches the uncompressed sweet, customer and order lists and the NDJSON
+order export, then compresses each body at every level in LEVELS. It
+reports compressed size, ratio, compress and decompress time (best of
+--repeat) and compression throughput.
+
+Finally it times response cache hits on GET /api/sweets with and without
+Accept-Encoding: hits serve the stored compressed body, so they cost
+the same as uncompressed ones instead of a compression per request.
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench_compression.db')
+
+from app import app  # noqa: E402
+from compression import available_encodings, brotli, compress, zstandard  # noqa: E402
+from datagen import generate  # noqa: E402
+from migrations import upgrade  # noqa: E402
+
+PREFIX = 'compression-tenant-'
+USER_ID = f'{PREFIX}0'
+LEVELS = {
+    'gzip': (1, 6, 9),
+    'br': (1, 4, 6, 9, 11),
+    'zstd': (1, 3, 9, 19),
+}
+BODIES = {
+    'sweets': '/api/sweets',
+    'customers': '/api/customers',
+    'orders': '/api/orders',
+    'export': '/api/orders/export?format=ndjson',
+}
+
+
+def decompress(encoding, data):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        return brotli.decompress(data)
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def best(f, repeat):
+    """Best time of repeat calls"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sweets', type=int, default=5000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--encodings', default=','.join(available_encodings()))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--hits', type=int, default=200, help='cache hits to time')
+    args = parser.parse_args()
+    encodings = [e for e in args.encodings.split(',') if e in available_encodings()]
+    skipped = set(args.encodings.split(',')) - set(encodings)
+    if skipped:
+        print(f"not installed: {', '.join(sorted(skipped))}")
+
+    with app.app_context():
+        upgrade()
+        generate(1, args.sweets, args.customers, args.orders, prefix=PREFIX, skip_existing=True)
+
+    client = app.test_client()
+    headers = {'X-User-ID': USER_ID}
+    print(f"{'body':<10}{'encoding':<10}{'level':>6}{'KB':>9}{'ratio':>8}"
+          f"{'comp ms':>9}{'MB/s':>8}{'decomp ms':>11}")
+    for name, path in BODIES.items():
+        body = client.get(path, headers=headers).get_data()
+        print(f"{name:<10}{'identity':<10}{'':>6}{len(body) / 1024:>9.1f}")
+        for encoding in encodings:
+            for level in LEVELS[encoding]:
+                data = compress(encoding, body, level)
+                seconds = best(lambda: compress(encoding, body, level), args.repeat)
+                unpack = best(lambda: decompress(encoding, data), args.repeat)
+                print(f"{'':<10}{encoding:<10}{level:>6}{len(data) / 1024:>9.1f}"
+                      f"{len(body) / len(data):>7.1f}x{seconds * 1000:>9.2f}"
+                      f"{len(body) / seconds / 2 ** 20:>8.0f}{unpack * 1000:>11.2f}")
+
+    print(f"\n{'cache hit on GET /api/sweets':<32}{'ms/hit':>8}{'KB':>9}")
+    for encoding in [None] + encodings:
+        request_headers = dict(headers, **({'Accept-Encoding': encoding} if encoding else {}))
+        response = client.get('/api/sweets', headers=request_headers)
+        seconds = best(lambda: [client.get('/api/sweets', headers=request_headers)
+                                for _ in range(args.hits)], args.repeat) / args.hits
+        print(f"{encoding or 'identity':<32}{seconds * 1000:>8.2f}"
+              f"{len(response.get_data()) / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
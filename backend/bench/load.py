@@ -0,0 +1,327 @@
+"""Throughput and latency of the main API endpoints under a concurrent mix.
+
+    python -m bench.load --duration 10 --concurrency 8
+    python -m bench.load --driver http --concurrency 32 --json after.json
+    python -m bench.load --url http://127.0.0.1:8000 --json gunicorn.json
+    DATABASE_URL=postgresql://localhost/sweetshop_bench python -m bench.load
+
+Seeds --tenants tenants into DATABASE_URL (a throwaway SQLite file by
+default) unless they already have data, then drives a weighted mix of
+requests from --concurrency threads:
+
+    client  Flask test client in-process (microbenchmark, no network)
+    http    a real threaded HTTP server in-process, over keep-alive sockets
+    --url   an already running server (gunicorn, ...) on the same database
+
+Reports p50/p95/p99 latency, requests per second and SQL statements per
+request (from /api/metrics) per scenario. --json writes the same numbers
+plus the commit and settings, so runs can be diffed between commits.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+SEEDS_OWN_DATABASE = 'DATABASE_URL' not in os.environ
+if SEEDS_OWN_DATABASE:
+    _db_file = os.path.join(tempfile.mkdtemp(), 'load.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_file}'
+
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from datagen import generate  # noqa: E402
+from migrations import upgrade  # noqa: E402
+
+TENANT_PREFIX = 'bench-tenant-'
+
+# name -> (method, route rule as reported by /api/metrics, default weight)
+SCENARIOS = {
+    'list_sweets': ('GET', '/api/sweets', 4),
+    'list_orders': ('GET', '/api/orders', 3),
+    'sweet_detail': ('GET', '/api/sweets/<int:id>', 3),
+    'order_detail': ('GET', '/api/orders/<int:id>', 3),
+    'create_order': ('POST', '/api/orders', 1),
+    'dashboard': ('GET', '/api/dashboard/stats', 2),
+}
+
+
+def seed(tenants, sweets, customers, orders, seed):
+    """Generate tenants that have no sweets yet; stock never runs out"""
+    generate(tenants, sweets, customers, orders, seed=seed, prefix=TENANT_PREFIX,
+             stock=10 ** 9, skip_existing=True)
+
+
+class TestClientTransport:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, body=None):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, response.get_data()
+
+
+class HTTPTransport:
+    """One keep-alive connection per worker thread"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def request(self, method, path, headers, body=None):
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+
+
+def start_server():
+    """Serve the app on an ephemeral port from a background thread"""
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def tenant_ids(transport, user_id):
+    """Sweet, customer and order ids of a tenant, fetched through the API"""
+    headers = {'X-User-ID': user_id}
+    ids = {}
+    for name, path in (('sweets', '/api/sweets?fields=id&limit=500'),
+                       ('customers', '/api/customers?fields=id&limit=500'),
+                       ('orders', '/api/orders?fields=id&limit=500')):
+        status, body = transport.request('GET', path, headers)
+        if status != 200:
+            raise SystemExit(f'GET {path} for {user_id} returned {status}')
+        ids[name] = [item['id'] for item in json.loads(body)['items']]
+    return ids
+
+
+def build_request(name, user_id, ids, rng):
+    if name == 'list_sweets':
+        return 'GET', '/api/sweets?limit=50', None
+    if name == 'list_orders':
+        return 'GET', '/api/orders?limit=50', None
+    if name == 'sweet_detail':
+        return 'GET', f"/api/sweets/{rng.choice(ids['sweets'])}", None
+    if name == 'order_detail':
+        return 'GET', f"/api/orders/{rng.choice(ids['orders'])}", None
+    if name == 'create_order':
+        picked = rng.sample(ids['sweets'], min(len(ids['sweets']), rng.randint(1, 4)))
+        return 'POST', '/api/orders', {
+            'customer_id': rng.choice(ids['customers']),
+            'items': [{'sweet_id': i, 'quantity': rng.randint(1, 3)} for i in picked]}
+    return 'GET', '/api/dashboard/stats', None
+
+
+def worker(transport, tenants, mix, deadline, max_requests, seed, samples, errors):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    done = 0
+    while time.perf_counter() < deadline and (max_requests is None or done < max_requests):
+        name = rng.choices(names, weights)[0]
+        user_id, ids = rng.choice(tenants)
+        method, path, body = build_request(name, user_id, ids, rng)
+        start = time.perf_counter()
+        try:
+            status, _ = transport.request(method, path, {'X-User-ID': user_id}, body)
+        except (http.client.HTTPException, OSError):
+            status = None
+        elapsed = time.perf_counter() - start
+        samples[name].append(elapsed)
+        if status is None or status >= 400:
+            errors[name] += 1
+        done += 1
+
+
+def statement_counts(transport):
+    """{(method, rule): (requests, statements)} summed over statuses"""
+    status, body = transport.request('GET', '/api/metrics', {})
+    if status != 200:
+        return {}
+    counts = defaultdict(lambda: [0, 0])
+    for line in body.decode().splitlines():
+        if line.startswith('sweetshop_http_request_duration_seconds_count{'):
+            index = 0
+        elif line.startswith('sweetshop_db_statements_total{'):
+            index = 1
+        else:
+            continue
+        labels, value = line[line.index('{') + 1:].rsplit('} ', 1)
+        fields = dict(part.split('=', 1) for part in labels.split('",'))
+        key = (fields['method'].strip('"'), fields['route'].strip('"'))
+        counts[key][index] += float(value)
+    return counts
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, errors, elapsed, before, after):
+    results = {}
+    for name, values in sorted(samples.items()):
+        values = sorted(values)
+        method, rule, _ = SCENARIOS[name]
+        requests = after.get((method, rule), (0, 0))[0] - before.get((method, rule), (0, 0))[0]
+        statements = after.get((method, rule), (0, 0))[1] - before.get((method, rule), (0, 0))[1]
+        results[name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'mean_ms': round(sum(values) / len(values) * 1000, 2),
+            'queries_per_request': round(statements / requests, 2) if requests else None
+        }
+    total = sum(len(v) for v in samples.values())
+    return results, {'requests': total, 'errors': sum(errors.values()),
+                     'rps': round(total / elapsed, 1), 'seconds': round(elapsed, 2)}
+
+
+def parse_mix(value):
+    mix = {name: weight for name, (_, _, weight) in SCENARIOS.items()}
+    if value:
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            if name not in SCENARIOS:
+                raise SystemExit(f"Unknown scenario {name}; choose from {', '.join(SCENARIOS)}")
+            mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def database_backend():
+    with app.app_context():
+        return db.engine.url.get_backend_name()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--driver', choices=('client', 'http'), default='client')
+    parser.add_argument('--url', help='benchmark a running server instead')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--requests', type=int, help='per thread, instead of --duration')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds')
+    parser.add_argument('--mix', help='e.g. list_sweets=4,create_order=1 '
+                        f"(scenarios: {', '.join(SCENARIOS)})")
+    parser.add_argument('--tenants', type=int, default=4)
+    parser.add_argument('--sweets', type=int, default=200)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    # A --url server is seeded through its own DATABASE_URL, not a temp file
+    if not (args.url and SEEDS_OWN_DATABASE):
+        with app.app_context():
+            upgrade()
+            seed(args.tenants, args.sweets, args.customers, args.orders, args.seed)
+
+    server = None
+    base_url = args.url
+    if base_url is None and args.driver == 'http':
+        server, base_url = start_server()
+
+    def transport():
+        return HTTPTransport(base_url) if base_url else TestClientTransport()
+
+    setup = transport()
+    tenants = [(f'{TENANT_PREFIX}{t}', tenant_ids(setup, f'{TENANT_PREFIX}{t}'))
+               for t in range(args.tenants)]
+
+    def run(seconds, max_requests):
+        # Each thread fills its own dicts; they are merged after the run
+        per_thread = [(defaultdict(list), defaultdict(int))
+                      for _ in range(args.concurrency)]
+        deadline = time.perf_counter() + (seconds if max_requests is None else 1e9)
+        threads = [threading.Thread(target=worker, args=(
+            transport(), tenants, mix, deadline, max_requests,
+            args.seed + i, samples, errors))
+            for i, (samples, errors) in enumerate(per_thread)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        samples, errors = defaultdict(list), defaultdict(int)
+        for thread_samples, thread_errors in per_thread:
+            for name, values in thread_samples.items():
+                samples[name].extend(values)
+            for name, count in thread_errors.items():
+                errors[name] += count
+        return samples, errors, elapsed
+
+    if args.warmup:
+        run(args.warmup, None)
+    before = statement_counts(setup)
+    samples, errors, elapsed = run(args.duration, args.requests)
+    after = statement_counts(setup)
+    if server is not None:
+        server.shutdown()
+
+    results, total = summarize(samples, errors, elapsed, before, after)
+    print(f"{'scenario':<14}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}"
+          f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for name, r in results.items():
+        queries = '' if r['queries_per_request'] is None else r['queries_per_request']
+        print(f"{name:<14}{r['requests']:>9}{r['errors']:>8}{r['rps']:>9}{r['p50_ms']:>9}"
+              f"{r['p95_ms']:>9}{r['p99_ms']:>9}{queries:>9}")
+    print(f"{'total':<14}{total['requests']:>9}{total['errors']:>8}{total['rps']:>9}")
+
+    if args.json:
+        report = {
+            'commit': git_commit(),
+            'database': None if args.url else database_backend(),
+            'driver': 'url' if args.url else args.driver,
+            'settings': {key: getattr(args, key) for key in (
+                'concurrency', 'duration', 'requests', 'tenants', 'sweets',
+                'customers', 'orders', 'seed')},
+            'mix': mix,
+            'scenarios': results,
+            'total': total
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'Wrote {args.json}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
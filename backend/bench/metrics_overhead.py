@@ -0,0 +1,116 @@
+"""Per-request and per-statement cost of the /api/metrics instrumentation.
+
+    python -m bench.metrics_overhead --iterations 100000
+
+Times the request hooks and the cursor event listeners in isolation (the
+numbers that matter, since they run on every request and statement), then
+compares end-to-end test-client latency with metrics on and off.
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from flask import Response  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+import metrics as metrics_module  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+HEADERS = {'X-User-ID': 'bench-tenant'}
+
+
+ROUNDS = 5
+
+
+def per_call_us(fn, iterations):
+    """Best of ROUNDS timings, to keep scheduler noise out of microsecond costs"""
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(iterations // ROUNDS):
+            fn()
+        best = min(best, (time.perf_counter() - start) / (iterations // ROUNDS))
+    return best * 1e6
+
+
+def hook_cost(iterations):
+    response = Response('{}', mimetype='application/json')
+    with app.test_request_context('/api/sweets', headers=HEADERS):
+        def request_cycle():
+            metrics.start_request()
+            metrics.finish_request(response)
+        cost = per_call_us(request_cycle, iterations)
+    metrics.reset()
+    return cost
+
+
+def _toggle_listeners(on):
+    toggle = event.listen if on else event.remove
+    toggle(Engine, 'before_cursor_execute', metrics_module._before_cursor_execute)
+    toggle(Engine, 'after_cursor_execute', metrics_module._after_cursor_execute)
+
+
+def _time_statements(connection, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        connection.execute(text('SELECT 1'))
+    return (time.perf_counter() - start) / count
+
+
+def statement_cost(iterations):
+    """Extra time per statement while a request is being timed.
+
+    Rounds with and without the listeners are interleaved and the best of
+    each kept, so drift on a busy machine affects both sides alike.
+    """
+    per_round = iterations // ROUNDS
+    with_listeners = without = float('inf')
+    with app.app_context():
+        connection = db.engine.connect()
+        metrics_module._current.set([time.perf_counter(), 0, 0.0, 0.0])
+        for _ in range(ROUNDS):
+            with_listeners = min(with_listeners, _time_statements(connection, per_round))
+            _toggle_listeners(False)
+            without = min(without, _time_statements(connection, per_round))
+            _toggle_listeners(True)
+        metrics_module._current.set(None)
+        connection.close()
+    return (with_listeners - without) * 1e6
+
+
+def end_to_end(client, url, requests, enabled):
+    metrics.enabled = enabled
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get(url, headers=HEADERS)
+        samples.append((time.perf_counter() - start) * 1e6)
+    metrics.enabled = True
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f'request hooks       {hook_cost(args.iterations):8.2f} us/request')
+    print(f'cursor listeners    {statement_cost(args.iterations):8.2f} us/statement')
+
+    client = app.test_client()
+    client.get('/api/health')
+    for url in ('/api/health', '/api/sweets'):
+        on = end_to_end(client, url, args.requests, True)
+        off = end_to_end(client, url, args.requests, False)
+        print(f'{url:<20}{on:8.1f} us on {off:8.1f} us off  (median, test client)')
+
+
+if __name__ == '__main__':
+    main()
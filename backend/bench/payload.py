@@ -0,0 +1,98 @@
+"""Payload size and latency of full vs. projected list responses.
+
+    python -m bench.payload --sweets 5000 --orders 5000
+
+Seeds one large tenant in an in-memory SQLite database and compares the
+default responses with ?fields= / ?expand= projections.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import Sweet, Customer, Order, OrderItem  # noqa: E402
+
+USER_ID = 'bench-tenant'
+HEADERS = {'X-User-ID': USER_ID}
+
+CASES = [
+    ('sweets full', '/api/sweets'),
+    ('sweets fields=id,name,price', '/api/sweets?fields=id,name,price'),
+    ('customers full', '/api/customers'),
+    ('customers fields=id,name', '/api/customers?fields=id,name'),
+    ('orders full', '/api/orders'),
+    ('orders expand= (summaries)', '/api/orders?expand='),
+    ('orders fields=id,status,total_amount',
+     '/api/orders?fields=id,status,total_amount'),
+]
+
+
+def seed(sweets, customers, orders, image_bytes):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    image = 'data:image/png;base64,' + 'A' * image_bytes if image_bytes else ''
+    db.session.execute(db.insert(Sweet), [{
+        'id': i, 'user_id': USER_ID, 'name': f'Sweet {i}',
+        'description': 'A traditional sweet made with milk, sugar and cardamom. ' * 3,
+        'price': round(rng.uniform(1, 50), 2), 'quantity': 1000,
+        'category': rng.choice(['Barfi', 'Ladoo', 'Halwa', 'Peda']),
+        'image_url': image, 'created_at': now, 'updated_at': now
+    } for i in range(1, sweets + 1)])
+    db.session.execute(db.insert(Customer), [{
+        'id': i, 'user_id': USER_ID, 'name': f'Customer {i}',
+        'email': f'customer{i}@example.com', 'phone': '555-0100',
+        'address': f'{i} Market Road', 'created_at': now
+    } for i in range(1, customers + 1)])
+    db.session.execute(db.insert(Order), [{
+        'id': i, 'user_id': USER_ID, 'customer_id': rng.randint(1, customers),
+        'total_amount': 0, 'status': 'pending',
+        'order_date': now - timedelta(minutes=i)
+    } for i in range(1, orders + 1)])
+    db.session.execute(db.insert(OrderItem), [{
+        'order_id': i, 'sweet_id': rng.randint(1, sweets),
+        'quantity': rng.randint(1, 5), 'price': 10.0
+    } for i in range(1, orders + 1) for _ in range(rng.randint(1, 4))])
+    db.session.commit()
+
+
+def measure(client, url, repeat):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=HEADERS)
+        timings.append(time.perf_counter() - start)
+        size = len(response.get_data())
+    return size, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sweets', type=int, default=2000)
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--image-bytes', type=int, default=0,
+                        help='size of an inline image_url per sweet (legacy data)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade()
+        seed(args.sweets, args.customers, args.orders, args.image_bytes)
+
+    client = app.test_client()
+    print(f"{'case':<40}{'bytes':>12}{'median ms':>12}")
+    for name, url in CASES:
+        size, ms = measure(client, url, args.repeat)
+        print(f'{name:<40}{size:>12,}{ms:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
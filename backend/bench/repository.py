@@ -0,0 +1,135 @@
+"""Peak memory and CPU time of ORM vs. Core (repository.py) list loading.
+
+    python -m bench.repository --rows 50000
+    python -m bench.repository --rows 50000 --profile orders:core
+
+Generates one tenant with --rows sweets and --rows orders in a throwaway
+SQLite file (or DATABASE_URL) and loads each full list into response
+dicts two ways, each in a fresh session:
+
+    orm    ORM instances through the session (identity map, instance
+           state, eager loaders), to_dict() per instance
+    core   repository listings: Core SELECTs of plain rows, compiled row
+           serializers, line items in one extra SELECT
+
+CPU time (best of --repeat) and tracemalloc peak are measured in separate
+runs so tracing does not skew the timings. --profile prints the top
+cProfile entries for one list:path.
+"""
+import argparse
+import cProfile
+import gc
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench_repository.db')
+
+import repository  # noqa: E402
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from datagen import generate  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import Customer, Order, Sweet  # noqa: E402
+from pagination import execute, rendered  # noqa: E402
+from routes import order_query  # noqa: E402
+
+PREFIX = 'repository-tenant-'
+USER_ID = f'{PREFIX}0'
+
+
+def orm_list(model):
+    def load():
+        query = order_query(USER_ID) if model is Order else model.query.filter_by(user_id=USER_ID)
+        return [obj.to_dict() for obj in query.all()]
+    return load
+
+
+def core_list(build):
+    def load():
+        listing = build(USER_ID)
+        return rendered(listing, execute(listing.statement).all())
+    return load
+
+
+PATHS = {
+    ('sweets', 'orm'): orm_list(Sweet),
+    ('sweets', 'core'): core_list(repository.sweets),
+    ('customers', 'orm'): orm_list(Customer),
+    ('customers', 'core'): core_list(repository.customers),
+    ('orders', 'orm'): orm_list(Order),
+    ('orders', 'core'): core_list(repository.orders),
+}
+
+
+def run(load):
+    """Call load in a fresh session and return its result"""
+    db.session.remove()
+    try:
+        return load()
+    finally:
+        db.session.remove()
+
+
+def cpu_seconds(load, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.process_time()
+        run(load)
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+def peak_bytes(load):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(load)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--profile', metavar='LIST:PATH',
+                        help='print a cProfile of one run, e.g. orders:core')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade()
+        start = time.perf_counter()
+        generate(1, args.rows, args.customers, args.rows, prefix=PREFIX, skip_existing=True)
+        print(f'seeded in {time.perf_counter() - start:.1f} s')
+
+    with app.test_request_context():
+        if args.profile:
+            name, path = args.profile.split(':')
+            profile = cProfile.Profile()
+            profile.runcall(run, PATHS[name, path])
+            pstats.Stats(profile).sort_stats('cumulative').print_stats(args.top)
+            return
+
+        print(f"{'list':<11}{'path':<6}{'rows':>8}{'cpu ms':>9}{'peak MB':>9}"
+              f"{'cpu':>7}{'memory':>8}")
+        baseline = {}
+        for (name, path), load in PATHS.items():
+            rows = len(run(load))
+            seconds = cpu_seconds(load, args.repeat)
+            peak = peak_bytes(load)
+            cpu_base, peak_base = baseline.setdefault(name, (seconds, peak))
+            print(f'{name:<11}{path:<6}{rows:>8}{seconds * 1000:>9.0f}{peak / 2 ** 20:>9.1f}'
+                  f'{cpu_base / seconds:>6.1f}x{peak_base / peak:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
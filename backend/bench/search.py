@@ -0,0 +1,70 @@
+"""Latency of /api/sweets/search and /api/customers/search on large tenants.
+
+    python -m bench.search --rows 100000
+
+Generates two tenants of --rows sweets and customers each in a throwaway
+SQLite file (or DATABASE_URL) and times typeahead-style queries, from a
+single letter to several words, including one that matches nothing.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench_search.db')
+
+from app import app  # noqa: E402
+from datagen import generate  # noqa: E402
+from migrations import upgrade  # noqa: E402
+
+PREFIX = 'search-tenant-'
+HEADERS = {'X-User-ID': f'{PREFIX}0'}
+
+CASES = [
+    '/api/sweets/search?q=k',
+    '/api/sweets/search?q=ka',
+    '/api/sweets/search?q=kaju',
+    '/api/sweets/search?q=choc tru',
+    '/api/sweets/search?q=barfi&fields=id,name,price',
+    '/api/customers/search?q=p',
+    '/api/customers/search?q=priya.n',
+    '/api/customers/search?q=9347',
+    '/api/customers/search?q=no such customer',
+]
+
+
+def measure(client, url, repeat):
+    client.get(url, headers=HEADERS)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=HEADERS)
+        timings.append(time.perf_counter() - start)
+    return len(response.get_json()), statistics.median(timings) * 1000, max(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='sweets and customers per tenant')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade()
+        start = time.perf_counter()
+        generate(2, args.rows, args.rows, 0, prefix=PREFIX, skip_existing=True)
+        print(f'seeded in {time.perf_counter() - start:.1f} s')
+
+    client = app.test_client()
+    print(f"{'query':<52}{'hits':>6}{'median ms':>12}{'max ms':>10}")
+    for url in CASES:
+        hits, median, worst = measure(client, url, args.repeat)
+        print(f'{url:<52}{hits:>6}{median:>12.2f}{worst:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
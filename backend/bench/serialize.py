@@ -0,0 +1,100 @@
+"""Rows per second serialized for a 100k-row sweet list.
+
+    python -m bench.serialize --rows 100000
+
+Generates one tenant with --rows sweets in a throwaway SQLite file (or
+DATABASE_URL) and times loading the full list and building its JSON body:
+
+    to_dict           ORM objects, to_dict() per row, stdlib encoder (before)
+    compiled+stdlib   plain column rows, compiled row serializer, stdlib encoder
+    compiled+orjson   plain column rows, compiled row serializer, orjson
+
+The compiled paths load the list as GET /api/sweets does. It also times
+GET /api/sweets end to end with each encoder. bench.repository compares
+the ORM and Core paths for customers and orders too.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench_serialize.db')
+os.environ.setdefault('RESPONSE_CACHE', '0')
+
+from app import app  # noqa: E402
+from datagen import generate  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import Sweet  # noqa: E402
+from serializers import (JSONProvider, OrjsonProvider, orjson, row_columns,  # noqa: E402
+                         row_serializer)
+
+PREFIX = 'serialize-tenant-'
+USER_ID = f'{PREFIX}0'
+
+
+def timed(f, repeat):
+    """(result, best time) of repeat calls"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def sweets_before():
+    return Sweet.query.filter_by(user_id=USER_ID).all(), lambda sweet: sweet.to_dict()
+
+
+def sweets_after():
+    return (Sweet.query.filter_by(user_id=USER_ID).with_entities(*row_columns(Sweet)).all(),
+            row_serializer(Sweet))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade()
+        start = time.perf_counter()
+        generate(1, args.rows, 1, 0, prefix=PREFIX, skip_existing=True)
+        print(f'seeded in {time.perf_counter() - start:.1f} s')
+
+    providers = [('stdlib', JSONProvider(app))]
+    if orjson is not None:
+        providers.append(('orjson', OrjsonProvider(app)))
+    else:
+        print('orjson is not installed; skipping it')
+    runs = [('sweets', 'to_dict', sweets_before, providers[0])]
+    runs += [('sweets', f'compiled+{provider[0]}', sweets_after, provider)
+             for provider in providers]
+
+    print(f"{'list':<8}{'path':<18}{'load ms':>9}{'body ms':>9}{'rows/s':>11}{'speedup':>9}")
+    baseline = {}
+    for name, label, load, (_, provider) in runs:
+        app.json = provider
+        with app.test_request_context():
+            (rows, serialize), load_seconds = timed(load, args.repeat)
+            _, body_seconds = timed(
+                lambda: provider.response([serialize(row) for row in rows]), args.repeat)
+        total = load_seconds + body_seconds
+        baseline.setdefault(name, total)
+        print(f'{name:<8}{label:<18}{load_seconds * 1000:>9.0f}{body_seconds * 1000:>9.0f}'
+              f'{len(rows) / total:>11,.0f}{baseline[name] / total:>8.1f}x')
+
+    client = app.test_client()
+    print(f"\n{'GET /api/sweets':<26}{'ms':>9}{'rows/s':>11}")
+    for label, provider in providers:
+        app.json = provider
+        _, seconds = timed(
+            lambda: client.get('/api/sweets', headers={'X-User-ID': USER_ID}), args.repeat)
+        print(f'{label:<26}{seconds * 1000:>9.0f}{args.rows / seconds:>11,.0f}')
+
+
+if __name__ == '__main__':
+    main()
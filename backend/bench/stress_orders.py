@@ -0,0 +1,100 @@
+"""Concurrent checkout stress test: verifies stock is never oversold.
+
+    python -m bench.stress_orders --threads 16 --orders 50 --stock 200
+    DATABASE_URL=postgresql://localhost/sweetshop_bench python -m bench.stress_orders
+
+Many threads place orders against the same few sweets at once. Afterwards
+the remaining stock plus everything sold must equal the starting stock,
+and no sweet may have gone negative. Uses a throwaway SQLite file unless
+DATABASE_URL points somewhere else.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+if 'DATABASE_URL' not in os.environ:
+    _db_file = os.path.join(tempfile.mkdtemp(), 'stress.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_file}'
+
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import Sweet, Order, OrderItem  # noqa: E402
+
+USER_ID = 'stress-tenant'
+HEADERS = {'X-User-ID': USER_ID}
+
+
+def setup(client, sweets, stock):
+    with app.app_context():
+        upgrade()
+        Order.query.filter_by(user_id=USER_ID).delete()
+        Sweet.query.filter_by(user_id=USER_ID).delete()
+        db.session.commit()
+    customer = client.post('/api/customers', headers=HEADERS, json={
+        'name': 'Stress', 'email': f'stress-{random.random()}@example.com'
+    }).get_json()
+    ids = [client.post('/api/sweets', headers=HEADERS, json={
+        'name': f'Stress sweet {i}', 'price': 1.0, 'stock': stock
+    }).get_json()['id'] for i in range(sweets)]
+    return customer['id'], ids
+
+
+def worker(customer_id, sweet_ids, orders, seed, results, lock):
+    rng = random.Random(seed)
+    client = app.test_client()
+    for _ in range(orders):
+        picked = rng.sample(sweet_ids, rng.randint(1, len(sweet_ids)))
+        items = [{'sweet_id': i, 'quantity': rng.randint(1, 5)} for i in picked]
+        response = client.post('/api/orders', headers=HEADERS, json={
+            'customer_id': customer_id, 'items': items})
+        with lock:
+            results[response.status_code] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=50,
+                        help='orders attempted per thread')
+    parser.add_argument('--sweets', type=int, default=3)
+    parser.add_argument('--stock', type=int, default=200)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    customer_id, sweet_ids = setup(client, args.sweets, args.stock)
+    results = Counter()
+    lock = threading.Lock()
+    threads = [threading.Thread(target=worker, args=(
+        customer_id, sweet_ids, args.orders, seed, results, lock))
+        for seed in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        remaining = dict(db.session.query(Sweet.id, Sweet.quantity)
+                         .filter(Sweet.id.in_(sweet_ids)).all())
+        sold = dict(db.session.query(OrderItem.sweet_id, db.func.sum(OrderItem.quantity))
+                    .filter(OrderItem.sweet_id.in_(sweet_ids))
+                    .group_by(OrderItem.sweet_id).all())
+
+    print(f"database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f'responses: {dict(results)}')
+    ok = True
+    for sweet_id in sweet_ids:
+        left, out = remaining[sweet_id], sold.get(sweet_id, 0)
+        balanced = left >= 0 and left + out == args.stock
+        ok = ok and balanced
+        print(f"sweet {sweet_id}: sold {out}, left {left} "
+              f"{'ok' if balanced else 'OVERSOLD/INCONSISTENT'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
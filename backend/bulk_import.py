@@ -0,0 +1,239 @@
+import csv
+import io
+import json
+import math
+from itertools import islice
+from flask import request
+from sqlalchemy import func, insert, select
+from changes import customer_orders, record_changes, upserted
+from database import db
+from images import ImageError, image_reference
+from models import Sweet, Customer
+from stats import recompute_stats
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class UploadError(Exception):
+    """Raised when the upload as a whole cannot be read"""
+
+
+class RowError(ValueError):
+    """Raised by a row validator for a single bad row"""
+
+
+def upload_format():
+    """Pick csv or ndjson from ?format= or the request Content-Type"""
+    fmt = request.args.get('format')
+    if fmt is None:
+        mimetype = request.mimetype or ''
+        fmt = 'csv' if mimetype in ('text/csv', 'application/csv') else 'ndjson'
+    if fmt not in ('csv', 'ndjson'):
+        raise UploadError('format must be csv or ndjson')
+    return fmt
+
+
+def read_rows(stream, fmt):
+    """Yield (row_number, dict) from the request body without buffering it.
+
+    Rows that are not JSON objects come through as None so they can be
+    reported; an unreadable body raises UploadError.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        if fmt == 'csv':
+            yield from enumerate(csv.DictReader(text), start=1)
+            return
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise UploadError(f'Could not read upload: {e}')
+
+
+def _text(row, key, max_length, required=False, default=''):
+    value = row.get(key)
+    if value is None or value == '':
+        if required:
+            raise RowError(f'{key} is required')
+        return default
+    value = str(value).strip()
+    if max_length and len(value) > max_length:
+        raise RowError(f'{key} is longer than {max_length} characters')
+    return value
+
+
+def _number(row, key, cast, default=None):
+    value = row.get(key)
+    if value is None or value == '':
+        if default is None:
+            raise RowError(f'{key} is required')
+        return default
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RowError(f'{key} must be a number')
+    if cast is int and isinstance(value, float) and number != value:
+        # int() would truncate 2.5 to 2
+        raise RowError(f'{key} must be a whole number')
+    if not math.isfinite(number):
+        raise RowError(f'{key} must be a finite number')
+    if number < 0:
+        raise RowError(f'{key} must not be negative')
+    return number
+
+
+def sweet_row(user_id, row):
+    """Validate one uploaded sweet into an insert parameter dict"""
+    stock = row.get('stock')
+    return {
+        'user_id': user_id,
+        'name': _text(row, 'name', 100, required=True),
+        'description': _text(row, 'description', None),
+        'price': _number(row, 'price', float),
+        'quantity': _number(row, 'stock' if stock not in (None, '') else 'quantity',
+                            int, default=0),
+        'category': _text(row, 'category', 50),
+        'image_url': image_reference(_text(row, 'image_url', None))
+    }
+
+
+def customer_row(user_id, row):
+    """Validate one uploaded customer into an upsert parameter dict"""
+    return {
+        'user_id': user_id,
+        'name': _text(row, 'name', 100, required=True),
+        'email': _text(row, 'email', 120, required=True),
+        'phone': _text(row, 'phone', 20),
+        'address': _text(row, 'address', None)
+    }
+
+
+def insert_sweets(rows):
+    db.session.execute(insert(Sweet), rows)
+
+
+def new_sweets(user_id, rows):
+    """Change batches of the sweets insert_sweets(rows) is about to create"""
+    last = db.session.execute(
+        select(func.max(Sweet.id)).where(Sweet.user_id == user_id)).scalar() or 0
+    return [upserted('sweets', select(Sweet.id).where(Sweet.user_id == user_id, Sweet.id > last))]
+
+
+def uploaded_customers(user_id, rows, on_conflict):
+    """Change batches of the customers upsert_customers(rows) writes"""
+    ids = select(Customer.id).where(
+        Customer.user_id == user_id, Customer.email.in_([row['email'] for row in rows]))
+    if on_conflict == 'skip':
+        # Only the customers it inserts; the ones it skips are unchanged
+        last = db.session.execute(
+            select(func.max(Customer.id)).where(Customer.user_id == user_id)).scalar() or 0
+        return [upserted('customers', ids.where(Customer.id > last))]
+    # Updating an existing customer changes the orders that embed it
+    return [upserted('customers', ids), upserted('orders', customer_orders(user_id, ids))]
+
+
+def upsert_customers(rows, on_conflict):
+    """Insert customers, resolving unique_user_email clashes in the database"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.session.execute(insert(Customer), rows)
+        return
+
+    stmt = dialect_insert(Customer)
+    if on_conflict == 'skip':
+        stmt = stmt.on_conflict_do_nothing(index_elements=['user_id', 'email'])
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'email'],
+            set_={name: stmt.excluded[name] for name in ('name', 'phone', 'address')})
+    db.session.execute(stmt, rows)
+
+
+def run_import(user_id, entity, rows, validate, write, written, dedupe_key=None):
+    """Validate and write uploaded rows in chunks of CHUNK_SIZE.
+
+    Each chunk is written with one executemany statement and committed, so
+    memory stays bounded and a bad row only costs itself. A chunk that
+    still fails in the database is reported against all of its rows.
+    written(user_id, chunk), called before the write, returns the
+    upserted() batches it will cause for the change log. Returns the
+    per-row error report.
+    """
+    report = {'processed': 0, 'imported': 0, 'error_count': 0, 'errors': []}
+    seen = set()
+
+    def fail(number, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': number, 'error': message})
+
+    done = False
+    while not done:
+        chunk = []
+        try:
+            chunk.extend(islice(rows, CHUNK_SIZE))
+            done = len(chunk) < CHUNK_SIZE
+        except UploadError as e:
+            fail(None, str(e))
+            done = True
+        valid, numbers = [], []
+        for number, raw in chunk:
+            report['processed'] += 1
+            if not isinstance(raw, dict):
+                fail(number, 'Row is not a JSON object')
+                continue
+            try:
+                params = validate(user_id, raw)
+            except (ValueError, ImageError) as e:
+                fail(number, str(e))
+                continue
+            if dedupe_key:
+                key = params[dedupe_key]
+                if key in seen:
+                    fail(number, f'Duplicate {dedupe_key} {key} in upload')
+                    continue
+                seen.add(key)
+            valid.append(params)
+            numbers.append(number)
+        if not valid:
+            continue
+        try:
+            changes = written(user_id, valid)
+            write(valid)
+            record_changes(user_id, *changes, bump=[entity])
+            db.session.commit()
+            report['imported'] += len(valid)
+        except Exception as e:
+            db.session.rollback()
+            for number in numbers:
+                fail(number, f'Database error: {e.__class__.__name__}')
+
+    recompute_stats(user_id)
+    db.session.commit()
+    return report
+
+
+def import_sweets(user_id):
+    rows = read_rows(request.stream, upload_format())
+    return run_import(user_id, 'sweets', rows, sweet_row, insert_sweets, new_sweets)
+
+
+def import_customers(user_id):
+    on_conflict = request.args.get('on_conflict', 'update')
+    if on_conflict not in ('update', 'skip'):
+        raise UploadError('on_conflict must be update or skip')
+    rows = read_rows(request.stream, upload_format())
+    return run_import(user_id, 'customers', rows, customer_row,
+                      lambda chunk: upsert_customers(chunk, on_conflict),
+                      lambda user_id, chunk: uploaded_customers(user_id, chunk, on_conflict),
+                      dedupe_key='email')
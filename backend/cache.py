@@ -0,0 +1,318 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, g, request
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from compression import compression
+from database import db
+from models import TenantVersion
+
+
+def bump_versions(user_id, *entities):
+    """Advance the tenant's version counter for each entity.
+
+    Called by write handlers before they commit, so the new version becomes
+    visible together with the data and every cached response built from
+    the old data stops matching, in every worker process. On PostgreSQL
+    and SQLite every counter is created or advanced by one INSERT ... ON
+    CONFLICT DO UPDATE, so a tenant's first write costs no more than the
+    rest; elsewhere each counter is updated in turn and a missing row is
+    inserted in a savepoint.
+    """
+    # In one order, so concurrent writers lock the rows alike
+    entities = sorted(set(entities))
+    if not entities:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is not None:
+        db.session.execute(dialect_insert(TenantVersion).values([
+            {'user_id': user_id, 'entity': entity, 'version': 1}
+            for entity in entities
+        ]).on_conflict_do_update(
+            index_elements=['user_id', 'entity'],
+            set_={'version': TenantVersion.version + 1}))
+        return
+
+    for entity in entities:
+        stmt = (update(TenantVersion)
+                .where(TenantVersion.user_id == user_id,
+                       TenantVersion.entity == entity)
+                .values(version=TenantVersion.version + 1)
+                .execution_options(synchronize_session=False))
+        if db.session.execute(stmt).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(TenantVersion(
+                    user_id=user_id, entity=entity, version=1))
+        except IntegrityError:
+            db.session.execute(stmt)
+
+
+def versions_query(user_id, entities):
+    """SELECT of the tenant's stored (entity, version) rows"""
+    return select(TenantVersion.entity, TenantVersion.version).where(
+        TenantVersion.user_id == user_id, TenantVersion.entity.in_(entities))
+
+
+def remember_versions(user_id, entities, rows):
+    """Memoize (entity, version) rows for the rest of the request"""
+    versions = dict(rows)
+    memo = g.setdefault('tenant_versions', {})
+    memo[(user_id, tuple(entities))] = result = [
+        versions.get(entity, 0) for entity in entities]
+    return result
+
+
+def get_versions(user_id, entities):
+    """Current version of each entity for the tenant, 0 if never written.
+
+    Memoized for the rest of the request, so the ETag check and the
+    response cache share a single lookup.
+    """
+    memo = g.get('tenant_versions', {})
+    key = (user_id, tuple(entities))
+    if key in memo:
+        return memo[key]
+    return remember_versions(
+        user_id, entities, db.session.execute(versions_query(user_id, entities)).all())
+
+
+def request_etag(user_id, entities, vary=None):
+    """Weak ETag of this request's tenant, endpoint, query string and versions.
+
+    vary is any other JSON-able value the response depends on.
+    """
+    versions = get_versions(user_id, entities)
+    scope = hashlib.sha1(json.dumps(
+        [user_id, request.endpoint, sorted(request.args.items(multi=True)), vary]
+    ).encode()).hexdigest()[:16]
+    return f"{scope}-{'.'.join(map(str, versions))}"
+
+
+def validated(response, etag):
+    """Attach etag and the private, always-revalidate cache headers"""
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('X-User-ID')
+    if compression.enabled:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def conditional_get(*entities, vary=None):
+    """Answer If-None-Match with 304 using a weak ETag from version counters.
+
+    The validator is derived from the tenant, the URL's query string and
+    the versions of the entities the response is built from, so it is
+    known before the view runs and the body is never serialized for a
+    304. vary is an optional callable returning anything else the
+    response depends on, such as today's date.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = request_etag(request.headers.get('X-User-ID'), entities,
+                                vary() if vary is not None else None)
+
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return validated(response, etag)
+        return decorated_function
+    return decorator
+
+
+class CacheBackend:
+    """Interface for response cache storage.
+
+    Values are opaque bytes. Implementations must be safe to
+    call from several threads; a shared backend (Redis, memcached, ...) lets
+    every worker reuse the same entries.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """Shared backend on top of a redis-py client (optional dependency)"""
+
+    def __init__(self, client, prefix='sweetshop:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """Read-through cache of JSON GET responses keyed per tenant.
+
+    Keys are (user_id, endpoint, normalized query args, entity versions,
+    negotiated Content-Encoding), so a write that bumps a version
+    invalidates every dependent entry without deleting anything; stale
+    entries simply age out of the LRU. Bodies are stored already
+    compressed for the key's encoding, so a hit is never recompressed.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.ttl = 60
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', None)
+        self.enabled = app.config['RESPONSE_CACHE_ENABLED']
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        self.backend = app.config['RESPONSE_CACHE_BACKEND'] or MemoryCache(
+            app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        app.extensions['response_cache'] = self
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.backend) if hasattr(self.backend, '__len__') else None,
+            'evictions': getattr(self.backend, 'evictions', None)
+        }
+
+    def key(self, user_id, entities, vary=None):
+        args = sorted(request.args.items(multi=True))
+        versions = get_versions(user_id, entities)
+        return json.dumps([user_id, request.endpoint, args, versions, compression.negotiate(),
+                           vary], separators=(',', ':'))
+
+    def lookup(self, key):
+        """Cached entry for key, unless the client asked to revalidate"""
+        if not request.cache_control.no_cache:
+            body = self.backend.get(key)
+            if body is not None:
+                self._count(hit=True)
+                return body
+        self._count(hit=False)
+        return None
+
+    def store(self, key, response):
+        """Compress a complete 200 response, keep it under key and return it"""
+        if response.status_code == 200 and not response.is_streamed:
+            compression.apply(response)
+            encoding = response.headers.get('Content-Encoding', '')
+            self.backend.set(key, encoding.encode() + b'\n' + response.get_data(), self.ttl)
+        return response
+
+    @staticmethod
+    def response(entry):
+        """The JSON response for an entry written by store()"""
+        encoding, _, body = entry.partition(b'\n')
+        response = Response(body, mimetype='application/json')
+        if compression.enabled:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding.decode()
+        return response
+
+    def cached(self, *entities, unless=None, vary=None):
+        """Cache a tenant GET view until one of entities changes.
+
+        unless is an optional callable; when it returns True the request
+        bypasses the cache entirely. vary is an optional callable whose
+        result is part of the key, as in conditional_get.
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not self.enabled or (unless is not None and unless()):
+                    return f(*args, **kwargs)
+                key = self.key(request.headers.get('X-User-ID'), entities,
+                               vary() if vary is not None else None)
+                entry = self.lookup(key)
+                if entry is not None:
+                    return self.response(entry)
+                return self.store(key, current_app.make_response(f(*args, **kwargs)))
+            return decorated_function
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Select, delete, func, insert, literal, select
+from cache import bump_versions
+from database import db
+from models import Change, ChangeHorizon, Customer, Order, OrderItem, Sweet
+from pagination import PaginationError, execute, parse_limit, rendered
+import repository
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+ENTITIES = ('sweets', 'customers', 'orders')
+DEFAULT_RETENTION_DAYS = 30
+# Session.info key of the tenants whose changes the transaction logged
+CHANGED_TENANTS = 'changed_tenants'
+
+# entity -> (model, repository listing of the tenant's rows)
+LISTINGS = {
+    'sweets': (Sweet, repository.sweets),
+    'customers': (Customer, repository.customers),
+    'orders': (Order, repository.orders),
+}
+
+
+class ChangeError(Exception):
+    """Raised for a malformed since cursor or entities list"""
+
+
+class CursorExpired(ChangeError):
+    """Raised when since predates tombstones that have been pruned"""
+
+
+def upserted(entity, ids):
+    """Change batch for created or updated rows; ids is a list or a SELECT"""
+    return entity, ids, UPSERT
+
+
+def deleted(entity, ids):
+    """Change batch leaving tombstones for deleted rows"""
+    return entity, ids, DELETE
+
+
+def record_changes(user_id, *batches, bump=()):
+    """Log upserted()/deleted() batches, replacing the rows' previous entries.
+
+    Called by write handlers before they commit, with the entities whose
+    versions the write changes in bump. Those are bumped in the same
+    statement as the tenant's 'changes' version, which runs before the
+    log is written and locks its version row until commit, so the
+    tenant's seqs commit in order and a reader never skips one that
+    commits late.
+    """
+    batches = [batch for batch in batches if isinstance(batch[1], Select) or batch[1]]
+    if not batches:
+        bump_versions(user_id, *bump)
+        return
+    bump_versions(user_id, 'changes', *bump)
+    now = datetime.utcnow()
+    for entity, ids, op in batches:
+        db.session.execute(delete(Change).where(
+            Change.user_id == user_id, Change.entity == entity, Change.entity_id.in_(ids)))
+        if isinstance(ids, Select):
+            ids = ids.subquery()
+            db.session.execute(insert(Change).from_select(
+                ['user_id', 'entity', 'entity_id', 'op', 'changed_at'],
+                select(literal(user_id), literal(entity), *ids.c, literal(op), literal(now))))
+        else:
+            db.session.execute(insert(Change), [
+                {'user_id': user_id, 'entity': entity, 'entity_id': entity_id,
+                 'op': op, 'changed_at': now} for entity_id in ids])
+    db.session.info.setdefault(CHANGED_TENANTS, set()).add(user_id)
+
+
+def customer_orders(user_id, customer_ids):
+    """SELECT of the order ids that embed a customer; customer_ids is an id,
+    a list or a SELECT"""
+    if isinstance(customer_ids, int):
+        customer_ids = [customer_ids]
+    return select(Order.id).where(Order.user_id == user_id, Order.customer_id.in_(customer_ids))
+
+
+def sweet_orders(user_id, sweet_id):
+    """SELECT of the order ids whose line items embed a sweet"""
+    return select(OrderItem.order_id).join(Order).where(
+        Order.user_id == user_id, OrderItem.sweet_id == sweet_id).distinct()
+
+
+def parse_since(value):
+    try:
+        since = int(value)
+    except ValueError:
+        raise ChangeError('since must be a cursor returned by /api/changes')
+    if since < 0:
+        raise ChangeError('since must be a cursor returned by /api/changes')
+    return since
+
+
+def parse_entities(value):
+    if not value:
+        return ENTITIES
+    entities = tuple(dict.fromkeys(name.strip() for name in value.split(',')))
+    unknown = [name for name in entities if name not in ENTITIES]
+    if unknown:
+        raise ChangeError(f"Unknown entities: {', '.join(unknown)}")
+    return entities
+
+
+def head(user_id):
+    """The tenant's current cursor"""
+    latest = db.session.execute(
+        select(func.max(Change.seq)).where(Change.user_id == user_id)).scalar()
+    if latest is None:
+        horizon = db.session.get(ChangeHorizon, user_id)
+        latest = horizon.seq if horizon is not None else 0
+    return str(latest)
+
+
+def changes_since(user_id, since, entities=ENTITIES, limit=None):
+    """Rows changed after since and tombstones for rows deleted after it.
+
+    Returns {"changes": {entity: [row, ...]}, "deleted": {entity: [id, ...]},
+    "cursor", "has_more"}. Rows are rendered as in the list endpoints.
+    Raises CursorExpired when tombstones after since have been pruned.
+    """
+    horizon = db.session.get(ChangeHorizon, user_id)
+    if horizon is not None and since < horizon.seq:
+        raise CursorExpired('Cursor is older than the change log; reload the full lists')
+    try:
+        limit = parse_limit(limit)
+    except PaginationError as e:
+        raise ChangeError(str(e))
+    entries = execute(
+        select(Change.seq, Change.entity, Change.entity_id, Change.op)
+        .where(Change.user_id == user_id, Change.seq > since, Change.entity.in_(entities))
+        .order_by(Change.seq).limit(limit + 1)).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    upserts = {entity: [] for entity in entities}
+    deleted = {entity: [] for entity in entities}
+    for _, entity, entity_id, op in entries:
+        (deleted if op == DELETE else upserts)[entity].append(entity_id)
+    changes = {}
+    for entity, ids in upserts.items():
+        changes[entity] = []
+        if ids:
+            model, build = LISTINGS[entity]
+            listing = build(user_id).filter(model.id.in_(ids))
+            changes[entity] = rendered(listing, execute(listing.statement).all())
+    return {
+        'changes': changes,
+        'deleted': deleted,
+        'cursor': str(entries[-1].seq) if entries else str(since),
+        'has_more': has_more
+    }
+
+
+def compact(retention_days=DEFAULT_RETENTION_DAYS):
+    """Prune tombstones older than retention_days and advance each horizon.
+
+    Upserts need no pruning: a row's new change replaces its old one.
+    Returns the number of tombstones removed.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    pruned = db.session.execute(
+        select(Change.user_id, func.max(Change.seq))
+        .where(Change.op == DELETE, Change.changed_at < cutoff)
+        .group_by(Change.user_id)).all()
+    removed = 0
+    for user_id, seq in pruned:
+        horizon = db.session.get(ChangeHorizon, user_id)
+        if horizon is None:
+            horizon = ChangeHorizon(user_id=user_id, seq=0)
+            db.session.add(horizon)
+        horizon.seq = max(horizon.seq, seq)
+        removed += db.session.execute(delete(Change).where(
+            Change.user_id == user_id, Change.op == DELETE,
+            Change.seq <= seq)).rowcount
+        bump_versions(user_id, 'changes')
+        db.session.commit()
+    return removed
+
+
+@click.group('changes')
+def changes_cli():
+    """Maintain the delta-sync change log"""
+
+
+@changes_cli.command('compact')
+@click.option('--days', default=DEFAULT_RETENTION_DAYS, show_default=True,
+              help='Keep tombstones for this many days')
+@with_appcontext
+def compact_command(days):
+    """Prune old tombstones from the change log"""
+    click.echo(f'Pruned {compact(days)} tombstone(s)')
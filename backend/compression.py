@@ -0,0 +1,140 @@
+"""Content-Encoding negotiation for API responses.
+
+gzip is always available; zstd and br are offered when the optional
+zstandard and brotli packages are installed.
+"""
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Server preference when the client accepts several with the same weight
+ENCODINGS = ('zstd', 'br', 'gzip')
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain')
+
+
+def available_encodings():
+    """ENCODINGS whose compressor is installed"""
+    installed = {'zstd': zstandard is not None, 'br': brotli is not None, 'gzip': True}
+    return [encoding for encoding in ENCODINGS if installed[encoding]]
+
+
+def compress(encoding, data, level):
+    """data compressed in one shot"""
+    if encoding == 'gzip':
+        return zlib.compress(data, level, wbits=31)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def compressor(encoding, level):
+    """(compress(chunk), finish()) pair for an incremental stream"""
+    if encoding == 'gzip':
+        stream = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return stream.compress, stream.flush
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=level)
+        return stream.process, stream.finish
+    stream = zstandard.ZstdCompressor(level=level).compressobj()
+    return stream.compress, stream.flush
+
+
+class Compression:
+    """Compress JSON, CSV and NDJSON responses the client accepts.
+
+    Bodies below COMPRESSION_MIN_SIZE are sent as they are, since headers
+    and CPU would outweigh the saving. Streamed responses are compressed
+    chunk by chunk as they are sent. Responses that already carry a
+    Content-Encoding (e.g. precompressed cache entries) are left alone.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.min_size = 1024
+        self.levels = dict(DEFAULT_LEVELS)
+        self.encodings = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESSION_ENABLED', True)
+        app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESSION_LEVELS', {})
+        app.config.setdefault('COMPRESSION_ENCODINGS', None)
+        self.enabled = app.config['COMPRESSION_ENABLED']
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.levels = dict(DEFAULT_LEVELS, **app.config['COMPRESSION_LEVELS'])
+        allowed = app.config['COMPRESSION_ENCODINGS']
+        self.encodings = [encoding for encoding in available_encodings()
+                          if allowed is None or encoding in allowed]
+        app.extensions['compression'] = self
+
+    def instrument(self, blueprint):
+        """Compress every response of blueprint.
+
+        Register after metrics.instrument() so the metrics count the bytes
+        actually sent.
+        """
+        blueprint.after_request(self.apply)
+
+    def negotiate(self):
+        """Best encoding in Accept-Encoding that we offer, or None"""
+        if not self.enabled or not self.encodings:
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+    def compressible(self, response):
+        return (self.enabled and response.status_code == 200
+                and response.mimetype in COMPRESSIBLE
+                and not response.direct_passthrough
+                and 'Content-Encoding' not in response.headers)
+
+    def apply(self, response, encoding=None):
+        """Compress response in place for the negotiated (or given) encoding"""
+        if not self.compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = encoding or self.negotiate()
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = self._stream(response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(compress(encoding, data, self.levels[encoding]))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _stream(self, response, encoding):
+        source = response.response
+        chunks = response.iter_encoded()
+        compress_chunk, finish = compressor(encoding, self.levels[encoding])
+
+        def generate():
+            try:
+                for chunk in chunks:
+                    data = compress_chunk(chunk)
+                    if data:
+                        yield data
+                yield finish()
+            finally:
+                if hasattr(source, 'close'):
+                    source.close()
+
+        return generate()
+
+
+compression = Compression()
@@ -0,0 +1,224 @@
+import random
+import time
+from itertools import accumulate
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, insert, select
+from analytics import rebuild_sales
+from cache import bump_versions
+from database import db
+from models import (Change, ChangeHorizon, Customer, DailySales, Order, OrderItem, Sweet,
+                    TenantStats)
+from stats import recompute_stats
+
+BATCH_SIZE = 5000
+TENANT_PREFIX = 'synthetic-tenant-'
+# Default 'now' for generated dates, so a seed's rows never depend on the day
+EPOCH = datetime(2025, 1, 1)
+
+# category -> (share of the catalogue, median price, names)
+CATEGORIES = {
+    'Barfi': (0.22, 12.0, ['Kaju Katli', 'Pista Barfi', 'Coconut Barfi', 'Besan Barfi']),
+    'Ladoo': (0.20, 8.0, ['Motichoor Ladoo', 'Besan Ladoo', 'Boondi Ladoo', 'Rava Ladoo']),
+    'Halwa': (0.12, 10.0, ['Gajar Halwa', 'Moong Dal Halwa', 'Sooji Halwa']),
+    'Peda': (0.12, 9.0, ['Mathura Peda', 'Kesar Peda', 'Dharwad Peda']),
+    'Syrup': (0.14, 7.0, ['Gulab Jamun', 'Rasgulla', 'Jalebi', 'Rasmalai']),
+    'Chocolate': (0.10, 15.0, ['Chocolate Barfi', 'Chocolate Truffle', 'Choco Ladoo']),
+    'Dry Fruit': (0.10, 25.0, ['Anjeer Roll', 'Kaju Pista Roll', 'Dry Fruit Ladoo']),
+}
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Meera', 'Arjun',
+               'Kavya', 'Ishaan', 'Diya', 'Kabir', 'Saanvi', 'Aditya', 'Nisha']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Reddy', 'Gupta', 'Khan', 'Singh',
+              'Nair', 'Mehta', 'Das', 'Kulkarni', 'Bose']
+STREETS = ['MG Road', 'Market Road', 'Station Road', 'Temple Street', 'Lake View']
+# weights for 1..6 lines per order, and 1..5 units per line
+LINES_PER_ORDER = [40, 25, 15, 10, 6, 4]
+UNITS_PER_LINE = [50, 25, 12, 8, 5]
+# relative order volume Monday..Sunday and by hour of day
+WEEKDAY_WEIGHTS = [0.9, 0.85, 0.9, 1.0, 1.2, 1.6, 1.5]
+HOUR_WEIGHTS = [0.1] * 8 + [0.6, 0.9, 1.0, 1.1, 1.3, 1.0, 0.8, 0.8,
+                            1.0, 1.4, 1.8, 1.9, 1.5, 0.9, 0.4, 0.2]
+
+
+def zipf_weights(count, exponent=1.1):
+    """Cumulative popularity weights where rank r gets 1 / r**exponent"""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sweet_rows(rng, user_id, count, now, stock=None):
+    names, weights = zip(*((name, share) for name, (share, _, _) in CATEGORIES.items()))
+    for i in range(count):
+        category = rng.choices(names, weights)[0]
+        _, median_price, bases = CATEGORIES[category]
+        yield {
+            'user_id': user_id,
+            'name': f'{rng.choice(bases)} {i + 1}',
+            'description': f'Freshly made {category.lower()} sweet.',
+            'price': round(median_price * rng.lognormvariate(0, 0.35), 2),
+            'quantity': stock if stock is not None else int(rng.paretovariate(1.5) * 20),
+            'category': category,
+            'image_url': '',
+            'created_at': now,
+            'updated_at': now
+        }
+
+
+def customer_rows(rng, user_id, count, now):
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            'user_id': user_id,
+            'name': f'{first} {last}',
+            'email': f'{first.lower()}.{last.lower()}{i + 1}@example.com',
+            'phone': f'+91 9{rng.randrange(10 ** 8, 10 ** 9)}',
+            'address': f'{rng.randint(1, 400)} {rng.choice(STREETS)}',
+            'created_at': now
+        }
+
+
+def order_date(rng, now, days):
+    """A time in the last `days` days, busier on weekends and evenings"""
+    while True:
+        day = now - timedelta(days=rng.randrange(days))
+        if rng.random() * max(WEEKDAY_WEIGHTS) <= WEEKDAY_WEIGHTS[day.weekday()]:
+            break
+    hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+    return day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60),
+                       microsecond=0)
+
+
+def generate_orders(rng, user_id, count, sweets, customer_ids, now, days):
+    """Yield (order row, line rows) pairs with skewed sweet and customer picks"""
+    sweet_weights = zipf_weights(len(sweets))
+    # A few regulars place most orders
+    customer_weights = zipf_weights(len(customer_ids), exponent=0.8)
+    lines_weights = list(accumulate(LINES_PER_ORDER))
+    units_weights = list(accumulate(UNITS_PER_LINE))
+    for _ in range(count):
+        date = order_date(rng, now, days)
+        age = (now - date).days
+        status = rng.choices(['completed', 'cancelled', 'pending'],
+                             [90, 5, 5] if age > 3 else [40, 5, 55])[0]
+        picked = {}
+        for _ in range(rng.choices(range(1, 7), cum_weights=lines_weights)[0]):
+            sweet_id, price = rng.choices(sweets, cum_weights=sweet_weights)[0]
+            picked[sweet_id] = (price, rng.choices(range(1, 6), cum_weights=units_weights)[0])
+        lines = [{'sweet_id': sweet_id, 'quantity': quantity, 'price': price}
+                 for sweet_id, (price, quantity) in picked.items()]
+        yield {
+            'user_id': user_id,
+            'customer_id': rng.choices(customer_ids, cum_weights=customer_weights)[0],
+            'total_amount': round(sum(l['price'] * l['quantity'] for l in lines), 2),
+            'status': status,
+            'order_date': date
+        }, lines
+
+
+def reset_tenant(user_id):
+    """Delete the tenant's rows, counters and change log.
+
+    Version counters are bumped rather than deleted, so no ETag or cached
+    response from before the reset can match again.
+    """
+    order_ids = select(Order.id).where(Order.user_id == user_id)
+    db.session.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    for model in (DailySales, Order, Customer, Sweet, TenantStats, Change, ChangeHorizon):
+        db.session.execute(delete(model).where(model.user_id == user_id))
+    bump_versions(user_id, 'sweets', 'customers', 'orders', 'stats', 'changes')
+    db.session.commit()
+
+
+def generate_tenant(rng, user_id, sweets, customers, orders, days=365, stock=None,
+                    now=EPOCH):
+    """Bulk-load one tenant in BATCH_SIZE batches and rebuild its counters and rollup"""
+    for batch in batched(sweet_rows(rng, user_id, sweets, now, stock)):
+        db.session.execute(insert(Sweet.__table__), batch)
+    for batch in batched(customer_rows(rng, user_id, customers, now)):
+        db.session.execute(insert(Customer.__table__), batch)
+    db.session.commit()
+
+    sweet_catalogue = db.session.execute(
+        select(Sweet.id, Sweet.price).where(Sweet.user_id == user_id)
+        .order_by(Sweet.id)).all()
+    # Popularity is independent of insertion order
+    rng.shuffle(sweet_catalogue)
+    customer_ids = db.session.scalars(
+        select(Customer.id).where(Customer.user_id == user_id).order_by(Customer.id)).all()
+    if orders and sweet_catalogue and customer_ids:
+        pairs = generate_orders(rng, user_id, orders, [tuple(s) for s in sweet_catalogue],
+                                customer_ids, now, days)
+        for batch in batched(pairs):
+            order_ids = db.session.scalars(
+                insert(Order.__table__).returning(Order.id, sort_by_parameter_order=True),
+                [order for order, _ in batch]).all()
+            db.session.execute(insert(OrderItem.__table__), [
+                dict(line, order_id=order_id)
+                for order_id, (_, lines) in zip(order_ids, batch) for line in lines])
+            db.session.commit()
+
+    recompute_stats(user_id)
+    rebuild_sales(db.session.connection(), user_id)
+    bump_versions(user_id, 'sweets', 'customers', 'orders', 'stats')
+    db.session.commit()
+
+
+def generate(tenants, sweets, customers, orders, seed=0, prefix=TENANT_PREFIX,
+             days=365, stock=None, reset=False, skip_existing=False, progress=None,
+             now=EPOCH):
+    """Generate `tenants` tenants named prefix0, prefix1, ...
+
+    Order dates fall in the `days` days up to `now`. The same seed and now
+    always produce the same rows, so benchmark databases built on
+    different machines and days are comparable.
+    """
+    for t in range(tenants):
+        user_id = f'{prefix}{t}'
+        # Every tenant gets its own stream, so --tenants does not shift the others
+        rng = random.Random(f'{seed}:{user_id}')
+        if reset:
+            reset_tenant(user_id)
+        elif skip_existing and db.session.scalar(
+                select(Sweet.id).where(Sweet.user_id == user_id).limit(1)) is not None:
+            continue
+        generate_tenant(rng, user_id, sweets, customers, orders, days, stock, now)
+        if progress:
+            progress(user_id)
+
+
+@click.group('seed')
+def seed_cli():
+    """Synthetic data for development and benchmarks"""
+
+
+@seed_cli.command('generate')
+@click.option('--tenants', default=1, show_default=True)
+@click.option('--sweets', default=200, show_default=True, help='per tenant')
+@click.option('--customers', default=500, show_default=True, help='per tenant')
+@click.option('--orders', default=5000, show_default=True, help='per tenant')
+@click.option('--days', default=365, show_default=True, help='spread of order dates')
+@click.option('--now', type=click.DateTime(), default=EPOCH.isoformat(), show_default=True,
+              help='latest order date; pass today\'s date for recent sales')
+@click.option('--seed', default=0, show_default=True, help='random seed')
+@click.option('--prefix', default=TENANT_PREFIX, show_default=True, help='tenant user_id prefix')
+@click.option('--reset', is_flag=True, help='delete the tenants\' existing data first')
+@with_appcontext
+def generate_command(tenants, sweets, customers, orders, days, now, seed, prefix, reset):
+    """Generate tenants x sweets x customers x orders with realistic skew"""
+    start = time.perf_counter()
+    generate(tenants, sweets, customers, orders, seed=seed, prefix=prefix,
+             days=days, reset=reset, now=now,
+             progress=lambda user_id: click.echo(
+                 f'{user_id}: done ({time.perf_counter() - start:.1f} s)'))
+    click.echo(f'Generated {tenants} tenant(s) in {time.perf_counter() - start:.1f} s')
@@ -0,0 +1,244 @@
+"""Server-sent events for inventory and order changes (GET /api/stream).
+
+Write handlers log their changes (changes.py). Once the transaction
+commits, the tenant is published through an EventBackend, which wakes
+that tenant's open streams in every worker. Each stream then reads the
+change log from its own cursor. Events survive reconnects, since
+Last-Event-ID is a change log cursor. A stream also holds no queue: any
+number of writes between two reads is a single wake-up and one read.
+"""
+import logging
+import threading
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import event
+from changes import CHANGED_TENANTS, CursorExpired, changes_since, head, parse_since
+from database import db
+
+STREAM_ENTITIES = ('sweets', 'orders')
+# Client reconnect delay sent in the stream's retry field
+RETRY_MS = 3000
+
+logger = logging.getLogger(__name__)
+
+
+class StreamLimit(Exception):
+    """Raised when the worker already holds STREAM_MAX_CONNECTIONS streams"""
+
+
+class EventBackend:
+    """Interface for fanning tenant notifications out to every worker.
+
+    publish(user_id) is called after a tenant's write commits; it must end
+    up calling the listener given to subscribe() in every worker process,
+    including the publishing one.
+    """
+
+    def publish(self, user_id):
+        raise NotImplementedError
+
+    def subscribe(self, listener):
+        raise NotImplementedError
+
+
+class LocalBackend(EventBackend):
+    """Single-process backend: notifications never leave the worker"""
+
+    def __init__(self):
+        self.listeners = []
+
+    def publish(self, user_id):
+        for listener in self.listeners:
+            listener(user_id)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+
+class RedisBackend(EventBackend):
+    """Redis pub/sub on top of a redis-py client (optional dependency)"""
+
+    def __init__(self, client, channel='sweetshop:changes'):
+        self.client = client
+        self.channel = channel
+        self.thread = None
+
+    def publish(self, user_id):
+        self.client.publish(self.channel, user_id)
+
+    def subscribe(self, listener):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+
+        def handle(message):
+            data = message['data']
+            listener(data.decode() if isinstance(data, bytes) else data)
+
+        pubsub.subscribe(**{self.channel: handle})
+        self.thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+class Subscription:
+    """One open stream's wake-up flag"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._woken = threading.Event()
+
+    def wake(self):
+        self._woken.set()
+
+    def wait(self, timeout):
+        """Block until woken or timeout; True if woken"""
+        woken = self._woken.wait(timeout)
+        self._woken.clear()
+        return woken
+
+
+def format_event(name, data, id=None):
+    """One text/event-stream message; data is JSON-encoded on one line"""
+    message = f'event: {name}\ndata: {current_app.json.dumps(data)}\n'
+    if id is not None:
+        message += f'id: {id}\n'
+    return message + '\n'
+
+
+class EventBroker:
+    """Per-worker registry of open streams, woken through an EventBackend.
+
+    Tenants written in a transaction are published after it commits and
+    forgotten if it rolls back. A stream reads at most STREAM_BATCH change
+    entries at a time, so its memory stays bounded however far behind its
+    cursor is.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.heartbeat = 15
+        self.batch = 100
+        self.max_connections = 100
+        self._subscriptions = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('STREAM_BACKEND', None)
+        app.config.setdefault('STREAM_HEARTBEAT', 15)
+        app.config.setdefault('STREAM_BATCH', 100)
+        app.config.setdefault('STREAM_MAX_CONNECTIONS', 100)
+        self.backend = app.config['STREAM_BACKEND'] or LocalBackend()
+        self.heartbeat = app.config['STREAM_HEARTBEAT']
+        self.batch = app.config['STREAM_BATCH']
+        self.max_connections = app.config['STREAM_MAX_CONNECTIONS']
+        self.backend.subscribe(self.wake)
+        if not event.contains(db.session, 'after_commit', self._after_commit):
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.extensions['events'] = self
+
+    def _after_commit(self, session):
+        for user_id in session.info.pop(CHANGED_TENANTS, ()):
+            try:
+                self.backend.publish(user_id)
+            except Exception:
+                # The write has committed; streams catch up at their next heartbeat
+                logger.exception('Could not publish changes for %s', user_id)
+
+    def _after_rollback(self, session):
+        session.info.pop(CHANGED_TENANTS, None)
+
+    def wake(self, user_id):
+        """Wake the tenant's streams in this worker"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.wake()
+
+    def subscribe(self, user_id):
+        """Register a stream for the tenant; call unsubscribe() when it ends"""
+        with self._lock:
+            if self._count >= self.max_connections:
+                raise StreamLimit('Too many open event streams; retry later')
+            subscription = Subscription(user_id)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+            self._count -= 1
+
+    def pending(self, user_id, cursor):
+        """Yield (message, cursor) for the changes after cursor, batch by batch.
+
+        Each batch ends with the event carrying its cursor as id, so a
+        client cut off mid-batch resumes at the batch's start.
+        """
+        while True:
+            try:
+                batch = changes_since(user_id, int(cursor), STREAM_ENTITIES, self.batch)
+            except CursorExpired:
+                batch = None
+                cursor = head(user_id)
+            finally:
+                # Release the connection while the stream idles
+                db.session.close()
+            if batch is None:
+                yield format_event('reset', {'cursor': cursor}, id=cursor), cursor
+                return
+            messages = [(name, batch['changes'][name]) for name in STREAM_ENTITIES
+                        if batch['changes'][name]]
+            deleted = {name: ids for name, ids in batch['deleted'].items() if ids}
+            if deleted:
+                messages.append(('deleted', deleted))
+            cursor = batch['cursor']
+            for i, (name, data) in enumerate(messages, 1):
+                yield format_event(name, data, id=cursor if i == len(messages) else None), cursor
+            if not batch['has_more']:
+                return
+
+    def stream(self, subscription, cursor):
+        """text/event-stream chunks for subscription from cursor onwards.
+
+        The change log is read again after every wake-up and heartbeat, so
+        a lost notification delays events by one heartbeat at most.
+        """
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            for message, cursor in self.pending(subscription.user_id, cursor):
+                yield message
+            if not subscription.wait(self.heartbeat):
+                yield ': heartbeat\n\n'
+
+
+broker = EventBroker()
+
+
+def event_stream(user_id, last_event_id=None):
+    """text/event-stream Response of the tenant's changes.
+
+    Starts after last_event_id when the client is resuming, otherwise at
+    the tenant's current cursor. Raises StreamLimit when the worker is
+    full.
+    """
+    cursor = parse_since(last_event_id) if last_event_id else None
+    subscription = broker.subscribe(user_id)
+    try:
+        # Subscribed first, so a write committing meanwhile still wakes us
+        if cursor is None:
+            cursor = head(user_id)
+        response = Response(stream_with_context(broker.stream(subscription, cursor)),
+                            mimetype='text/event-stream')
+    except Exception:
+        broker.unsubscribe(subscription)
+        raise
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from database import db
+from models import Customer, Order, OrderItem, Sweet
+
+EXPORT_BATCH_SIZE = 1000
+FLUSH_ROWS = 500
+
+CSV_COLUMNS = (
+    'order_id', 'order_date', 'status', 'total_amount',
+    'customer_id', 'customer_name', 'customer_email',
+    'item_id', 'sweet_id', 'sweet_name', 'quantity', 'price', 'subtotal'
+)
+
+
+class ExportError(Exception):
+    """Raised for invalid export parameters"""
+
+
+def parse_date_range(date_from, date_to):
+    """Parse ISO from/to bounds; a bare `to` date includes that whole day"""
+    try:
+        start = datetime.fromisoformat(date_from) if date_from else None
+        end = datetime.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        raise ExportError('from and to must be ISO 8601 dates')
+    if end is not None and len(date_to) == 10:
+        end += timedelta(days=1)
+    return start, end
+
+
+def export_rows(user_id, start=None, end=None):
+    """Stream one row per order line, joined with its order, customer and sweet.
+
+    Orders without lines still yield one row with empty item columns. The
+    result is read in EXPORT_BATCH_SIZE batches from a server-side cursor
+    where the driver supports one.
+    """
+    stmt = (
+        select(Order.id, Order.order_date, Order.status, Order.total_amount,
+               Customer.id, Customer.name, Customer.email,
+               OrderItem.id, OrderItem.sweet_id, Sweet.name,
+               OrderItem.quantity, OrderItem.price)
+        .select_from(Order)
+        .join(Customer, Customer.id == Order.customer_id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Sweet, Sweet.id == OrderItem.sweet_id)
+        .where(Order.user_id == user_id)
+        .order_by(Order.order_date, Order.id, OrderItem.id)
+    )
+    if start is not None:
+        stmt = stmt.where(Order.order_date >= start)
+    if end is not None:
+        stmt = stmt.where(Order.order_date < end)
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        quantity, price = row[10], row[11]
+        yield tuple(row) + (
+            quantity * price if quantity is not None else None,)
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow((row[0], row[1].isoformat()) + row[2:])
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    """One JSON object per order, with its lines nested under items"""
+    lines = []
+    order = None
+    for row in rows:
+        if order is None or order['id'] != row[0]:
+            if order is not None:
+                lines.append(json.dumps(order) + '\n')
+                if len(lines) >= FLUSH_ROWS:
+                    yield ''.join(lines)
+                    lines = []
+            order = {
+                'id': row[0],
+                'order_date': row[1].isoformat(),
+                'status': row[2],
+                'total_amount': row[3],
+                'customer': {'id': row[4], 'name': row[5], 'email': row[6]},
+                'items': []
+            }
+        if row[7] is not None:
+            order['items'].append({
+                'id': row[7], 'sweet_id': row[8], 'sweet_name': row[9],
+                'quantity': row[10], 'price': row[11], 'subtotal': row[12]
+            })
+    if order is not None:
+        lines.append(json.dumps(order) + '\n')
+    yield ''.join(lines)
+
+
+def export_response(user_id, fmt, date_from=None, date_to=None):
+    """Streaming attachment of the tenant's orders in csv or ndjson"""
+    if fmt not in ('csv', 'ndjson'):
+        raise ExportError('format must be csv or ndjson')
+    start, end = parse_date_range(date_from, date_to)
+    rows = export_rows(user_id, start, end)
+    if fmt == 'csv':
+        body, mimetype = csv_chunks(rows), 'text/csv'
+    else:
+        body, mimetype = ndjson_chunks(rows), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=orders.{fmt}'}
+    )
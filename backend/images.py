@@ -0,0 +1,181 @@
+import base64
+import binascii
+import hashlib
+import io
+import re
+import click
+from flask import make_response, request
+from flask.cli import with_appcontext
+from cache import bump_versions
+from database import db
+from models import Image, Sweet
+
+IMAGE_URL_PREFIX = '/api/images/'
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+THUMBNAIL_SIZE = (320, 320)
+CACHE_MAX_AGE = 365 * 24 * 3600
+MIGRATION_BATCH_SIZE = 100
+
+# Served back from the API origin, so only raster formats whose bytes are
+# checked: SVG and anything else that can carry script is refused
+IMAGE_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp')
+TYPE_ALIASES = {'image/jpg': 'image/jpeg', 'image/pjpeg': 'image/jpeg'}
+
+DATA_URL_RE = re.compile(
+    r'^data:(?P<type>image/[\w.+-]+)(?:;[\w=-]+)*;base64,(?P<data>.*)$', re.S)
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ImageError(Exception):
+    """Raised for uploads that are not acceptable images"""
+
+
+def parse_data_url(value):
+    """Split a base64 image data URL into (content_type, bytes)"""
+    match = DATA_URL_RE.match(value)
+    if not match:
+        raise ImageError('Only base64 image data URLs are supported')
+    try:
+        data = base64.b64decode(match.group('data'), validate=True)
+    except (binascii.Error, ValueError):
+        raise ImageError('Invalid base64 image data')
+    return match.group('type'), data
+
+
+def sniff_image_type(data):
+    """Content type given by the image's magic bytes, or None"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def make_thumbnail(data):
+    """Decode an image and downscale it to THUMBNAIL_SIZE.
+
+    Decoding doubles as validation: data Pillow cannot read is rejected.
+    Pillow is imported here rather than at module level so it only costs
+    time when an image is actually uploaded, not on every cold start.
+    """
+    from PIL import Image as PILImage
+    try:
+        with PILImage.open(io.BytesIO(data)) as img:
+            img.thumbnail(THUMBNAIL_SIZE)
+            out = io.BytesIO()
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img.save(out, format='PNG', optimize=True)
+                return out.getvalue(), 'image/png'
+            img.convert('RGB').save(out, format='JPEG', quality=85)
+            return out.getvalue(), 'image/jpeg'
+    except Exception:
+        raise ImageError('Image data could not be decoded')
+
+
+def store_image(data, content_type):
+    """Store image bytes once under their SHA-256 and return the hash"""
+    content_type = TYPE_ALIASES.get(content_type, content_type)
+    if content_type not in IMAGE_TYPES:
+        raise ImageError('Image must be PNG, JPEG, GIF or WebP')
+    if not data:
+        raise ImageError('Image is empty')
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ImageError('Image is larger than 5 MB')
+    if sniff_image_type(data) != content_type:
+        raise ImageError(f'File is not a valid {content_type} image')
+
+    digest = hashlib.sha256(data).hexdigest()
+    if db.session.get(Image, digest) is None:
+        thumbnail, thumbnail_type = make_thumbnail(data)
+        db.session.add(Image(
+            hash=digest,
+            content_type=content_type,
+            data=data,
+            thumbnail=thumbnail,
+            thumbnail_type=thumbnail_type
+        ))
+    return digest
+
+
+def image_reference(value):
+    """Replace an inline data URL with a short /api/images/<hash> reference.
+
+    Any other value (empty, external URL, existing reference) is returned
+    unchanged.
+    """
+    if not value or not value.startswith('data:'):
+        return value
+    content_type, data = parse_data_url(value)
+    return IMAGE_URL_PREFIX + store_image(data, content_type)
+
+
+def image_response(digest, size=None):
+    """Serve a stored image with immutable caching and a strong ETag.
+
+    Returns None for unknown hashes and for anything stored before uploads
+    were restricted to IMAGE_TYPES. Raises ImageError for a thumbnail the
+    image does not have.
+    """
+    image = db.session.get(Image, digest) if HASH_RE.match(digest) else None
+    if image is None or image.content_type not in IMAGE_TYPES:
+        return None
+
+    data, content_type, etag = image.data, image.content_type, digest
+    if size == 'thumb':
+        if not image.thumbnail:
+            raise ImageError('No thumbnail was made for this image')
+        data, content_type = image.thumbnail, image.thumbnail_type
+        etag = f'{digest}-thumb'
+
+    response = make_response(data)
+    response.content_type = content_type
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = "default-src 'none'"
+    return response.make_conditional(request)
+
+
+def migrate_inline_images(batch_size=MIGRATION_BATCH_SIZE):
+    """Move data URLs out of sweets.image_url into the image store.
+
+    Works in batches by id and commits after each one, so it can be
+    interrupted and re-run safely. Returns the number of sweets rewritten.
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        sweets = (Sweet.query
+                  .filter(Sweet.id > last_id, Sweet.image_url.like('data:%'))
+                  .order_by(Sweet.id)
+                  .limit(batch_size)
+                  .all())
+        if not sweets:
+            return migrated
+        for sweet in sweets:
+            last_id = sweet.id
+            try:
+                sweet.image_url = image_reference(sweet.image_url)
+                bump_versions(sweet.user_id, 'sweets')
+                migrated += 1
+            except ImageError as e:
+                click.echo(f'Skipping sweet {sweet.id}: {e}')
+        db.session.commit()
+
+
+@click.group('images')
+def images_cli():
+    """Manage the content-addressed image store"""
+
+
+@images_cli.command('migrate')
+@with_appcontext
+def migrate_command():
+    """Move inline base64 images out of sweets.image_url"""
+    click.echo(f'Migrated {migrate_inline_images()} sweet image(s)')
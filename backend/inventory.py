@@ -0,0 +1,81 @@
+from sqlalchemy import case, update
+from sqlalchemy.orm import load_only
+from database import db
+from models import Sweet
+
+
+class StockError(ValueError):
+    """Raised when order lines are invalid or cannot be fulfilled"""
+
+
+def parse_order_lines(items):
+    """Validate order items into an insertion-ordered {sweet_id: quantity}"""
+    if not isinstance(items, (list, type(None))):
+        raise StockError('items must be a list')
+    lines = {}
+    for item in items or []:
+        try:
+            sweet_id = int(item['sweet_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise StockError('Each item needs an integer sweet_id and quantity')
+        if quantity < 1:
+            raise StockError(f'Quantity for sweet {sweet_id} must be positive')
+        if sweet_id in lines:
+            raise StockError(f'Duplicate sweet_id {sweet_id} in order items')
+        lines[sweet_id] = quantity
+    return lines
+
+
+def reserve_stock(user_id, lines):
+    """Look up and decrement stock for every order line in two statements.
+
+    The sweets are fetched with a single IN query (row-locked in id order on
+    databases that support SELECT ... FOR UPDATE) and decremented with one
+    conditional UPDATE that only touches rows still holding enough stock.
+    A rowcount short of the number of lines means another checkout got
+    there first, so the caller's transaction must be rolled back.
+
+    Returns {sweet_id: Sweet} with the ids, names and prices used to price
+    the order.
+    """
+    if not lines:
+        return {}
+    sweets = {sweet.id: sweet for sweet in (
+        Sweet.query
+        .options(load_only(Sweet.id, Sweet.name, Sweet.price, Sweet.quantity))
+        .filter(Sweet.user_id == user_id, Sweet.id.in_(lines))
+        .order_by(Sweet.id)
+        .with_for_update()
+        .all())}
+    for sweet_id in lines:
+        if sweet_id not in sweets:
+            raise StockError(f'Sweet with ID {sweet_id} not found')
+
+    needed = case(lines, value=Sweet.id)
+    result = db.session.execute(
+        update(Sweet)
+        .where(Sweet.user_id == user_id,
+               Sweet.id.in_(lines),
+               Sweet.quantity >= needed)
+        .values(quantity=Sweet.quantity - needed)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(lines):
+        short = [sweets[sweet_id].name for sweet_id, quantity in lines.items()
+                 if sweets[sweet_id].quantity < quantity]
+        raise StockError(
+            f"Insufficient stock for {', '.join(short) or 'one or more sweets'}")
+    return sweets
+
+
+def restore_stock(lines):
+    """Atomically add order line quantities back to their sweets"""
+    if not lines:
+        return
+    db.session.execute(
+        update(Sweet)
+        .where(Sweet.id.in_(lines))
+        .values(quantity=Sweet.quantity + case(lines, value=Sweet.id))
+        .execution_options(synchronize_session=False)
+    )
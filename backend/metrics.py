@@ -0,0 +1,152 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+COUNTERS = (
+    ('sweetshop_db_statements_total', 'statements',
+     'SQL statements executed while serving requests.'),
+    ('sweetshop_db_duration_seconds_total', 'db_seconds',
+     'Time spent in SQL statements while serving requests.'),
+    ('sweetshop_http_response_bytes_total', 'bytes',
+     'Response body bytes; streamed responses are not counted.'),
+)
+
+# [request started, statements, db_seconds, statement started] for the
+# request running in this context
+_current = ContextVar('metrics_request', default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = _current.get()
+    if state is not None:
+        state[3] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = _current.get()
+    if state is not None:
+        state[1] += 1
+        state[2] += time.perf_counter() - state[3]
+
+
+class RouteMetrics:
+    __slots__ = ('buckets', 'count', 'seconds', 'statements', 'db_seconds',
+                 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.bytes = 0
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Metrics:
+    """Per-route latency histograms, SQL statement counts and DB time.
+
+    Requests are keyed by (url rule, method, status), so label cardinality
+    is bounded by the route table. Statements are counted with cursor
+    events on every engine while a request is being timed. Counters are
+    per process; with several workers, scrape each one.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.routes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        self.enabled = app.config['METRICS_ENABLED']
+        app.extensions['metrics'] = self
+        if self.enabled and not event.contains(
+                Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def instrument(self, blueprint):
+        """Time every request routed to blueprint"""
+        blueprint.before_request(self.start_request)
+        blueprint.after_request(self.finish_request)
+
+    def start_request(self):
+        if self.enabled:
+            now = time.perf_counter()
+            _current.set([now, 0, 0.0, now])
+
+    def finish_request(self, response):
+        state = _current.get()
+        if state is None:
+            return response
+        _current.set(None)
+        elapsed = time.perf_counter() - state[0]
+        # Unwrap the proxies once; each proxied attribute costs a context lookup
+        req = request._get_current_object()
+        rule = req.url_rule
+        key = (rule.rule if rule is not None else '<unmatched>',
+               req.method, response.status_code)
+        size = int(response.headers.get('Content-Length', 0))
+        with self._lock:
+            route = self.routes.get(key)
+            if route is None:
+                route = self.routes[key] = RouteMetrics()
+            route.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            route.count += 1
+            route.seconds += elapsed
+            route.statements += state[1]
+            route.db_seconds += state[2]
+            route.bytes += size
+        return response
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+
+    def render(self):
+        """All counters in the Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted(self.routes.items())
+            lines = [
+                '# HELP sweetshop_http_request_duration_seconds '
+                'Request latency by route, method and status.',
+                '# TYPE sweetshop_http_request_duration_seconds histogram',
+            ]
+            for (rule, method, status), route in routes:
+                labels = f'route="{_label(rule)}",method="{method}",status="{status}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), route.buckets):
+                    cumulative += count
+                    lines.append(f'sweetshop_http_request_duration_seconds_bucket'
+                                 f'{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'sweetshop_http_request_duration_seconds_sum'
+                             f'{{{labels}}} {route.seconds:.6f}')
+                lines.append(f'sweetshop_http_request_duration_seconds_count'
+                             f'{{{labels}}} {route.count}')
+
+            for name, attr, help_text in COUNTERS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (rule, method, status), route in routes:
+                    value = getattr(route, attr)
+                    if isinstance(value, float):
+                        value = f'{value:.6f}'
+                    lines.append(f'{name}{{route="{_label(rule)}",method="{method}",'
+                                 f'status="{status}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,262 @@
+import threading
+from datetime import datetime
+import click
+from flask import current_app, jsonify
+from flask.cli import with_appcontext
+from sqlalchemy import func, inspect, literal_column, select, text
+from sqlalchemy.exc import DBAPIError
+from database import db
+from analytics import rebuild_sales
+from models import Change, ChangeHorizon, DailySales, Order, OrderItem, Sweet
+from search import create_search_indexes
+
+SCHEMA_TABLE = 'schema_migrations'
+LOCK_KEY = 7311
+
+HOT_INDEXES = (
+    ('ix_sweets_user_id_category', 'sweets', ('user_id', 'category')),
+    ('ix_orders_user_id_status', 'orders', ('user_id', 'status')),
+    ('ix_orders_user_id_order_date', 'orders', ('user_id', 'order_date', 'id')),
+    ('ix_orders_customer_id', 'orders', ('customer_id',)),
+    ('ix_order_items_order_id', 'order_items', ('order_id',)),
+    ('ix_order_items_sweet_id', 'order_items', ('sweet_id',)),
+)
+
+
+def baseline(connection):
+    """Create every table (and its indexes) that does not exist yet"""
+    db.metadata.create_all(connection)
+
+
+def hot_query_indexes(connection):
+    """Composite indexes for the tenant-scoped filters and sorts in routes.py"""
+    for name, table, columns in HOT_INDEXES:
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+def daily_sales(connection):
+    """Create the sales rollup and fill it from the existing orders"""
+    DailySales.__table__.create(connection, checkfirst=True)
+    rebuild_sales(connection)
+
+
+def change_log(connection):
+    """Create the delta-sync change log and its compaction horizons"""
+    Change.__table__.create(connection, checkfirst=True)
+    ChangeHorizon.__table__.create(connection, checkfirst=True)
+
+
+# Append-only: never edit or reorder an entry once it has been released.
+# The baseline builds fresh databases from the current models, so later
+# steps must tolerate objects that already exist.
+MIGRATIONS = (
+    (1, 'Baseline schema', baseline),
+    (2, 'Composite indexes for hot query shapes', hot_query_indexes),
+    (3, 'Full-text search indexes for sweets and customers', create_search_indexes),
+    (4, 'Daily sales rollup', daily_sales),
+    (5, 'Change log for delta sync', change_log),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+class SchemaError(Exception):
+    """Raised when the database schema is older than the code"""
+
+
+def _ensure_schema_table(connection):
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} ('
+        'version INTEGER PRIMARY KEY, '
+        'description VARCHAR(200) NOT NULL, '
+        'applied_at TIMESTAMP NOT NULL)'))
+
+
+def applied_versions(connection):
+    if not inspect(connection).has_table(SCHEMA_TABLE):
+        return {}
+    rows = connection.execute(text(
+        f'SELECT version, applied_at FROM {SCHEMA_TABLE} ORDER BY version'))
+    return dict(rows.all())
+
+
+def current_version(connection):
+    return max(applied_versions(connection), default=0)
+
+
+def pending(connection):
+    applied = applied_versions(connection)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def schema_version(engine=None):
+    """Applied schema version in one primary-key query, 0 if never migrated"""
+    engine = engine or db.engine
+    with engine.connect() as connection:
+        try:
+            return connection.execute(text(
+                f'SELECT MAX(version) FROM {SCHEMA_TABLE}')).scalar() or 0
+        except DBAPIError:
+            return 0
+
+
+def upgrade(engine=None):
+    """Apply pending migrations in order, each in its own transaction.
+
+    Returns the list of versions applied. On PostgreSQL the runner holds an
+    advisory lock, so several processes starting at once apply each
+    migration exactly once.
+    """
+    engine = engine or db.engine
+    applied = []
+    with engine.connect() as lock:
+        if lock.dialect.name == 'postgresql':
+            lock.execute(text('SELECT pg_advisory_lock(:key)'), {'key': LOCK_KEY})
+            lock.commit()
+        try:
+            with engine.begin() as connection:
+                _ensure_schema_table(connection)
+                todo = pending(connection)
+            for version, description, apply in todo:
+                with engine.begin() as connection:
+                    apply(connection)
+                    connection.execute(
+                        text(f'INSERT INTO {SCHEMA_TABLE} '
+                             '(version, description, applied_at) '
+                             'VALUES (:version, :description, :applied_at)'),
+                        {'version': version, 'description': description,
+                         'applied_at': datetime.utcnow()})
+                applied.append(version)
+        finally:
+            if lock.dialect.name == 'postgresql':
+                lock.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+                lock.commit()
+    return applied
+
+
+class SchemaGuard:
+    """Checks the schema version once per process, before the first request.
+
+    Replaces create_all() at import: a warm schema costs a single query on
+    the first request and nothing afterwards. A schema that is behind is
+    upgraded when AUTO_MIGRATE is on, otherwise requests fail with 503
+    until `flask db upgrade` has been run.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTO_MIGRATE', True)
+        app.extensions['schema_guard'] = {'version': None}
+        app.before_request(self.check)
+        app.register_error_handler(
+            SchemaError, lambda e: (jsonify({'error': str(e)}), 503))
+
+    def check(self):
+        state = current_app.extensions['schema_guard']
+        if state['version'] is not None:
+            return
+        with self._lock:
+            if state['version'] is not None:
+                return
+            version = schema_version()
+            if version < LATEST_VERSION:
+                if not current_app.config['AUTO_MIGRATE']:
+                    raise SchemaError(
+                        f'Database schema is at version {version}, expected '
+                        f'{LATEST_VERSION}; run flask db upgrade')
+                upgrade()
+            state['version'] = LATEST_VERSION
+
+
+schema_guard = SchemaGuard()
+
+
+def hot_queries():
+    """(label, statement) for each query shape the hot indexes serve"""
+    tenant = 'explain-tenant'
+    return (
+        ('sweets by category', select(Sweet.id).where(
+            Sweet.user_id == tenant, Sweet.category == 'Barfi')),
+        ('categories', select(Sweet.category).distinct().where(
+            Sweet.user_id == tenant)),
+        ('pending orders', select(func.count(Order.id)).where(
+            Order.user_id == tenant, Order.status == 'pending')),
+        ('orders page', select(Order.id).where(
+            Order.user_id == tenant,
+            Order.order_date > literal_column("'2024-01-01'"))
+            .order_by(Order.order_date, Order.id).limit(50)),
+        ('orders of customer', select(Order.id).where(Order.customer_id == 1)),
+        ('items of orders', select(OrderItem.id).where(
+            OrderItem.order_id.in_([1, 2, 3]))),
+        ('items of sweet', select(OrderItem.id).where(OrderItem.sweet_id == 1)),
+    )
+
+
+def explain(connection, stmt):
+    """Return the query plan lines for stmt on the connection's database"""
+    sql = str(stmt.compile(dialect=connection.dialect,
+                           compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        return [row[-1] for row in connection.exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + sql)]
+    if connection.dialect.name == 'postgresql':
+        # Small tables are always seq-scanned; ask whether an index could serve
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    return [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + sql)]
+
+
+@click.group('db')
+def db_cli():
+    """Versioned schema migrations"""
+
+
+@db_cli.command('upgrade')
+@with_appcontext
+def upgrade_command():
+    """Apply pending schema migrations"""
+    applied = upgrade()
+    for version in applied:
+        click.echo(f'Applied migration {version}')
+    click.echo(f'Schema is at version {LATEST_VERSION}')
+
+
+@db_cli.command('current')
+@with_appcontext
+def current_command():
+    """Show the applied schema version"""
+    with db.engine.connect() as connection:
+        version = current_version(connection)
+        waiting = len(pending(connection))
+    click.echo(f'Schema version {version} ({waiting} pending)')
+
+
+@db_cli.command('history')
+@with_appcontext
+def history_command():
+    """List every migration and when it was applied"""
+    with db.engine.connect() as connection:
+        applied = applied_versions(connection)
+    for version, description, _ in MIGRATIONS:
+        click.echo(f"{version:>4}  {applied.get(version) or 'pending':<26}  {description}")
+
+
+@db_cli.command('explain')
+@with_appcontext
+def explain_command():
+    """Print query plans for the hot queries; fail if one scans a table"""
+    scans = 0
+    with db.engine.begin() as connection:
+        for label, stmt in hot_queries():
+            plan = explain(connection, stmt)
+            uses_index = any('INDEX' in line.upper() for line in plan)
+            scans += not uses_index
+            click.echo(f"{label}: {'index' if uses_index else 'SCAN'}")
+            for line in plan:
+                click.echo(f'    {line}')
+    if scans:
+        raise click.ClickException(f'{scans} hot query(s) not served by an index')
@@ -2,6 +2,66 @@ from database import db
 from datetime import datetime
 
 
+def serialize(obj, spec, fields=None, expand=None):
+    """Build a model's JSON dict from its field spec.
+
+    spec maps each output field to (columns it reads, getter). fields limits
+    the output to a subset; expand is passed to the getters so nested
+    relations can choose between their full and summary form.
+    """
+    return {name: get(obj, expand) for name, (_, get) in spec.items()
+            if fields is None or name in fields}
+
+
+def nested(obj, path, expand):
+    """Serialize a related object fully or as its summary.
+
+    expand=None keeps the historical behaviour of always nesting the full
+    object; otherwise only the relation paths listed in expand are full.
+    """
+    if obj is None:
+        return None
+    if expand is None or path in expand:
+        return obj.to_dict()
+    return obj.to_summary()
+
+
+def column(name):
+    """Field getter that returns a column's value as is"""
+    def get(obj, expand):
+        return getattr(obj, name)
+    get.column = name
+    return get
+
+
+def timestamp(name):
+    """Field getter for a DateTime column, as an ISO 8601 string.
+
+    Compiled serializers read the datetime as is and leave the ISO
+    formatting to the JSON encoder.
+    """
+    def get(obj, expand):
+        return getattr(obj, name).isoformat()
+    get.column, get.timestamp = name, True
+    return get
+
+
+def relation(name, path):
+    """Field getter for a many-to-one relation, nested per expand"""
+    def get(obj, expand):
+        return nested(getattr(obj, name), path, expand)
+    get.relation, get.path = name, path
+    return get
+
+
+def collection(name):
+    """Field getter for a one-to-many relation, each item in full"""
+    def get(obj, expand):
+        return [item.to_dict(expand=expand) for item in getattr(obj, name)]
+    get.collection = name
+    return get
+
+
 class Sweet(db.Model):
     __tablename__ = 'sweets'
 
@@ -17,19 +77,26 @@ class Sweet(db.Model):
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': self.price,
-            'quantity': self.quantity,
-            'stock': self.quantity,
-            'category': self.category,
-            'image_url': self.image_url,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    __table_args__ = (
+        db.Index('ix_sweets_user_id_category', 'user_id', 'category'),
+    )
+
+    def to_dict(self, fields=None):
+        return serialize(self, SWEET_FIELDS, fields)
+
+    def to_summary(self):
+        return serialize(self, SWEET_FIELDS, SWEET_SUMMARY)
+
+
+class Image(db.Model):
+    __tablename__ = 'images'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    content_type = db.Column(db.String(100), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    thumbnail = db.Column(db.LargeBinary)
+    thumbnail_type = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class Customer(db.Model):
@@ -49,15 +116,11 @@ class Customer(db.Model):
         db.UniqueConstraint('user_id', 'email', name='unique_user_email'),
     )
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'email': self.email,
-            'phone': self.phone,
-            'address': self.address,
-            'created_at': self.created_at.isoformat()
-        }
+    def to_dict(self, fields=None):
+        return serialize(self, CUSTOMER_FIELDS, fields)
+
+    def to_summary(self):
+        return serialize(self, CUSTOMER_FIELDS, CUSTOMER_SUMMARY)
 
 
 class Order(db.Model):
@@ -66,7 +129,7 @@ class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(128), nullable=False, index=True)
     customer_id = db.Column(db.Integer, db.ForeignKey(
-        'customers.id'), nullable=False)
+        'customers.id'), nullable=False, index=True)
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')
     order_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -74,17 +137,16 @@ class Order(db.Model):
     order_items = db.relationship(
         'OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'customer_id': self.customer_id,
-            'customer': self.customer.to_dict() if self.customer else None,
-            'total_amount': self.total_amount,
-            'total_price': self.total_amount,
-            'status': self.status,
-            'order_date': self.order_date.isoformat(),
-            'items': [item.to_dict() for item in self.order_items]
-        }
+    __table_args__ = (
+        db.Index('ix_orders_user_id_status', 'user_id', 'status'),
+        db.Index('ix_orders_user_id_order_date', 'user_id', 'order_date', 'id'),
+    )
+
+    def to_dict(self, fields=None, expand=None):
+        return serialize(self, ORDER_FIELDS, fields, expand)
+
+    def to_summary(self):
+        return serialize(self, ORDER_FIELDS, ORDER_SUMMARY)
 
 
 class OrderItem(db.Model):
@@ -92,21 +154,135 @@ class OrderItem(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey(
-        'orders.id'), nullable=False)
+        'orders.id'), nullable=False, index=True)
     sweet_id = db.Column(db.Integer, db.ForeignKey(
-        'sweets.id'), nullable=False)
+        'sweets.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
 
     sweet = db.relationship('Sweet', backref='order_items')
 
+    def to_dict(self, fields=None, expand=None):
+        return serialize(self, ORDER_ITEM_FIELDS, fields, expand)
+
+    def to_summary(self):
+        return serialize(self, ORDER_ITEM_FIELDS, ORDER_ITEM_SUMMARY)
+
+
+SWEET_FIELDS = {
+    'id': (('id',), column('id')),
+    'name': (('name',), column('name')),
+    'description': (('description',), column('description')),
+    'price': (('price',), column('price')),
+    'quantity': (('quantity',), column('quantity')),
+    'stock': (('quantity',), column('quantity')),
+    'category': (('category',), column('category')),
+    'image_url': (('image_url',), column('image_url')),
+    'created_at': (('created_at',), timestamp('created_at')),
+    'updated_at': (('updated_at',), timestamp('updated_at'))
+}
+SWEET_SUMMARY = ('id', 'name', 'price', 'category')
+
+CUSTOMER_FIELDS = {
+    'id': (('id',), column('id')),
+    'name': (('name',), column('name')),
+    'email': (('email',), column('email')),
+    'phone': (('phone',), column('phone')),
+    'address': (('address',), column('address')),
+    'created_at': (('created_at',), timestamp('created_at'))
+}
+CUSTOMER_SUMMARY = ('id', 'name', 'email')
+
+ORDER_FIELDS = {
+    'id': (('id',), column('id')),
+    'customer_id': (('customer_id',), column('customer_id')),
+    'customer': (('customer_id',), relation('customer', 'customer')),
+    'total_amount': (('total_amount',), column('total_amount')),
+    'total_price': (('total_amount',), column('total_amount')),
+    'status': (('status',), column('status')),
+    'order_date': (('order_date',), timestamp('order_date')),
+    'items': ((), collection('order_items'))
+}
+ORDER_SUMMARY = ('id', 'customer_id', 'total_amount', 'status', 'order_date')
+ORDER_EXPANDS = ('customer', 'items.sweet')
+
+ORDER_ITEM_FIELDS = {
+    'id': (('id',), column('id')),
+    'order_id': (('order_id',), column('order_id')),
+    'sweet_id': (('sweet_id',), column('sweet_id')),
+    'sweet': (('sweet_id',), relation('sweet', 'items.sweet')),
+    'quantity': (('quantity',), column('quantity')),
+    'price': (('price',), column('price')),
+    'subtotal': (('quantity', 'price'), lambda i, e: i.quantity * i.price)
+}
+ORDER_ITEM_SUMMARY = ('id', 'sweet_id', 'quantity', 'price', 'subtotal')
+
+
+class TenantStats(db.Model):
+    __tablename__ = 'tenant_stats'
+
+    user_id = db.Column(db.String(128), primary_key=True)
+    total_sweets = db.Column(db.Integer, nullable=False, default=0)
+    total_customers = db.Column(db.Integer, nullable=False, default=0)
+    total_orders = db.Column(db.Integer, nullable=False, default=0)
+    pending_orders = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Float, nullable=False, default=0)
+
     def to_dict(self):
         return {
-            'id': self.id,
-            'order_id': self.order_id,
-            'sweet_id': self.sweet_id,
-            'sweet': self.sweet.to_dict() if self.sweet else None,
-            'quantity': self.quantity,
-            'price': self.price,
-            'subtotal': self.quantity * self.price
+            'total_sweets': self.total_sweets,
+            'total_customers': self.total_customers,
+            'total_orders': self.total_orders,
+            'pending_orders': self.pending_orders,
+            'total_revenue': self.total_revenue
         }
+
+
+class DailySales(db.Model):
+    __tablename__ = 'daily_sales'
+
+    # Units and revenue per tenant, UTC day and sweet, kept in step with the
+    # order lines by analytics.record_sales()
+    user_id = db.Column(db.String(128), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    sweet_id = db.Column(db.Integer, db.ForeignKey('sweets.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class TenantVersion(db.Model):
+    __tablename__ = 'tenant_versions'
+
+    user_id = db.Column(db.String(128), primary_key=True)
+    entity = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Change(db.Model):
+    __tablename__ = 'changes'
+
+    # The latest change to each tenant row, in commit order per tenant.
+    # Writing a row's change replaces its previous entry, so the log holds
+    # at most one entry per live row plus tombstones for deleted ones.
+    # AUTOINCREMENT keeps SQLite from reusing the seq of a deleted entry.
+    seq = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False)
+    entity = db.Column(db.String(32), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(8), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_changes_user_id_seq', 'user_id', 'seq'),
+        db.UniqueConstraint('user_id', 'entity', 'entity_id', name='unique_change_row'),
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ChangeHorizon(db.Model):
+    __tablename__ = 'change_horizons'
+
+    # Highest seq of the tenant's pruned tombstones: older cursors may
+    # have missed a deletion and must reload
+    user_id = db.Column(db.String(128), primary_key=True)
+    seq = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,141 @@
+import base64
+import json
+from datetime import datetime
+from flask import Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import DateTime, Integer, String, tuple_
+from database import db
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+STREAM_BATCH_SIZE = 500
+
+
+class PaginationError(Exception):
+    """Raised for malformed limit/cursor query parameters"""
+
+
+def encode_cursor(values):
+    """Pack the keyset values of the last row into an opaque token"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v
+                      for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _cursor_value(key, value):
+    """A cursor value checked against its key column's type"""
+    if isinstance(key.type, DateTime):
+        if not isinstance(value, str):
+            raise ValueError
+        return datetime.fromisoformat(value)
+    if isinstance(key.type, Integer):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError
+        return value
+    if isinstance(key.type, String):
+        if not isinstance(value, str):
+            raise ValueError
+        return value
+    raise ValueError
+
+
+def decode_cursor(cursor, keys):
+    """Unpack a token produced by encode_cursor() for the given key columns"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError
+        return [_cursor_value(k, v) for k, v in zip(keys, values)]
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+
+
+def parse_limit(value):
+    """Validate the limit query parameter and clamp it to MAX_LIMIT"""
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, MAX_LIMIT)
+
+
+def keyset(query, keys, limit, cursor=None):
+    """query narrowed to the page after cursor, plus one row to detect more"""
+    if cursor:
+        query = query.filter(tuple_(*keys) > tuple_(*decode_cursor(cursor, keys)))
+    return query.order_by(*keys).limit(limit + 1)
+
+
+def split_page(rows, keys, limit):
+    """Trim the extra row fetched by keyset() and build the next cursor"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, k.key) for k in keys])
+    return rows, next_cursor
+
+
+def execute(statement):
+    """Run a Core statement on the session's connection, bypassing the ORM"""
+    return db.session.connection().execute(statement)
+
+
+def rendered(listing, rows):
+    """listing.render() of rows, selecting their child rows in one statement"""
+    children = listing.children(rows)
+    return listing.render(rows, () if children is None else execute(children).all())
+
+
+def paginate(listing, limit, cursor=None):
+    """Return one keyset page of listing's rows ordered by its keys and the next cursor.
+
+    The keys must end with a unique column (normally the primary key) so
+    the ordering is total and no row is skipped or repeated between pages.
+    """
+    rows = execute(keyset(listing.statement, listing.keys, limit, cursor)).all()
+    return split_page(rows, listing.keys, limit)
+
+
+def stream_array(listing, batch_size=STREAM_BATCH_SIZE):
+    """Stream listing as a JSON array, holding at most one batch of rows"""
+    dumps = current_app.json.dumps
+    statement = listing.statement.order_by(*listing.keys).execution_options(yield_per=batch_size)
+
+    def generate():
+        yield '['
+        first = True
+        for rows in execute(statement).partitions():
+            for item in rendered(listing, rows):
+                yield ('' if first else ',') + dumps(item)
+                first = False
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def list_response(listing):
+    """Serialize a repository.Listing according to its paging query parameters.
+
+    Without parameters the full list is returned as before. `limit` and/or
+    `cursor` switch to keyset pages shaped {"items": [...], "next_cursor"},
+    and `stream=1` streams the whole list as an array in key order.
+    """
+    args = request.args
+    try:
+        if args.get('stream') in ('1', 'true'):
+            return stream_array(listing)
+        if 'limit' not in args and 'cursor' not in args:
+            return jsonify(rendered(listing, execute(listing.statement).all()))
+        rows, next_cursor = paginate(
+            listing, parse_limit(args.get('limit')), args.get('cursor'))
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'items': rendered(listing, rows),
+        'next_cursor': next_cursor
+    })
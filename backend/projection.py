@@ -0,0 +1,46 @@
+from flask import request
+from sqlalchemy.orm import load_only
+
+
+class ProjectionError(Exception):
+    """Raised for unknown names in ?fields= or ?expand="""
+
+
+def _parse_names(param, allowed):
+    value = request.args.get(param)
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names.difference(allowed)
+    if unknown:
+        raise ProjectionError(
+            f"Unknown {param} value(s): {', '.join(sorted(unknown))}")
+    return names
+
+
+def requested_fields(spec):
+    """Read ?fields= against a model's field spec; None means every field"""
+    fields = _parse_names('fields', spec)
+    if fields is None:
+        return None
+    return fields | {'id'}
+
+
+def requested_expand(allowed):
+    """Read ?expand=; None keeps the default of fully nested relations"""
+    return _parse_names('expand', allowed)
+
+
+def columns_for(model, spec, fields, extra=()):
+    """Model columns needed to serialize fields, plus any extra keys"""
+    names = {'id', *extra}
+    for field in fields:
+        names.update(spec[field][0])
+    return [getattr(model, name) for name in sorted(names)]
+
+
+def project(query, model, spec, fields, extra=()):
+    """Push a field projection down into the SELECT column list"""
+    if fields is None:
+        return query
+    return query.options(load_only(*columns_for(model, spec, fields, extra)))
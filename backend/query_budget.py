@@ -0,0 +1,244 @@
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ContextDecorator, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import click
+from flask import Response, current_app, request
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'warn', 'raise')
+DEFAULT_REPEATS = 3
+CALL_SITE_DEPTH = 3
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# Budgets being tracked in this context, innermost last
+_active = ContextVar('query_budgets', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block runs more SQL than its budget allows"""
+
+
+def statement_shape(statement):
+    """The statement with whitespace collapsed and IN lists folded to (?)"""
+    return _IN_LIST.sub('(?)', _SPACE.sub(' ', statement).strip())
+
+
+def _call_site():
+    """Innermost frames of project code (outside this module) on the stack"""
+    sites = []
+    frame = sys._getframe(2)
+    while frame is not None and len(sites) < CALL_SITE_DEPTH:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_PROJECT_DIR) and filename != _THIS_FILE:
+            sites.append(f'{os.path.relpath(filename, _PROJECT_DIR)}:'
+                         f'{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return ' < '.join(sites) or '<outside project code>'
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    budgets = _active.get()
+    if budgets:
+        shape, site = statement_shape(statement), _call_site()
+        for budget in budgets:
+            budget.record(shape, site)
+
+
+def _listen():
+    if not event.contains(Engine, 'after_cursor_execute', _record_statement):
+        event.listen(Engine, 'after_cursor_execute', _record_statement)
+
+
+class QueryBudget(ContextDecorator):
+    """Limit the SQL statements run inside a block.
+
+    statements caps the total; repeats caps how often one statement shape
+    may run, which is how an N+1 lazy-load storm shows up. On exit a
+    violation raises QueryBudgetExceeded (mode='raise', for tests) or logs a
+    warning (mode='warn'); either way the report lists the offending
+    statements with the call sites that issued them. Budgets nest.
+    covering() extends the budget over a streamed body produced after the
+    block has exited.
+    """
+
+    def __init__(self, statements=None, repeats=None, mode='raise', label=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.statements = statements
+        self.repeats = repeats
+        self.mode = mode
+        self.label = label
+        self.shapes = Counter()
+        self.sites = defaultdict(Counter)
+        self._streaming = False
+
+    @property
+    def count(self):
+        return sum(self.shapes.values())
+
+    def record(self, shape, site):
+        self.shapes[shape] += 1
+        self.sites[shape][site] += 1
+
+    def __enter__(self):
+        _listen()
+        self.shapes.clear()
+        self.sites.clear()
+        self._streaming = False
+        self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.reset(self._token)
+        if not self._streaming:
+            self.check(failed=exc_type is not None)
+        return False
+
+    def check(self, failed=False):
+        """Raise or log any violation; a failed block only logs"""
+        problems = self.violations()
+        if not problems or self.mode == 'off':
+            return
+        report = self.report(problems)
+        if self.mode == 'raise' and not failed:
+            raise QueryBudgetExceeded(report)
+        logger.warning(report)
+
+    def covering(self, chunks):
+        """Iterate chunks with this budget active, checking it at the end.
+
+        For a streamed response body, whose queries run after the view
+        has returned: called inside the block, the check moves from the
+        block's exit to the end of the stream. A stream closed early is
+        not checked.
+        """
+        self._streaming = True
+        return self._cover(chunks)
+
+    def _cover(self, chunks):
+        iterator = iter(chunks)
+        try:
+            while True:
+                token = _active.set(_active.get() + (self,))
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    _active.reset(token)
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        self.check()
+
+    def violations(self):
+        problems = []
+        if self.statements is not None and self.count > self.statements:
+            problems.append(f'{self.count} statements (budget {self.statements})')
+        if self.repeats is not None:
+            for shape, count in self.shapes.most_common():
+                if count <= self.repeats:
+                    break
+                problems.append(f'{count}x the same statement (budget {self.repeats})')
+        return problems
+
+    def report(self, problems):
+        lines = [f"Query budget exceeded{f' in {self.label}' if self.label else ''}: "
+                 + '; '.join(problems)]
+        for shape, count in self.shapes.most_common():
+            lines.append(f'  {count}x {shape[:200]}')
+            for site, hits in self.sites[shape].most_common(3):
+                lines.append(f'      {hits}x {site}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def budget_exempt():
+    """Run a block's SQL outside every active budget.
+
+    For one-time work, such as creating a tenant's stats row on its first
+    write, that budgets would otherwise have to allow on every request.
+    """
+    token = _active.set(())
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def query_budget(statements=None, repeats=None, mode='raise'):
+    """Context manager / decorator form of QueryBudget, raising by default"""
+    return QueryBudget(statements, repeats, mode)
+
+
+def route_budget(statements, repeats=DEFAULT_REPEATS):
+    """Declare a view's SQL budget, enforced per the QUERY_BUDGET setting.
+
+    QUERY_BUDGET is 'off' (the default: the view runs untouched), 'warn'
+    (log violations, for development) or 'raise' (fail the request, for
+    tests). Put it directly under @bp.route so cache and ETag lookups made
+    by the other decorators are counted too. A streamed response's body
+    counts against the same budget while it is sent. Size a budget for the
+    steady state; a tenant's one-time setup runs under budget_exempt().
+    """
+    def decorator(f):
+        f.query_budget = (statements, repeats)
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            mode = current_app.config.get('QUERY_BUDGET', 'off')
+            if mode == 'off':
+                return f(*args, **kwargs)
+            with QueryBudget(statements, repeats, mode, label=request.endpoint) as budget:
+                rv = f(*args, **kwargs)
+                if isinstance(rv, Response) and rv.is_streamed and (
+                        statements is not None or repeats is not None):
+                    rv.response = budget.covering(rv.response)
+                return rv
+        return decorated_function
+    return decorator
+
+
+def unbudgeted_endpoints(app, blueprint='api'):
+    """Endpoints of blueprint whose view has no route_budget"""
+    return sorted(
+        endpoint for endpoint, view in app.view_functions.items()
+        if endpoint.startswith(f'{blueprint}.')
+        and getattr(view, 'query_budget', None) is None)
+
+
+@click.group('budgets')
+def budgets_cli():
+    """Per-route SQL budgets"""
+
+
+@budgets_cli.command('check')
+@with_appcontext
+def check_command():
+    """List API routes and their budgets; fail if one has none"""
+    for rule in sorted(current_app.url_map.iter_rules(), key=lambda r: r.rule):
+        if not rule.endpoint.startswith('api.'):
+            continue
+        budget = getattr(current_app.view_functions[rule.endpoint], 'query_budget', None)
+        methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
+        if budget is None:
+            click.echo(f'{methods:<7}{rule.rule:<28}NO BUDGET')
+        else:
+            click.echo(f'{methods:<7}{rule.rule:<28}statements={budget[0]} repeats={budget[1]}')
+    missing = unbudgeted_endpoints(current_app)
+    if missing:
+        raise click.ClickException(f"No query budget for {', '.join(missing)}")
@@ -0,0 +1,141 @@
+"""Read-only list queries as SQLAlchemy Core selects.
+
+Each function returns a Listing: a SELECT of plain column rows, so reading
+a list creates no ORM instances, identity-map entries or attribute state.
+The same listings serve the WSGI routes (pagination.list_response) and the
+async views in asgi.py, which only differ in how statements are executed.
+"""
+from collections import defaultdict
+from sqlalchemy import select
+from models import Customer, Order, OrderItem, Sweet, CUSTOMER_SUMMARY, SWEET_SUMMARY
+from serializers import row_columns, row_serializer
+
+# Above this many orders, their line items are selected by an id subquery
+# instead of a bound IN list
+IN_LIMIT = 500
+
+
+class Listing:
+    """A list endpoint's SELECT, its keyset columns and how to render rows.
+
+    statement is unordered and unpaged; pagination adds ORDER BY keys and
+    LIMIT. children(rows) is a second SELECT of nested rows for a batch
+    (None when there are none), whose result is passed to render().
+    """
+
+    def __init__(self, statement, keys, serialize):
+        self.statement = statement
+        self.keys = keys
+        self.serialize = serialize
+
+    def filter(self, *criteria):
+        """Narrow the listing to rows matching criteria; returns self"""
+        self.statement = self.statement.where(*criteria)
+        return self
+
+    def children(self, rows):
+        return None
+
+    def render(self, rows, child_rows=()):
+        serialize = self.serialize
+        return [serialize(row) for row in rows]
+
+
+class OrderListing(Listing):
+    """Orders with their customer joined in and line items selected per batch"""
+
+    def __init__(self, statement, ids, serialize, items=None):
+        super().__init__(statement, [Order.order_date, Order.id], serialize)
+        self.ids = ids
+        self.items = items
+
+    def filter(self, *criteria):
+        self.ids = self.ids.where(*criteria)
+        return super().filter(*criteria)
+
+    def children(self, rows):
+        if self.items is None or not rows:
+            return None
+        columns, _, _ = self.items
+        ids = [row.id for row in rows] if len(rows) <= IN_LIMIT else self.ids
+        return (select(*columns).select_from(OrderItem)
+                .outerjoin(Sweet, Sweet.id == OrderItem.sweet_id)
+                .where(OrderItem.order_id.in_(ids))
+                .order_by(OrderItem.order_id, OrderItem.id))
+
+    def render(self, rows, child_rows=()):
+        orders = super().render(rows)
+        if self.items is None:
+            return orders
+        _, order_id_at, serialize_item = self.items
+        items = defaultdict(list)
+        for row in child_rows:
+            items[row[order_id_at]].append(serialize_item(row))
+        for row, order in zip(rows, orders):
+            order['items'] = items.get(row.id, [])
+        return orders
+
+
+def with_relation(serialize, name, model, fields, start):
+    """serialize plus a nested model dict read from the same row at start"""
+    child = row_serializer(model, fields, start)
+
+    def serialize_row(row):
+        out = serialize(row)
+        out[name] = None if row[start] is None else child(row)
+        return out
+    return serialize_row
+
+
+def sweets(user_id, fields=None, category=None):
+    statement = select(*row_columns(Sweet, fields)).where(Sweet.user_id == user_id)
+    if category:
+        statement = statement.where(Sweet.category == category)
+    return Listing(statement, [Sweet.id], row_serializer(Sweet, fields))
+
+
+def customers(user_id, fields=None):
+    statement = select(*row_columns(Customer, fields)).where(Customer.user_id == user_id)
+    return Listing(statement, [Customer.id], row_serializer(Customer, fields))
+
+
+def orders(user_id, fields=None, expand=None, customer_id=None):
+    """Orders rendered as Order.to_dict(fields, expand).
+
+    The customer comes from a LEFT JOIN in the same row (its columns
+    labelled customer_*); line items and their sweets are one extra SELECT
+    per rendered batch.
+    """
+    columns = row_columns(Order, fields)
+    if 'order_date' not in {c.name for c in columns}:
+        columns.append(Order.order_date)
+    serialize = row_serializer(Order, fields)
+    criteria = [Order.user_id == user_id]
+    if customer_id:
+        criteria.append(Order.customer_id == customer_id)
+
+    joined = fields is None or 'customer' in fields
+    if joined:
+        customer_fields = None if expand is None or 'customer' in expand else CUSTOMER_SUMMARY
+        serialize = with_relation(serialize, 'customer', Customer, customer_fields, len(columns))
+        columns += row_columns(Customer, customer_fields, prefix='customer_')
+    statement = select(*columns).select_from(Order)
+    if joined:
+        statement = statement.outerjoin(Customer, Customer.id == Order.customer_id)
+    statement = statement.where(*criteria)
+
+    items = None
+    if fields is None or 'items' in fields:
+        item_columns = row_columns(OrderItem)
+        sweet_fields = None if expand is None or 'items.sweet' in expand else SWEET_SUMMARY
+        serialize_item = with_relation(row_serializer(OrderItem), 'sweet', Sweet,
+                                       sweet_fields, len(item_columns))
+        order_id_at = [c.name for c in item_columns].index('order_id')
+        item_columns += row_columns(Sweet, sweet_fields, prefix='sweet_')
+        items = (item_columns, order_id_at, serialize_item)
+    return OrderListing(statement, select(Order.id).where(*criteria), serialize, items)
+
+
+def categories(user_id):
+    """SELECT of the tenant's distinct sweet categories"""
+    return select(Sweet.category).where(Sweet.user_id == user_id).distinct()
@@ -1,10 +1,35 @@
-from flask import jsonify, request, Blueprint
+from flask import Response, abort, current_app, jsonify, request, Blueprint
 from database import db
-from models import Sweet, Customer, Order, OrderItem
+from analytics import (AnalyticsError, record_sales, revenue_series, revenue_window_day,
+                       top_sweets)
+from cache import bump_versions, conditional_get, response_cache
+from changes import (ChangeError, CursorExpired, changes_since, customer_orders, deleted, head,
+                     parse_entities, parse_since, record_changes, sweet_orders, upserted)
+from compression import compression
+from bulk_import import UploadError, import_customers, import_sweets
+from models import (Sweet, Customer, Order, OrderItem, SWEET_FIELDS, SWEET_SUMMARY,
+                    CUSTOMER_FIELDS, CUSTOMER_SUMMARY, ORDER_FIELDS, ORDER_EXPANDS)
+from images import (IMAGE_URL_PREFIX, MAX_IMAGE_BYTES, ImageError,
+                    image_reference, image_response, parse_data_url, store_image)
+from events import StreamLimit, event_stream
+from exports import ExportError, export_response
+from inventory import parse_order_lines, reserve_stock, restore_stock
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from pagination import execute, list_response
+from projection import (ProjectionError, columns_for, project, requested_expand,
+                        requested_fields)
+from query_budget import route_budget
+from search import SearchError, search, search_args
+import repository
+from stats import adjust_stats, check_stats, get_stats, recompute_stats
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from functools import wraps
 
 bp = Blueprint('api', __name__)
+metrics.instrument(bp)
+compression.instrument(bp)
 
 
 def get_user_id():
@@ -27,7 +52,76 @@ def require_auth(f):
     return decorated_function
 
 
+def order_query(user_id, fields=None, expand=None, base=None):
+    """Order query that eager-loads everything Order.to_dict() touches.
+
+    The customer is joined into the main SELECT and the line items are
+    fetched, together with their sweets, by a single extra IN query, so
+    serializing any number of orders costs a fixed two statements. A field
+    projection skips the relations it leaves out, and relations rendered
+    as summaries only load their summary columns. base defaults to
+    Order.query; the ASGI app passes select(Order).
+    """
+    base = Order.query if base is None else base
+    query = project(base.filter_by(user_id=user_id), Order,
+                    ORDER_FIELDS, fields, extra=('order_date',))
+    if fields is None or 'customer' in fields:
+        customer = joinedload(Order.customer)
+        if expand is not None and 'customer' not in expand:
+            customer = customer.load_only(
+                *columns_for(Customer, CUSTOMER_FIELDS, CUSTOMER_SUMMARY))
+        query = query.options(customer)
+    if fields is None or 'items' in fields:
+        items = selectinload(Order.order_items).joinedload(OrderItem.sweet)
+        if expand is not None and 'items.sweet' not in expand:
+            items = items.load_only(
+                *columns_for(Sweet, SWEET_FIELDS, SWEET_SUMMARY))
+        query = query.options(items)
+    return query
+
+
+@bp.errorhandler(ProjectionError)
+def projection_error(e):
+    return jsonify({'error': str(e)}), 400
+
+
+@bp.errorhandler(SearchError)
+def search_error(e):
+    return jsonify({'error': str(e)}), 400
+
+
+@bp.errorhandler(AnalyticsError)
+def analytics_error(e):
+    return jsonify({'error': str(e)}), 400
+
+
+@bp.errorhandler(ChangeError)
+def change_error(e):
+    return jsonify({'error': str(e)}), 400
+
+
+@bp.errorhandler(CursorExpired)
+def cursor_expired(e):
+    return jsonify({'error': str(e)}), 410
+
+
+@bp.errorhandler(StreamLimit)
+def stream_limit(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+
+def search_response(model, table, spec):
+    """Ranked search results for ?q=, ?limit= and ?fields="""
+    user_id = get_user_id()
+    fields = requested_fields(spec)
+    q, limit = search_args()
+    query = project(model.query.filter_by(user_id=user_id), model, spec, fields)
+    return jsonify([row.to_dict(fields)
+                    for row in search(query, table, user_id, q, limit)])
+
+
 @bp.route('/', methods=['GET'])
+@route_budget(0)
 def index():
     """Welcome page with API information"""
     return jsonify({
@@ -43,32 +137,44 @@ def index():
         'documentation': 'See README.md for full API documentation'
     })
 
+
 # Sweet Routes
 
 
 @bp.route('/sweets', methods=['GET'])
+@route_budget(2)
 @require_auth
+@conditional_get('sweets')
+@response_cache.cached('sweets')
 def get_sweets():
-    """Get all sweets with optional category filter"""
+    """Get all sweets with optional category filter and keyset paging"""
     user_id = get_user_id()
-    category = request.args.get('category')
-    query = Sweet.query.filter_by(user_id=user_id)
-    if category:
-        query = query.filter_by(category=category)
-    sweets = query.all()
-    return jsonify([sweet.to_dict() for sweet in sweets])
+    return list_response(repository.sweets(
+        user_id, requested_fields(SWEET_FIELDS), request.args.get('category')))
+
+
+@bp.route('/sweets/search', methods=['GET'])
+@route_budget(1)
+@require_auth
+def search_sweets():
+    """Sweets matching ?q= by name, category or description, best first"""
+    return search_response(Sweet, 'sweets', SWEET_FIELDS)
 
 
 @bp.route('/sweets/<int:id>', methods=['GET'])
+@route_budget(1)
 @require_auth
 def get_sweet(id):
     """Get a single sweet by ID"""
     user_id = get_user_id()
-    sweet = Sweet.query.filter_by(id=id, user_id=user_id).first_or_404()
-    return jsonify(sweet.to_dict())
+    fields = requested_fields(SWEET_FIELDS)
+    sweet = project(Sweet.query, Sweet, SWEET_FIELDS, fields).filter_by(
+        id=id, user_id=user_id).first_or_404()
+    return jsonify(sweet.to_dict(fields))
 
 
 @bp.route('/sweets', methods=['POST'])
+@route_budget(8)
 @require_auth
 def create_sweet():
     """Create a new sweet"""
@@ -83,9 +189,12 @@ def create_sweet():
             price=data['price'],
             quantity=data.get('stock', data.get('quantity', 0)),
             category=data.get('category', ''),
-            image_url=data.get('image_url', '')
+            image_url=image_reference(data.get('image_url', ''))
         )
         db.session.add(sweet)
+        db.session.flush()
+        adjust_stats(user_id, total_sweets=1)
+        record_changes(user_id, upserted('sweets', [sweet.id]), bump=['sweets'])
         db.session.commit()
         return jsonify(sweet.to_dict()), 201
     except Exception as e:
@@ -93,7 +202,20 @@ def create_sweet():
         return jsonify({'error': str(e)}), 400
 
 
+@bp.route('/sweets/bulk', methods=['POST'])
+# Scales with the upload: a few statements per CHUNK_SIZE rows
+@route_budget(None, repeats=None)
+@require_auth
+def bulk_import_sweets():
+    """Import sweets streamed as CSV or NDJSON and report per-row errors"""
+    try:
+        return jsonify(import_sweets(get_user_id()))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @bp.route('/sweets/<int:id>', methods=['PUT'])
+@route_budget(11)
 @require_auth
 def update_sweet(id):
     """Update an existing sweet"""
@@ -108,7 +230,12 @@ def update_sweet(id):
         sweet.quantity = data.get(
             'stock', data.get('quantity', sweet.quantity))
         sweet.category = data.get('category', sweet.category)
-        sweet.image_url = data.get('image_url', sweet.image_url)
+        sweet.image_url = image_reference(
+            data.get('image_url', sweet.image_url))
+        # Order line items embed their sweet
+        record_changes(user_id, upserted('sweets', [sweet.id]),
+                       upserted('orders', sweet_orders(user_id, sweet.id)),
+                       bump=['sweets'])
 
         db.session.commit()
         return jsonify(sweet.to_dict())
@@ -118,6 +245,7 @@ def update_sweet(id):
 
 
 @bp.route('/sweets/<int:id>', methods=['DELETE'])
+@route_budget(8)
 @require_auth
 def delete_sweet(id):
     """Delete a sweet"""
@@ -130,6 +258,8 @@ def delete_sweet(id):
             return jsonify({'error': 'Cannot delete sweet that is used in orders'}), 400
 
         db.session.delete(sweet)
+        adjust_stats(user_id, total_sweets=-1)
+        record_changes(user_id, deleted('sweets', [id]), bump=['sweets'])
         db.session.commit()
         return jsonify({'message': 'Sweet deleted successfully'}), 200
     except Exception as e:
@@ -137,25 +267,78 @@ def delete_sweet(id):
         return jsonify({'error': str(e)}), 400
 
 
+# Image Routes
+
+
+@bp.route('/images', methods=['POST'])
+@route_budget(2)
+@require_auth
+def upload_image():
+    """Store an image (multipart `file` or JSON `data_url`) by content hash"""
+    try:
+        upload = request.files.get('file')
+        if upload:
+            digest = store_image(upload.read(MAX_IMAGE_BYTES + 1), upload.mimetype)
+        else:
+            data = request.get_json(silent=True) or {}
+            content_type, image = parse_data_url(data.get('data_url', ''))
+            digest = store_image(image, content_type)
+        db.session.commit()
+    except ImageError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except IntegrityError:
+        # A concurrent upload of the same bytes stored this hash first
+        db.session.rollback()
+    return jsonify({'hash': digest, 'url': IMAGE_URL_PREFIX + digest}), 201
+
+
+@bp.route('/images/<hash>', methods=['GET'])
+@route_budget(1)
+def get_image(hash):
+    """Serve a stored image; `size=thumb` returns the server-made thumbnail"""
+    try:
+        response = image_response(hash, request.args.get('size'))
+    except ImageError as e:
+        return jsonify({'error': str(e)}), 404
+    if response is None:
+        return jsonify({'error': 'Image not found'}), 404
+    return response
+
+
 @bp.route('/customers', methods=['GET'])
+@route_budget(2)
 @require_auth
+@conditional_get('customers')
+@response_cache.cached('customers')
 def get_customers():
-    """Get all customers"""
+    """Get all customers with keyset paging"""
     user_id = get_user_id()
-    customers = Customer.query.filter_by(user_id=user_id).all()
-    return jsonify([customer.to_dict() for customer in customers])
+    return list_response(repository.customers(user_id, requested_fields(CUSTOMER_FIELDS)))
+
+
+@bp.route('/customers/search', methods=['GET'])
+@route_budget(1)
+@require_auth
+def search_customers():
+    """Customers matching ?q= by name, email or phone, best first"""
+    return search_response(Customer, 'customers', CUSTOMER_FIELDS)
 
 
 @bp.route('/customers/<int:id>', methods=['GET'])
+@route_budget(1)
 @require_auth
 def get_customer(id):
     """Get a single customer by ID"""
     user_id = get_user_id()
-    customer = Customer.query.filter_by(id=id, user_id=user_id).first_or_404()
-    return jsonify(customer.to_dict())
+    fields = requested_fields(CUSTOMER_FIELDS)
+    customer = project(Customer.query, Customer, CUSTOMER_FIELDS, fields).filter_by(
+        id=id, user_id=user_id).first_or_404()
+    return jsonify(customer.to_dict(fields))
 
 
 @bp.route('/customers', methods=['POST'])
+@route_budget(6)
 @require_auth
 def create_customer():
     """Create a new customer"""
@@ -171,6 +354,9 @@ def create_customer():
             address=data.get('address', '')
         )
         db.session.add(customer)
+        db.session.flush()
+        adjust_stats(user_id, total_customers=1)
+        record_changes(user_id, upserted('customers', [customer.id]), bump=['customers'])
         db.session.commit()
         return jsonify(customer.to_dict()), 201
     except IntegrityError:
@@ -181,7 +367,20 @@ def create_customer():
         return jsonify({'error': str(e)}), 400
 
 
+@bp.route('/customers/bulk', methods=['POST'])
+# Scales with the upload: a few statements per CHUNK_SIZE rows
+@route_budget(None, repeats=None)
+@require_auth
+def bulk_import_customers():
+    """Import or upsert customers streamed as CSV or NDJSON"""
+    try:
+        return jsonify(import_customers(get_user_id()))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @bp.route('/customers/<int:id>', methods=['PUT'])
+@route_budget(8)
 @require_auth
 def update_customer(id):
     """Update an existing customer"""
@@ -194,6 +393,10 @@ def update_customer(id):
         customer.email = data.get('email', customer.email)
         customer.phone = data.get('phone', customer.phone)
         customer.address = data.get('address', customer.address)
+        # Orders embed their customer
+        record_changes(user_id, upserted('customers', [customer.id]),
+                       upserted('orders', customer_orders(user_id, customer.id)),
+                       bump=['customers'])
 
         db.session.commit()
         return jsonify(customer.to_dict())
@@ -206,6 +409,7 @@ def update_customer(id):
 
 
 @bp.route('/customers/<int:id>', methods=['DELETE'])
+@route_budget(8)
 @require_auth
 def delete_customer(id):
     """Delete a customer"""
@@ -218,6 +422,8 @@ def delete_customer(id):
             return jsonify({'error': 'Cannot delete customer that has orders'}), 400
 
         db.session.delete(customer)
+        adjust_stats(user_id, total_customers=-1)
+        record_changes(user_id, deleted('customers', [id]), bump=['customers'])
         db.session.commit()
         return jsonify({'message': 'Customer deleted successfully'}), 200
     except Exception as e:
@@ -226,28 +432,47 @@ def delete_customer(id):
 
 
 @bp.route('/orders', methods=['GET'])
+@route_budget(3)
 @require_auth
+@conditional_get('orders', 'customers', 'sweets')
 def get_orders():
-    """Get all orders with optional customer filter"""
+    """Get all orders with optional customer filter and keyset paging"""
     user_id = get_user_id()
-    customer_id = request.args.get('customer_id')
-    query = Order.query.filter_by(user_id=user_id)
-    if customer_id:
-        query = query.filter_by(customer_id=customer_id)
-    orders = query.all()
-    return jsonify([order.to_dict() for order in orders])
+    return list_response(repository.orders(
+        user_id, requested_fields(ORDER_FIELDS), requested_expand(ORDER_EXPANDS),
+        request.args.get('customer_id')))
+
+
+@bp.route('/orders/export', methods=['GET'])
+@route_budget(1)
+@require_auth
+def export_orders():
+    """Stream order history with line items as CSV or NDJSON"""
+    try:
+        return export_response(
+            get_user_id(),
+            request.args.get('format', 'csv'),
+            request.args.get('from'),
+            request.args.get('to')
+        )
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
 
 
 @bp.route('/orders/<int:id>', methods=['GET'])
+@route_budget(2)
 @require_auth
 def get_order(id):
     """Get a single order by ID"""
     user_id = get_user_id()
-    order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
-    return jsonify(order.to_dict())
+    fields = requested_fields(ORDER_FIELDS)
+    expand = requested_expand(ORDER_EXPANDS)
+    order = order_query(user_id, fields, expand).filter_by(id=id).first_or_404()
+    return jsonify(order.to_dict(fields, expand))
 
 
 @bp.route('/orders', methods=['POST'])
+@route_budget(15)
 @require_auth
 def create_order():
     """Create a new order"""
@@ -255,58 +480,65 @@ def create_order():
     data = request.get_json()
 
     try:
+        try:
+            customer_id = int(data.get('customer_id'))
+        except (TypeError, ValueError):
+            raise ValueError('customer_id must be an integer')
+        customer = Customer.query.filter_by(id=customer_id, user_id=user_id).first()
+        if customer is None:
+            return jsonify({'error': 'Customer not found'}), 400
+        lines = parse_order_lines(data.get('items', []))
+        sweets = reserve_stock(user_id, lines)
+
+        total = sum(sweets[sweet_id].price * quantity
+                    for sweet_id, quantity in lines.items())
         order = Order(
             user_id=user_id,
-            customer_id=data['customer_id'],
-            total_amount=0,
+            customer_id=customer.id,
+            total_amount=total,
             status=data.get('status', 'pending')
         )
         db.session.add(order)
         db.session.flush()
-
-        total = 0
-        for item_data in data.get('items', []):
-            sweet = Sweet.query.filter_by(
-                id=item_data['sweet_id'], user_id=user_id).first()
-            if not sweet:
-                raise ValueError(
-                    f"Sweet with ID {item_data['sweet_id']} not found")
-
-            if sweet.quantity < item_data['quantity']:
-                raise ValueError(f"Insufficient stock for {sweet.name}")
-
-            order_item = OrderItem(
-                order_id=order.id,
-                sweet_id=item_data['sweet_id'],
-                quantity=item_data['quantity'],
-                price=sweet.price
-            )
-            db.session.add(order_item)
-            sweet.quantity -= item_data['quantity']
-            total += sweet.price * item_data['quantity']
-
-        order.total_amount = total
+        # One executemany for all lines instead of an INSERT per line
+        if lines:
+            db.session.execute(insert(OrderItem), [{
+                'order_id': order.id,
+                'sweet_id': sweet_id,
+                'quantity': quantity,
+                'price': sweets[sweet_id].price
+            } for sweet_id, quantity in lines.items()])
+        record_sales(user_id, order.order_date,
+                     [(sweet_id, quantity, sweets[sweet_id].price)
+                      for sweet_id, quantity in lines.items()])
+        adjust_stats(user_id, total_orders=1, total_revenue=total,
+                     pending_orders=int(order.status == 'pending'))
+        record_changes(user_id, upserted('orders', [order.id]), upserted('sweets', list(lines)),
+                       bump=['orders', 'sweets'])
         db.session.commit()
 
+        order = order_query(user_id).filter_by(id=order.id).one()
         return jsonify(order.to_dict()), 201
     except ValueError as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 400
 
 
 @bp.route('/orders/<int:id>', methods=['PUT'])
+@route_budget(9)
 @require_auth
 def update_order(id):
     """Update order status"""
     user_id = get_user_id()
-    order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
+    order = order_query(user_id).filter_by(id=id).first_or_404()
     data = request.get_json()
 
     try:
+        was_pending = order.status == 'pending'
         order.status = data.get('status', order.status)
+        adjust_stats(user_id, pending_orders=int(
+            order.status == 'pending') - int(was_pending))
+        record_changes(user_id, upserted('orders', [order.id]), bump=['orders'])
         db.session.commit()
         return jsonify(order.to_dict())
     except Exception as e:
@@ -315,19 +547,26 @@ def update_order(id):
 
 
 @bp.route('/orders/<int:id>', methods=['DELETE'])
+@route_budget(13)
 @require_auth
 def delete_order(id):
     """Delete an order and restore inventory"""
     user_id = get_user_id()
-    order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
+    order = order_query(user_id).filter_by(id=id).first_or_404()
 
     try:
-        for item in order.order_items:
-            sweet = Sweet.query.get(item.sweet_id)
-            if sweet:
-                sweet.quantity += item.quantity
+        restore_stock({item.sweet_id: item.quantity
+                       for item in order.order_items})
+        record_sales(user_id, order.order_date,
+                     [(item.sweet_id, item.quantity, item.price)
+                      for item in order.order_items], sign=-1)
 
         db.session.delete(order)
+        adjust_stats(user_id, total_orders=-1, total_revenue=-order.total_amount,
+                     pending_orders=-int(order.status == 'pending'))
+        record_changes(user_id, deleted('orders', [id]), upserted(
+            'sweets', sorted({item.sweet_id for item in order.order_items})),
+            bump=['orders', 'sweets'])
         db.session.commit()
         return jsonify({'message': 'Order deleted successfully'}), 200
     except Exception as e:
@@ -335,40 +574,119 @@ def delete_order(id):
         return jsonify({'error': str(e)}), 400
 
 
+@bp.route('/changes', methods=['GET'])
+@route_budget(7)
+@require_auth
+@conditional_get('changes')
+def get_changes():
+    """Rows changed and deleted after ?since=, to merge into loaded lists.
+
+    Without since, returns only the current cursor: read it before loading
+    the full lists, then poll with it.
+    """
+    user_id = get_user_id()
+    since = request.args.get('since')
+    if since is None:
+        return jsonify({'cursor': head(user_id)})
+    return jsonify(changes_since(user_id, parse_since(since),
+                                 parse_entities(request.args.get('entities')),
+                                 request.args.get('limit')))
+
+
+@bp.route('/stream', methods=['GET'])
+@route_budget(None, repeats=None)
+@require_auth
+def get_stream():
+    """Server-sent events for the tenant's stock and order changes.
+
+    Resumes after the Last-Event-ID header (or ?last_event_id=, for
+    clients that cannot set headers) when given.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return event_stream(get_user_id(), last_event_id)
+
+
 @bp.route('/dashboard/stats', methods=['GET'])
+@route_budget(4)
 @require_auth
+@response_cache.cached('sweets', 'customers', 'orders', 'stats',
+                       unless=lambda: 'check' in request.args or 'recompute' in request.args)
 def get_dashboard_stats():
-    """Get dashboard statistics"""
+    """Get dashboard statistics from the per-tenant counters
+
+    `recompute=1` rebuilds the counters from the base tables first and
+    `check=1` reports any drift between the two instead.
+    """
     user_id = get_user_id()
-    total_sweets = Sweet.query.filter_by(user_id=user_id).count()
-    total_customers = Customer.query.filter_by(user_id=user_id).count()
-    total_orders = Order.query.filter_by(user_id=user_id).count()
-    pending_orders = Order.query.filter_by(
-        user_id=user_id, status='pending').count()
+    if request.args.get('check') in ('1', 'true'):
+        drift = check_stats(user_id)
+        return jsonify({'consistent': not drift, 'drift': drift})
+    if request.args.get('recompute') in ('1', 'true'):
+        stats = recompute_stats(user_id)
+        bump_versions(user_id, 'stats')
+        db.session.commit()
+    else:
+        stats = get_stats(user_id)
+    return jsonify(stats.to_dict())
 
-    total_revenue = db.session.query(
-        db.func.sum(Order.total_amount)).filter(Order.user_id == user_id).scalar() or 0
 
-    return jsonify({
-        'total_sweets': total_sweets,
-        'total_customers': total_customers,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'total_revenue': total_revenue
-    })
+# Analytics Routes
+
+
+@bp.route('/analytics/revenue', methods=['GET'])
+@route_budget(2)
+@require_auth
+@conditional_get('orders', vary=revenue_window_day)
+@response_cache.cached('orders', vary=revenue_window_day)
+def get_revenue():
+    """Revenue and units sold per day, week or month, from the daily rollup"""
+    return jsonify(revenue_series(get_user_id()))
+
+
+@bp.route('/analytics/top-sweets', methods=['GET'])
+@route_budget(2)
+@require_auth
+@conditional_get('orders', 'sweets')
+@response_cache.cached('orders', 'sweets')
+def get_top_sweets():
+    """Best-selling sweets by revenue or units, from the daily rollup"""
+    return jsonify(top_sweets(get_user_id()))
 
 
 @bp.route('/categories', methods=['GET'])
+@route_budget(2)
 @require_auth
+@conditional_get('sweets')
+@response_cache.cached('sweets')
 def get_categories():
     """Get all unique categories"""
     user_id = get_user_id()
-    categories = db.session.query(Sweet.category).filter(
-        Sweet.user_id == user_id).distinct().all()
-    return jsonify([cat[0] for cat in categories if cat[0]])
+    categories = execute(repository.categories(user_id)).scalars()
+    return jsonify([category for category in categories if category])
+
+
+@bp.route('/cache/stats', methods=['GET'])
+@route_budget(0)
+def cache_stats():
+    """Response cache hit/miss counters for this process"""
+    return jsonify(response_cache.stats())
+
+
+@bp.route('/metrics', methods=['GET'])
+@route_budget(0)
+def get_metrics():
+    """Per-route latency, SQL and response size counters (Prometheus format)"""
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
 
 
 @bp.route('/health', methods=['GET'])
+@route_budget(0)
 def health_check():
-    """API health check"""
-    return jsonify({'status': 'healthy', 'message': 'Sweet Shop API is running'})
+    """API health check with the process's cold-start timings"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Sweet Shop API is running',
+        'startup': current_app.extensions['startup'].report()
+    })
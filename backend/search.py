@@ -0,0 +1,172 @@
+import re
+from flask import request
+from sqlalchemy import Integer, func, literal_column, or_, text
+from database import db
+from models import Customer, Sweet
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_TERMS = 8
+# Matches ranked per tier on SQLite; enough to fill a typeahead list
+CANDIDATES = 200
+
+# table -> (model, searchable columns, most important first)
+SEARCHABLE = {
+    'sweets': (Sweet, ('name', 'category', 'description')),
+    'customers': (Customer, ('name', 'email', 'phone')),
+}
+# setweight labels of the columns on PostgreSQL
+LABELS = ('A', 'B', 'C')
+
+_TERM = re.compile(r'[^\W_]+')
+
+
+class SearchError(Exception):
+    """Raised for malformed search query parameters"""
+
+
+def search_terms(q):
+    """Lower-cased word tokens of q; punctuation only separates words"""
+    return _TERM.findall((q or '').lower())[:MAX_TERMS]
+
+
+def parse_search_limit(value):
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise SearchError('limit must be an integer')
+    if limit < 1:
+        raise SearchError('limit must be positive')
+    return min(limit, MAX_LIMIT)
+
+
+def _document(table):
+    """The weighted tsvector the PostgreSQL expression index is built on"""
+    _, columns = SEARCHABLE[table]
+    return ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce({column}, '')), '{label}')"
+        for column, label in zip(columns, LABELS))
+
+
+def _sqlite_ddl(table):
+    _, columns = SEARCHABLE[table]
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    delete = (f"INSERT INTO {fts} ({fts}, rowid, tenant, {cols}) "
+              f"VALUES ('delete', old.id, hex(old.user_id), {old});")
+    insert = (f'INSERT INTO {fts} (rowid, tenant, {cols}) '
+              f'VALUES (new.id, hex(new.user_id), {new});')
+    # External-content table: the index stores tokens only and triggers keep
+    # it in step with every write, ORM or Core. The tenant column holds the
+    # hex-encoded user_id, one token that the MATCH can require. Prefix
+    # indexes make 1- to 3-character typeahead as cheap as whole words.
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"tenant, {cols}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF user_id, {cols} '
+        f'ON {table} BEGIN {delete} {insert} END',
+        f'INSERT INTO {fts} (rowid, tenant, {cols}) '
+        f'SELECT id, hex(user_id), {cols} FROM {table}',
+    )
+
+
+def _postgresql_ddl(table):
+    # Expression indexes are maintained by PostgreSQL itself on every write
+    return (
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        f'CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} '
+        f'USING gin (({_document(table)}))',
+        f'CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} '
+        f'USING gin (name gin_trgm_ops)',
+    )
+
+
+def create_search_indexes(connection):
+    """Full-text indexes for every SEARCHABLE table on SQLite and PostgreSQL.
+
+    Other databases get no index and are searched with LIKE.
+    """
+    ddl = {'sqlite': _sqlite_ddl, 'postgresql': _postgresql_ddl}.get(connection.dialect.name)
+    if ddl is None:
+        return
+    for table in SEARCHABLE:
+        for statement in ddl(table):
+            connection.exec_driver_sql(statement)
+
+
+def _sqlite_ranking(table, user_id, terms):
+    """(id, rank) of FTS5 matches: rank 0 if every word is in the name, else 1.
+
+    bm25() would read the whole tenant posting list on every query to weigh
+    the tenant term, so matches are tiered by column instead. Each tier
+    keeps its CANDIDATES shortest names, the order search() ranks a tier
+    by, so the cut never drops a row that would rank above one it keeps.
+    """
+    fts = f'{table}_fts'
+    _, columns = SEARCHABLE[table]
+    tenant = f'tenant : "{user_id.encode().hex()}"'
+    words = ' '.join(f'"{t}"*' for t in terms)
+    tiers = ' UNION ALL '.join(
+        f'SELECT * FROM (SELECT {fts}.rowid AS id, {tier} AS tier FROM {fts} '
+        f'JOIN {table} ON {table}.id = {fts}.rowid WHERE {fts} MATCH :match{tier} '
+        f'ORDER BY length({table}.{columns[0]}), {table}.id LIMIT :candidates)'
+        for tier in (0, 1))
+    return text(
+        f'SELECT id, MIN(tier) AS rank FROM ({tiers}) GROUP BY id'
+    ).bindparams(
+        match0=f'{tenant} AND {columns[0]} : ({words})',
+        match1=f"{tenant} AND {{{' '.join(columns)}}} : ({words})",
+        candidates=CANDIDATES
+    ).columns(id=Integer, rank=Integer).subquery()
+
+
+def _postgresql_filter(model, table, q, terms):
+    document = literal_column(f'({_document(table)})')
+    query = func.to_tsquery('simple', ' & '.join(f'{t}:*' for t in terms))
+    matches = or_(document.op('@@')(query), model.name.op('%')(q))
+    # Lower is better, as with bm25
+    rank = -(func.ts_rank(document, query) + func.similarity(model.name, q))
+    return matches, rank
+
+
+def _like_filter(model, columns, terms):
+    return [or_(*(getattr(model, c).ilike(f'%{t}%') for c in columns)) for t in terms]
+
+
+def search(query, table, user_id, q, limit):
+    """Best matches for q among the tenant's rows, best first.
+
+    Every word in q must match as a word prefix, so "kaj ka" finds "Kaju
+    Katli". Matches in the name rank first: on SQLite shorter names come
+    first within a tier, on PostgreSQL rows are ordered by ts_rank over the
+    weighted columns plus trigram similarity of the name, which also
+    catches small typos. query is the tenant's base query, already
+    projected by the caller.
+    """
+    model, columns = SEARCHABLE[table]
+    terms = search_terms(q)
+    if not terms:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        ranking = _sqlite_ranking(table, user_id, terms)
+        query = query.join(ranking, ranking.c.id == model.id).order_by(
+            ranking.c.rank, func.length(model.name))
+    elif dialect == 'postgresql':
+        matches, rank = _postgresql_filter(model, table, q.strip(), terms)
+        query = query.filter(matches).order_by(rank)
+    else:
+        query = query.filter(*_like_filter(model, columns, terms)).order_by(model.name)
+    return query.order_by(model.id).limit(limit).all()
+
+
+def search_args():
+    """(q, limit) from the query string"""
+    return request.args.get('q', ''), parse_search_limit(request.args.get('limit'))
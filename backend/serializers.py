@@ -0,0 +1,163 @@
+from datetime import date
+from functools import lru_cache
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from models import (Customer, Order, OrderItem, Sweet, CUSTOMER_FIELDS, CUSTOMER_SUMMARY,
+                    ORDER_FIELDS, ORDER_ITEM_FIELDS, ORDER_ITEM_SUMMARY, ORDER_SUMMARY,
+                    SWEET_FIELDS, SWEET_SUMMARY)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODERS = ('auto', 'orjson', 'stdlib')
+
+# model -> (field spec, summary fields)
+SPECS = {
+    Sweet: (SWEET_FIELDS, SWEET_SUMMARY),
+    Customer: (CUSTOMER_FIELDS, CUSTOMER_SUMMARY),
+    Order: (ORDER_FIELDS, ORDER_SUMMARY),
+    OrderItem: (ORDER_ITEM_FIELDS, ORDER_ITEM_SUMMARY),
+}
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's stdlib provider, writing dates and datetimes as ISO 8601"""
+
+    native_datetimes = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+
+class OrjsonProvider(JSONProvider):
+    """orjson encoder with the stdlib provider's sorted keys and layout.
+
+    Output differs from JSONProvider only in that non-ASCII text is written
+    as UTF-8 rather than \\u escapes. dumps() calls that pass stdlib json
+    options fall back to the stdlib encoder.
+    """
+
+    native_datetimes = True
+
+    def _options(self):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default,
+                            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default,
+                            option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def json_provider(app):
+    """The JSON provider selected by the JSON_ENCODER setting.
+
+    auto (the default) uses orjson when it is installed and the stdlib
+    encoder otherwise.
+    """
+    encoder = app.config.get('JSON_ENCODER', 'auto')
+    if encoder not in ENCODERS:
+        raise ValueError(f"JSON_ENCODER must be one of {', '.join(ENCODERS)}")
+    if encoder == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_ENCODER=orjson but orjson is not installed')
+    if encoder == 'stdlib' or orjson is None:
+        return JSONProvider(app)
+    return OrjsonProvider(app)
+
+
+def _selected(model, fields):
+    spec, _ = SPECS[model]
+    return [(name, get) for name, (_, get) in spec.items()
+            if fields is None or name in fields]
+
+
+def _native_datetimes():
+    """Whether the app's encoder formats datetimes itself"""
+    return getattr(current_app.json, 'native_datetimes', False)
+
+
+def _finish(names, read, computed):
+    """Serializer building a dict from read(obj) plus the computed fields"""
+    if not computed:
+        return lambda obj: dict(zip(names, read(obj)))
+
+    def serialize(obj):
+        out = dict(zip(names, read(obj)))
+        for name, get in computed:
+            out[name] = get(obj)
+        return out
+    return serialize
+
+
+def _is_relation(get):
+    return hasattr(get, 'relation') or hasattr(get, 'collection')
+
+
+@lru_cache(maxsize=None)
+def _compile_rows(model, fields, native, start):
+    names, timestamps, computed = [], [], []
+    for name, get in _selected(model, fields):
+        if _is_relation(get):
+            continue
+        if hasattr(get, 'column'):
+            names.append(name)
+            if not native and getattr(get, 'timestamp', False):
+                timestamps.append(name)
+        else:
+            computed.append((name, lambda row, get=get: get(row, None)))
+    names = tuple(names)
+    serialize = _finish(names, (lambda row: row[start:]) if start else iter, computed)
+    if not timestamps:
+        return serialize
+
+    def with_timestamps(row):
+        out = serialize(row)
+        for name in timestamps:
+            if out[name] is not None:
+                out[name] = out[name].isoformat()
+        return out
+    return with_timestamps
+
+
+def row_columns(model, fields=None, prefix=''):
+    """Select list for row_serializer(model, fields).
+
+    One column per output field, in spec order and labelled prefix + field
+    name, then any other column a computed field reads. Relations are left
+    to the caller.
+    """
+    selected = [(name, get) for name, get in _selected(model, fields) if not _is_relation(get)]
+    columns = [getattr(model, get.column).label(prefix + name)
+               for name, get in selected if hasattr(get, 'column')]
+    spec, _ = SPECS[model]
+    labels = {c.name for c in columns}
+    for name, get in selected:
+        if not hasattr(get, 'column'):
+            columns.extend(getattr(model, c) for c in spec[name][0] if c not in labels)
+    return columns
+
+
+def row_serializer(model, fields=None, start=0):
+    """Compiled equivalent of model.to_dict(fields) for rows of row_columns().
+
+    Values are taken by position from start on, so no ORM object or per-row
+    attribute lookup is involved; computed fields read unprefixed columns
+    by name. With an encoder that formats datetimes natively (orjson) they
+    are passed through instead of calling isoformat().
+    """
+    return _compile_rows(model, None if fields is None else frozenset(fields),
+                         _native_datetimes(), start)
@@ -0,0 +1,60 @@
+import sys
+import threading
+import time
+
+# When this module was first imported; app.py imports it before anything heavy
+STARTED = time.perf_counter()
+
+
+class StartupTimer:
+    """Cold-start report: time to a ready app and the cost of the first request.
+
+    `started` is a time.perf_counter() value taken before the app's heavy
+    imports, by default this module's import time. init_app should run
+    before other extensions so the first request's timing includes their
+    before_request hooks; ready() marks the end of create_app. The report
+    is printed once and kept for /api/health.
+    """
+
+    def __init__(self, started=STARTED):
+        self.started = started
+        self.import_ms = None
+        self.first_request_ms = None
+        self.first_response_ms = None
+        self._first_start = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['startup'] = self
+        app.before_request(self._before)
+        app.after_request(self._after)
+
+    def ready(self):
+        self.import_ms = (time.perf_counter() - self.started) * 1000
+
+    def _before(self):
+        if self._first_start is None:
+            with self._lock:
+                if self._first_start is None:
+                    self._first_start = time.perf_counter()
+
+    def _after(self, response):
+        if self.first_request_ms is None:
+            with self._lock:
+                if self.first_request_ms is None:
+                    now = time.perf_counter()
+                    self.first_request_ms = (now - self._first_start) * 1000
+                    self.first_response_ms = (now - self.started) * 1000
+                    print(f'Startup: import {self.import_ms:.1f} ms, first request '
+                          f'{self.first_request_ms:.1f} ms', file=sys.stderr, flush=True)
+        return response
+
+    def report(self):
+        return {
+            'import_ms': (round(self.import_ms, 1)
+                          if self.import_ms is not None else None),
+            'first_request_ms': (round(self.first_request_ms, 1)
+                                 if self.first_request_ms is not None else None),
+            'first_response_ms': (round(self.first_response_ms, 1)
+                                  if self.first_response_ms is not None else None)
+        }
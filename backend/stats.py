@@ -0,0 +1,163 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, func, literal, select, union, update
+from sqlalchemy.exc import IntegrityError
+from cache import bump_versions
+from database import db
+from models import Sweet, Customer, Order, TenantStats
+from query_budget import budget_exempt
+
+COUNTERS = ('total_sweets', 'total_customers', 'total_orders',
+            'pending_orders', 'total_revenue')
+REVENUE_TOLERANCE = 1e-6
+
+
+def stats_query(user_id):
+    """SELECT of the tenant's user_id and dashboard counters, aggregated from the base tables"""
+    total_sweets = select(func.count(Sweet.id)).where(
+        Sweet.user_id == user_id).scalar_subquery()
+    total_customers = select(func.count(Customer.id)).where(
+        Customer.user_id == user_id).scalar_subquery()
+    return select(
+        literal(user_id),
+        total_sweets,
+        total_customers,
+        func.count(Order.id),
+        func.coalesce(func.sum(case((Order.status == 'pending', 1), else_=0)), 0),
+        func.coalesce(func.sum(Order.total_amount), 0)
+    ).where(Order.user_id == user_id)
+
+
+def compute_stats(user_id):
+    """Aggregate a tenant's dashboard counters from the base tables in one SELECT"""
+    row = db.session.execute(stats_query(user_id)).one()
+    return dict(zip(COUNTERS, row[1:]))
+
+
+def recompute_stats(user_id):
+    """Rebuild the tenant's stats row from scratch in the current transaction.
+
+    On PostgreSQL and SQLite the counters are aggregated and stored by a
+    single INSERT ... SELECT ... ON CONFLICT DO UPDATE, so two requests
+    racing to create a tenant's first row both succeed. Elsewhere the first
+    row is inserted in a savepoint and the loser updates the winner's row.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(TenantStats).from_select(
+            ['user_id', *COUNTERS], stats_query(user_id))
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={name: stmt.excluded[name] for name in COUNTERS}))
+        return db.session.get(TenantStats, user_id, populate_existing=True)
+
+    stats = db.session.get(TenantStats, user_id)
+    counters = compute_stats(user_id)
+    if stats is None:
+        try:
+            with db.session.begin_nested():
+                stats = TenantStats(user_id=user_id, **counters)
+                db.session.add(stats)
+            return stats
+        except IntegrityError:
+            stats = db.session.get(TenantStats, user_id)
+    for name, value in counters.items():
+        setattr(stats, name, value)
+    db.session.flush()
+    return stats
+
+
+def adjust_stats(user_id, **deltas):
+    """Apply counter deltas to the tenant's stats row in the current transaction.
+
+    Called by the write handlers before they commit, so the counters move
+    atomically with the rows they describe. A tenant without a stats row
+    yet gets one built from the (already flushed) base tables instead,
+    outside the route's query budget as it happens once per tenant.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    result = db.session.execute(
+        update(TenantStats)
+        .where(TenantStats.user_id == user_id)
+        .values({getattr(TenantStats, name): getattr(TenantStats, name) + delta
+                 for name, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        with budget_exempt():
+            recompute_stats(user_id)
+
+
+def get_stats(user_id):
+    """Return the tenant's stats row, building it on first use"""
+    stats = db.session.get(TenantStats, user_id)
+    if stats is None:
+        with budget_exempt():
+            stats = recompute_stats(user_id)
+            db.session.commit()
+    return stats
+
+
+def check_stats(user_id):
+    """Compare the stored counters with the base tables.
+
+    Returns a dict of {counter: {'stored': ..., 'actual': ...}} for every
+    counter that has drifted; an empty dict means the row is consistent.
+    """
+    stats = db.session.get(TenantStats, user_id)
+    actual = compute_stats(user_id)
+    drift = {}
+    for name, value in actual.items():
+        stored = getattr(stats, name) if stats else None
+        if stored is None or abs(stored - value) > REVENUE_TOLERANCE:
+            drift[name] = {'stored': stored, 'actual': value}
+    return drift
+
+
+def tenant_ids():
+    """Every user_id that owns at least one sweet, customer or order"""
+    query = union(
+        select(Sweet.user_id), select(Customer.user_id), select(Order.user_id))
+    return [row[0] for row in db.session.execute(query)]
+
+
+@click.group('stats')
+def stats_cli():
+    """Maintain the per-tenant dashboard counters"""
+
+
+@stats_cli.command('check')
+@with_appcontext
+def check_command():
+    """Report tenants whose stored counters have drifted"""
+    inconsistent = 0
+    for user_id in tenant_ids():
+        drift = check_stats(user_id)
+        if drift:
+            inconsistent += 1
+            click.echo(f'{user_id}: {drift}')
+    click.echo(f'{inconsistent} inconsistent tenant(s)')
+    if inconsistent:
+        raise SystemExit(1)
+
+
+@stats_cli.command('recompute')
+@with_appcontext
+def recompute_command():
+    """Rebuild the counters of every tenant from the base tables"""
+    count = 0
+    for user_id in tenant_ids():
+        recompute_stats(user_id)
+        bump_versions(user_id, 'stats')
+        count += 1
+    db.session.commit()
+    click.echo(f'Recomputed stats for {count} tenant(s)')
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app reads its configuration at import, so point it at a throwaway
+# database before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['QUERY_BUDGET'] = 'raise'
+
+from app import app as flask_app  # noqa: E402
+from migrations import upgrade  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    with flask_app.app_context():
+        upgrade()
+    # The first request checks the schema version; keep it out of counts
+    flask_app.test_client().get('/api/health')
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def tenant():
+    """A fresh user id, so tests never see each other's rows"""
+    return f'test-{uuid.uuid4().hex[:12]}'
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+import analytics
+
+
+class Tomorrow(datetime):
+    @classmethod
+    def utcnow(cls):
+        return datetime.utcnow() + timedelta(days=1)
+
+
+def test_default_revenue_window_rolls_over_at_midnight(client, tenant, monkeypatch):
+    headers = {'X-User-ID': tenant}
+    today = client.get('/api/analytics/revenue', headers=headers)
+    assert today.get_json()['to'] == datetime.utcnow().date().isoformat()
+
+    monkeypatch.setattr(analytics, 'datetime', Tomorrow)
+    revalidated = client.get('/api/analytics/revenue',
+                             headers={**headers, 'If-None-Match': today.headers['ETag']})
+    assert revalidated.status_code == 200
+    assert revalidated.get_json()['to'] == Tomorrow.utcnow().date().isoformat()
+
+
+def test_explicit_revenue_window_keeps_its_etag(client, tenant, monkeypatch):
+    headers = {'X-User-ID': tenant}
+    url = '/api/analytics/revenue?from=2025-01-01&to=2025-01-31'
+    first = client.get(url, headers=headers)
+
+    monkeypatch.setattr(analytics, 'datetime', Tomorrow)
+    assert client.get(url, headers={
+        **headers, 'If-None-Match': first.headers['ETag']}).status_code == 304
@@ -0,0 +1,36 @@
+import pytest
+
+
+@pytest.mark.parametrize('price, stock, error', [
+    ('nan', '1', 'price must be a finite number'),
+    ('inf', '1', 'price must be a finite number'),
+    ('1e999', '1', 'price must be a finite number'),
+    ('-1', '1', 'price must not be negative'),
+    ('1', 'inf', 'stock must be a number'),
+])
+def test_csv_rejects_bad_numbers(client, tenant, price, stock, error):
+    response = client.post('/api/sweets/bulk', headers={
+        'X-User-ID': tenant, 'Content-Type': 'text/csv'},
+        data=f'name,price,stock\nLadoo,{price},{stock}\nBarfi,2.5,4\n')
+    report = response.get_json()
+    assert report['imported'] == 1
+    assert report['errors'] == [{'row': 1, 'error': error}]
+
+
+def test_ndjson_rejects_overflowing_stock(client, tenant):
+    response = client.post('/api/sweets/bulk', headers={
+        'X-User-ID': tenant, 'Content-Type': 'application/x-ndjson'},
+        data='{"name": "Ladoo", "price": 1, "stock": 1e999}\n{"name": "Barfi", "price": NaN}\n')
+    report = response.get_json()
+    assert report['imported'] == 0
+    assert [error['error'] for error in report['errors']] == [
+        'stock must be a number', 'price must be a finite number']
+
+
+def test_ndjson_rejects_fractional_stock(client, tenant):
+    response = client.post('/api/sweets/bulk', headers={
+        'X-User-ID': tenant, 'Content-Type': 'application/x-ndjson'},
+        data='{"name": "Ladoo", "price": 1, "stock": 2.5}\n{"name": "Barfi", "price": 1, "stock": 3.0}\n')
+    report = response.get_json()
+    assert report['imported'] == 1
+    assert report['errors'] == [{'row': 1, 'error': 'stock must be a whole number'}]
@@ -0,0 +1,48 @@
+import pytest
+
+
+@pytest.fixture
+def order(client, tenant):
+    """A customer and a sweet, both embedded in one order"""
+    headers = {'X-User-ID': tenant}
+    customer = client.post('/api/customers', headers=headers,
+                           json={'name': 'Asha', 'email': 'asha@example.com'}).get_json()
+    sweet = client.post('/api/sweets', headers=headers,
+                        json={'name': 'Ladoo', 'price': 5, 'stock': 10}).get_json()
+    return client.post('/api/orders', headers=headers, json={
+        'customer_id': customer['id'],
+        'items': [{'sweet_id': sweet['id'], 'quantity': 2}],
+    }).get_json()
+
+
+def changes_after(client, tenant, write):
+    """The change feed for the writes made by write()"""
+    headers = {'X-User-ID': tenant}
+    cursor = client.get('/api/changes', headers=headers).get_json()['cursor']
+    write(headers)
+    return client.get(f'/api/changes?since={cursor}', headers=headers).get_json()['changes']
+
+
+def test_sweet_update_changes_its_orders(client, tenant, order):
+    sweet_id = order['items'][0]['sweet_id']
+    changes = changes_after(client, tenant, lambda headers: client.put(
+        f'/api/sweets/{sweet_id}', headers=headers, json={'name': 'Motichoor ladoo'}))
+
+    assert [sweet['id'] for sweet in changes['sweets']] == [sweet_id]
+    assert [o['id'] for o in changes['orders']] == [order['id']]
+    assert changes['orders'][0]['items'][0]['sweet']['name'] == 'Motichoor ladoo'
+
+
+@pytest.mark.parametrize('on_conflict, logged', [('update', True), ('skip', False)])
+def test_customer_upsert_changes_their_orders(client, tenant, order, on_conflict, logged):
+    changes = changes_after(client, tenant, lambda headers: client.post(
+        f'/api/customers/bulk?on_conflict={on_conflict}',
+        headers={**headers, 'Content-Type': 'text/csv'},
+        data='name,email\nAsha Rao,asha@example.com\nRavi,ravi@example.com\n'))
+
+    # A skipped customer is unchanged, so only the new one is logged
+    assert sorted(c['email'] for c in changes['customers']) == (
+        ['asha@example.com', 'ravi@example.com'] if logged else ['ravi@example.com'])
+    assert [o['id'] for o in changes['orders']] == ([order['id']] if logged else [])
+    if logged:
+        assert changes['orders'][0]['customer']['name'] == 'Asha Rao'
@@ -0,0 +1,51 @@
+import base64
+import io
+import random
+import threading
+
+import pytest
+
+import images
+from database import db
+from models import Image
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+def png_bytes():
+    """A PNG no other test has stored"""
+    buffer = io.BytesIO()
+    size = (random.randrange(8, 64), random.randrange(8, 64))
+    PIL.new('RGB', size, tuple(random.randrange(256) for _ in range(3))).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_upload_racing_an_identical_upload_returns_its_hash(app, client, tenant, monkeypatch):
+    data = png_bytes()
+    thumbnail = images.make_thumbnail
+    with app.app_context():
+        engine = db.engine
+
+    def insert_image(digest, content):
+        with engine.begin() as other:
+            other.execute(Image.__table__.insert().values(
+                hash=digest, content_type='image/png', data=content))
+
+    def racing_thumbnail(content):
+        # The other upload stores the same bytes right after our lookup
+        other = threading.Thread(target=insert_image, args=(
+            images.hashlib.sha256(content).hexdigest(), content))
+        other.start()
+        other.join()
+        return thumbnail(content)
+    monkeypatch.setattr(images, 'make_thumbnail', racing_thumbnail)
+
+    response = client.post('/api/images', headers={'X-User-ID': tenant}, json={
+        'data_url': 'data:image/png;base64,' + base64.b64encode(data).decode()})
+    assert response.status_code == 201
+    digest = response.get_json()['hash']
+    monkeypatch.undo()
+
+    response = client.get(f'/api/images/{digest}')
+    assert response.status_code == 200
+    assert response.data == data
@@ -0,0 +1,13 @@
+import pytest
+
+from database import db
+from migrations import explain, hot_queries
+
+HOT_QUERIES = dict(hot_queries())
+
+
+@pytest.mark.parametrize('label', HOT_QUERIES)
+def test_hot_query_uses_an_index(app, label):
+    with app.app_context(), db.engine.begin() as connection:
+        plan = explain(connection, HOT_QUERIES[label])
+    assert any('INDEX' in line.upper() for line in plan), plan
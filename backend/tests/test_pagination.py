@@ -0,0 +1,27 @@
+import base64
+import json
+
+import pytest
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def test_cursor_walks_the_list(client, tenant):
+    headers = {'X-User-ID': tenant}
+    for name in ('Ladoo', 'Barfi', 'Peda'):
+        client.post('/api/sweets', headers=headers, json={'name': name, 'price': 1})
+    first = client.get('/api/sweets?limit=2', headers=headers).get_json()
+    rest = client.get(f"/api/sweets?limit=2&cursor={first['next_cursor']}",
+                      headers=headers).get_json()
+    assert [s['name'] for s in first['items'] + rest['items']] == ['Ladoo', 'Barfi', 'Peda']
+    assert rest['next_cursor'] is None
+
+
+@pytest.mark.parametrize('values', [[{'a': 1}], [[1]], ['1'], [1.5], [True], [None], [1, 2]])
+def test_cursor_with_wrong_value_types_is_rejected(client, tenant, values):
+    response = client.get(f'/api/sweets?limit=1&cursor={cursor(values)}',
+                          headers={'X-User-ID': tenant})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,93 @@
+import pytest
+
+from sqlalchemy import text
+
+from cache import bump_versions, get_versions
+from database import db
+from datagen import generate
+from query_budget import QueryBudgetExceeded, budget_exempt, query_budget
+
+ORDER_COUNTS = (1, 10, 50)
+
+
+@pytest.fixture
+def seeded(app, tenant):
+    """One tenant per order count, each with as many sweets and customers"""
+    with app.app_context():
+        for count in ORDER_COUNTS:
+            generate(1, count, count, count, prefix=f'{tenant}-{count}-')
+        db.session.remove()
+    return {count: f'{tenant}-{count}-0' for count in ORDER_COUNTS}
+
+
+@pytest.mark.parametrize('url', [
+    '/api/orders',
+    '/api/orders?expand=customer,items.sweet',
+    '/api/orders?limit=100',
+    '/api/orders?stream=1',
+])
+def test_order_list_query_count_is_constant(client, seeded, url):
+    counts = {}
+    for count, user_id in seeded.items():
+        with query_budget() as budget:
+            response = client.get(url, headers={'X-User-ID': user_id})
+            body = response.get_json()
+        assert response.status_code == 200
+        assert len(body['items'] if 'limit=' in url else body) == count
+        counts[count] = budget.count
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_order_detail_query_count_is_constant(client, seeded):
+    counts = {}
+    for count, user_id in seeded.items():
+        headers = {'X-User-ID': user_id}
+        order_id = client.get('/api/orders?limit=1', headers=headers).get_json()['items'][0]['id']
+        with query_budget() as budget:
+            assert client.get(f'/api/orders/{order_id}', headers=headers).status_code == 200
+        counts[count] = budget.count
+    assert len(set(counts.values())) == 1, counts
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_order_export_query_count_is_constant(client, seeded, fmt):
+    counts = {}
+    for count, user_id in seeded.items():
+        with query_budget() as budget:
+            response = client.get(f'/api/orders/export?format={fmt}',
+                                  headers={'X-User-ID': user_id})
+            body = response.get_data(as_text=True)
+        assert response.status_code == 200
+        assert body
+        counts[count] = budget.count
+    assert set(counts.values()) == {1}, counts
+
+
+def test_budget_covers_streamed_body(app):
+    def body():
+        yield str(db.session.execute(text('SELECT 1')).scalar())
+
+    with app.app_context():
+        with query_budget(statements=0) as budget:
+            chunks = budget.covering(body())
+        with pytest.raises(QueryBudgetExceeded):
+            list(chunks)
+
+
+def test_version_bump_is_one_statement(app, tenant):
+    entities = ['changes', 'orders', 'sweets']
+    with app.app_context():
+        with query_budget(statements=1):
+            bump_versions(tenant, 'changes', 'orders')
+        with query_budget(statements=1):
+            bump_versions(tenant, *entities)
+        db.session.commit()
+        assert get_versions(tenant, entities) == [2, 2, 1]
+
+
+def test_budget_exempt_block_is_not_counted(app):
+    with app.app_context():
+        with query_budget(statements=0) as budget:
+            with budget_exempt():
+                db.session.execute(text('SELECT 1'))
+        assert budget.count == 0
@@ -0,0 +1,26 @@
+import pytest
+
+import search
+from database import db
+from models import Sweet
+
+
+@pytest.fixture
+def ladoos(app, tenant, monkeypatch):
+    """More name matches than one tier keeps, the best one written last"""
+    monkeypatch.setattr(search, 'CANDIDATES', 5)
+    with app.app_context():
+        db.session.add_all(
+            Sweet(user_id=tenant, name=f'Ladoo gift box {n}', price=5, quantity=1)
+            for n in range(10))
+        db.session.add(Sweet(user_id=tenant, name='Ladoo', price=5, quantity=1))
+        db.session.commit()
+
+
+@pytest.mark.usefixtures('ladoos')
+def test_best_match_survives_the_candidate_cut(client, tenant):
+    response = client.get('/api/sweets/search?q=lad&limit=3',
+                          headers={'X-User-ID': tenant})
+    assert response.status_code == 200
+    assert [sweet['name'] for sweet in response.get_json()] == [
+        'Ladoo', 'Ladoo gift box 0', 'Ladoo gift box 1']
@@ -0,0 +1,40 @@
+import threading
+
+import stats
+from database import db
+from models import Sweet, TenantStats
+
+
+def create_row_concurrently(app, monkeypatch):
+    """Make another connection insert the stats row right before ours is stored"""
+    query = stats.stats_query
+    with app.app_context():
+        engine = db.engine
+
+    def insert_row(uid):
+        with engine.begin() as other:
+            other.execute(TenantStats.__table__.insert().values(
+                user_id=uid, total_sweets=0, total_customers=0, total_orders=0,
+                pending_orders=0, total_revenue=0))
+
+    def racing_query(uid):
+        # On its own thread, so the request's query budget does not count it
+        other = threading.Thread(target=insert_row, args=(uid,))
+        other.start()
+        other.join()
+        return query(uid)
+    monkeypatch.setattr(stats, 'stats_query', racing_query)
+
+
+def test_dashboard_survives_racing_first_load(app, client, tenant, monkeypatch):
+    with app.app_context():
+        db.session.add(Sweet(user_id=tenant, name='Ladoo', price=5, quantity=3))
+        db.session.commit()
+    create_row_concurrently(app, monkeypatch)
+
+    response = client.get('/api/dashboard/stats', headers={'X-User-ID': tenant})
+    assert response.status_code == 200
+    assert response.get_json()['total_sweets'] == 1
+    monkeypatch.undo()
+    with app.app_context():
+        assert stats.check_stats(tenant) == {}
@@ -0,0 +1,96 @@
+import random
+import threading
+from collections import Counter
+
+import pytest
+
+from database import db
+from models import OrderItem, Sweet
+
+STOCK = 30
+
+
+@pytest.fixture
+def shop(client, tenant):
+    headers = {'X-User-ID': tenant}
+    customer = client.post('/api/customers', headers=headers, json={
+        'name': 'Till', 'email': f'{tenant}@example.com'}).get_json()
+    sweet_ids = [client.post('/api/sweets', headers=headers, json={
+        'name': f'Sweet {i}', 'price': 2.5, 'stock': STOCK}).get_json()['id']
+        for i in range(2)]
+    return headers, customer['id'], sweet_ids
+
+
+def stock_and_sold(app, sweet_ids):
+    with app.app_context():
+        remaining = dict(db.session.query(Sweet.id, Sweet.quantity)
+                         .filter(Sweet.id.in_(sweet_ids)).all())
+        sold = dict(db.session.query(OrderItem.sweet_id, db.func.sum(OrderItem.quantity))
+                    .filter(OrderItem.sweet_id.in_(sweet_ids))
+                    .group_by(OrderItem.sweet_id).all())
+    return remaining, sold
+
+
+def test_order_beyond_stock_changes_nothing(app, client, shop):
+    headers, customer_id, (first, second) = shop
+    response = client.post('/api/orders', headers=headers, json={
+        'customer_id': customer_id,
+        'items': [{'sweet_id': first, 'quantity': 1},
+                  {'sweet_id': second, 'quantity': STOCK + 1}]})
+    assert response.status_code == 400
+    assert stock_and_sold(app, [first, second]) == ({first: STOCK, second: STOCK}, {})
+
+
+def test_concurrent_orders_never_oversell(app, shop):
+    headers, customer_id, sweet_ids = shop
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def place_orders(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        for _ in range(10):
+            items = [{'sweet_id': sweet_id, 'quantity': rng.randint(1, 3)}
+                     for sweet_id in rng.sample(sweet_ids, rng.randint(1, len(sweet_ids)))]
+            response = client.post('/api/orders', headers=headers, json={
+                'customer_id': customer_id, 'items': items})
+            with lock:
+                statuses[response.status_code] += 1
+
+    threads = [threading.Thread(target=place_orders, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses[201] and set(statuses) <= {201, 400}, statuses
+    remaining, sold = stock_and_sold(app, sweet_ids)
+    for sweet_id in sweet_ids:
+        assert remaining[sweet_id] >= 0
+        assert remaining[sweet_id] + sold.get(sweet_id, 0) == STOCK
+
+
+def test_order_for_another_tenants_customer_is_refused(app, client, shop):
+    headers, _, (sweet_id, _) = shop
+    other = client.post('/api/customers', headers={'X-User-ID': 'someone-else'}, json={
+        'name': 'Not yours', 'email': 'not-yours@example.com'}).get_json()
+    response = client.post('/api/orders', headers=headers, json={
+        'customer_id': other['id'], 'items': [{'sweet_id': sweet_id, 'quantity': 1}]})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Customer not found'}
+    assert stock_and_sold(app, [sweet_id]) == ({sweet_id: STOCK}, {})
+
+
+@pytest.mark.parametrize('customer_id, items', [
+    (None, []),
+    ('abc', []),
+    ({'id': 1}, []),
+    ('own', 5),
+    ('own', [{'sweet_id': 'x', 'quantity': 1}]),
+])
+def test_malformed_order_is_a_bad_request(client, shop, customer_id, items):
+    headers, own_customer_id, _ = shop
+    response = client.post('/api/orders', headers=headers, json={
+        'customer_id': own_customer_id if customer_id == 'own' else customer_id,
+        'items': items})
+    assert response.status_code == 400
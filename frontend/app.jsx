@@ -4,6 +4,14 @@ const API_URL = (window.location.hostname === 'localhost' || window.location.hos
     ? 'http://localhost:5000/api' 
     : '/api';
 
+// Stored images are referenced as /api/images/<hash>; resolve them against
+// API_URL and optionally ask the server for its thumbnail rendition.
+const imageSrc = (url, size) => {
+    if (!url || !url.startsWith('/api/images/')) return url;
+    const src = API_URL + url.slice('/api'.length);
+    return size ? `${src}?size=${size}` : src;
+};
+
 axios.interceptors.request.use(function (config) {
     const user = window.currentUser;
     if (user && user.uid) {
@@ -14,11 +22,161 @@ axios.interceptors.request.use(function (config) {
     return Promise.reject(error);
 });
 
+// Conditional GETs: remember each response's ETag and body, send the ETag
+// back as If-None-Match and reuse the stored body when the API answers 304.
+const etagCache = new Map();
+const etagKey = (config) => `${window.currentUser?.uid}|${axios.getUri(config)}`;
+
+axios.interceptors.request.use(function (config) {
+    config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304;
+    if ((config.method || 'get') === 'get') {
+        const cached = etagCache.get(etagKey(config));
+        if (cached) {
+            config.headers['If-None-Match'] = cached.etag;
+        }
+    }
+    return config;
+});
+
+axios.interceptors.response.use(function (response) {
+    if ((response.config.method || 'get') !== 'get') {
+        return response;
+    }
+    const key = etagKey(response.config);
+    if (response.status === 304 && etagCache.has(key)) {
+        response.data = etagCache.get(key).data;
+        response.status = 200;
+    } else if (response.headers.etag) {
+        etagCache.set(key, { etag: response.headers.etag, data: response.data });
+    }
+    return response;
+});
+
+// Delta sync: after the first full load of a list, fetch only what changed
+// since the stored cursor and merge it in. Collections are kept per user and
+// entity so switching views does not reload whole lists.
+const collections = new Map();
+
+const mergeChanges = (items, upserts, deletedIds) => {
+    const gone = new Set(deletedIds);
+    const changed = new Map(upserts.map((item) => [item.id, item]));
+    const merged = items
+        .filter((item) => !gone.has(item.id))
+        .map((item) => {
+            const update = changed.get(item.id);
+            changed.delete(item.id);
+            return update || item;
+        });
+    return merged.concat([...changed.values()]);
+};
+
+const syncCollection = async (entity) => {
+    const key = `${window.currentUser?.uid}|${entity}`;
+    let collection = collections.get(key);
+    if (!collection) {
+        // Read the cursor before the list so no change falls between them
+        const head = await axios.get(`${API_URL}/changes`);
+        const response = await axios.get(`${API_URL}/${entity}`);
+        collection = { cursor: head.data.cursor, items: response.data };
+    }
+    try {
+        let more = true;
+        while (more) {
+            const response = await axios.get(`${API_URL}/changes`, {
+                params: { since: collection.cursor, entities: entity }
+            });
+            const { changes, deleted, cursor, has_more } = response.data;
+            collection = { cursor, items: mergeChanges(collection.items, changes[entity], deleted[entity]) };
+            more = has_more;
+        }
+    } catch (error) {
+        if (error.response?.status === 410) {
+            // Tombstones after our cursor were compacted away: reload fully
+            collections.delete(key);
+            return syncCollection(entity);
+        }
+        throw error;
+    }
+    collections.set(key, collection);
+    return collection.items;
+};
+
+// Live updates from /api/stream. EventSource cannot send X-User-ID, so the
+// stream is read with fetch. Each event names the lists that changed and the
+// open view syncs them with syncCollection.
+const liveListeners = new Set();
+
+const onLiveChange = (listener) => {
+    liveListeners.add(listener);
+    return () => liveListeners.delete(listener);
+};
+
+const liveEntities = (name, data) => {
+    if (name === 'deleted') return Object.keys(JSON.parse(data));
+    if (name === 'reset') return ['sweets', 'orders'];
+    return [name];
+};
+
+const startLiveUpdates = (signal) => {
+    let lastEventId = null;
+
+    const connect = async () => {
+        const headers = { 'X-User-ID': window.currentUser?.uid };
+        if (lastEventId) {
+            headers['Last-Event-ID'] = lastEventId;
+        }
+        const response = await fetch(`${API_URL}/stream`, { headers, signal });
+        if (!response.ok) {
+            throw new Error(`Event stream answered ${response.status}`);
+        }
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) return;
+            buffer += value;
+            let end;
+            while ((end = buffer.indexOf('\n\n')) >= 0) {
+                let name = 'message';
+                let data = '';
+                buffer.slice(0, end).split('\n').forEach((line) => {
+                    if (line.startsWith('event: ')) name = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                    else if (line.startsWith('id: ')) lastEventId = line.slice(4);
+                });
+                buffer = buffer.slice(end + 2);
+                if (data) {
+                    const entities = liveEntities(name, data);
+                    liveListeners.forEach((listener) => listener(entities));
+                }
+            }
+        }
+    };
+
+    (async () => {
+        while (!signal.aborted) {
+            try {
+                await connect();
+            } catch (error) {
+                if (signal.aborted) return;
+                console.error('Event stream dropped:', error);
+            }
+            await new Promise((resolve) => setTimeout(resolve, 3000));
+        }
+    })();
+};
+
 function App() {
     const [currentView, setCurrentView] = useState('dashboard');
     const [notification, setNotification] = useState(null);
     const [confirmDialog, setConfirmDialog] = useState(null);
 
+    useEffect(() => {
+        const controller = new AbortController();
+        startLiveUpdates(controller.signal);
+        return () => controller.abort();
+    }, []);
+
     const showNotification = (message, type = 'info') => {
         setNotification({ message, type });
         setTimeout(() => setNotification(null), 3000);
@@ -203,10 +361,13 @@ function Sweets({ showNotification, showConfirm }) {
         fetchSweets();
     }, []);
 
+    useEffect(() => onLiveChange((entities) => {
+        if (entities.includes('sweets')) fetchSweets();
+    }), []);
+
     const fetchSweets = async () => {
         try {
-            const response = await axios.get(`${API_URL}/sweets`);
-            setSweets(response.data);
+            setSweets(await syncCollection('sweets'));
         } catch (error) {
             console.error('Error fetching sweets:', error);
         } finally {
@@ -268,7 +429,7 @@ function Sweets({ showNotification, showConfirm }) {
                         <div key={sweet.id} className="product-card">
                             <div className="product-image">
                                 {sweet.image_url ? (
-                                    <img src={sweet.image_url} alt={sweet.name} />
+                                    <img src={imageSrc(sweet.image_url, 'thumb')} alt={sweet.name} />
                                 ) : (
                                     <span style={{ fontSize: '80px' }}>🍬</span>
                                 )}
@@ -326,25 +487,28 @@ function SweetModal({ sweet, onClose, onSuccess }) {
     });
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
-    const [imagePreview, setImagePreview] = useState(sweet?.image_url || '');
+    const [imagePreview, setImagePreview] = useState(imageSrc(sweet?.image_url) || '');
 
     const handleChange = (e) => {
         const { name, value } = e.target;
         setFormData({ ...formData, [name]: value });
         if (name === 'image_url') {
-            setImagePreview(value);
+            setImagePreview(imageSrc(value));
         }
     };
 
-    const handleImageUpload = (e) => {
+    const handleImageUpload = async (e) => {
         const file = e.target.files[0];
         if (file) {
-            const reader = new FileReader();
-            reader.onloadend = () => {
-                setFormData({ ...formData, image_url: reader.result });
-                setImagePreview(reader.result);
-            };
-            reader.readAsDataURL(file);
+            const upload = new FormData();
+            upload.append('file', file);
+            try {
+                const response = await axios.post(`${API_URL}/images`, upload);
+                setFormData({ ...formData, image_url: response.data.url });
+                setImagePreview(imageSrc(response.data.url));
+            } catch (err) {
+                setError(err.response?.data?.error || 'Failed to upload image');
+            }
         }
     };
 
@@ -395,7 +559,7 @@ function SweetModal({ sweet, onClose, onSuccess }) {
                     </div>
                     <div className="form-group">
                         <label className="form-label">Upload Image</label>
-                        <input type="file" accept="image/*" className="form-input" onChange={handleImageUpload} />
+                        <input type="file" accept="image/png,image/jpeg,image/gif,image/webp" className="form-input" onChange={handleImageUpload} />
                         <div style={{ marginTop: '12px' }}>
                             <label className="form-label">Or Enter Image URL</label>
                             <input type="text" name="image_url" className="form-input" placeholder="https://example.com/sweet.jpg" value={formData.image_url} onChange={handleChange} />
@@ -430,8 +594,7 @@ function Customers({ showNotification, showConfirm }) {
 
     const fetchCustomers = async () => {
         try {
-            const response = await axios.get(`${API_URL}/customers`);
-            setCustomers(response.data);
+            setCustomers(await syncCollection('customers'));
         } catch (error) {
             console.error('Error fetching customers:', error);
         } finally {
@@ -588,10 +751,13 @@ function Orders({ showNotification, showConfirm }) {
         fetchOrders();
     }, []);
 
+    useEffect(() => onLiveChange((entities) => {
+        if (entities.includes('orders')) fetchOrders();
+    }), []);
+
     const fetchOrders = async () => {
         try {
-            const response = await axios.get(`${API_URL}/orders`);
-            setOrders(response.data);
+            setOrders(await syncCollection('orders'));
         } catch (error) {
             console.error('Error fetching orders:', error);
         } finally {
@@ -708,18 +874,51 @@ function StatusModal({ order, onClose, onSuccess }) {
     );
 }
 
+// Typeahead over /api/<resource>/search: shows the best matches as the user
+// types and reports the picked row's id.
+function SearchSelect({ resource, fields, label, placeholder, onSelect }) {
+    const [query, setQuery] = useState('');
+    const [results, setResults] = useState([]);
+    const [open, setOpen] = useState(false);
+
+    useEffect(() => {
+        if (!open || !query.trim()) {
+            setResults([]);
+            return;
+        }
+        let cancelled = false;
+        const timer = setTimeout(() => {
+            axios.get(`${API_URL}/${resource}/search`, { params: { q: query, limit: 8, fields } })
+                .then(res => { if (!cancelled) setResults(res.data); });
+        }, 150);
+        return () => { cancelled = true; clearTimeout(timer); };
+    }, [query, open]);
+
+    const pick = (row) => {
+        setQuery(label(row));
+        setOpen(false);
+        onSelect(row.id);
+    };
+
+    return (
+        <div className="search-select">
+            <input type="text" className="form-input" placeholder={placeholder} value={query}
+                onChange={(e) => { setQuery(e.target.value); setOpen(true); onSelect(''); }}
+                onBlur={() => setTimeout(() => setOpen(false), 150)} required />
+            {open && results.length > 0 && (
+                <ul className="search-results">
+                    {results.map(row => <li key={row.id} onMouseDown={() => pick(row)}>{label(row)}</li>)}
+                </ul>
+            )}
+        </div>
+    );
+}
+
 function OrderModal({ onClose, onSuccess }) {
-    const [customers, setCustomers] = useState([]);
-    const [sweets, setSweets] = useState([]);
     const [formData, setFormData] = useState({ customer_id: '', items: [] });
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
 
-    useEffect(() => {
-        axios.get(`${API_URL}/customers`).then(res => setCustomers(res.data));
-        axios.get(`${API_URL}/sweets`).then(res => setSweets(res.data));
-    }, []);
-
     const addItem = () => setFormData({ ...formData, items: [...formData.items, { sweet_id: '', quantity: 1 }] });
     const updateItem = (index, field, value) => {
         const newItems = [...formData.items];
@@ -730,6 +929,10 @@ function OrderModal({ onClose, onSuccess }) {
 
     const handleSubmit = async (e) => {
         e.preventDefault();
+        if (!formData.customer_id || formData.items.some(item => !item.sweet_id)) {
+            setError('Pick the customer and every sweet from the suggestions');
+            return;
+        }
         setLoading(true);
         setError('');
         try {
@@ -753,19 +956,15 @@ function OrderModal({ onClose, onSuccess }) {
                 <form onSubmit={handleSubmit}>
                     <div className="form-group">
                         <label className="form-label">Customer</label>
-                        <select className="form-select" value={formData.customer_id} onChange={(e) => setFormData({ ...formData, customer_id: e.target.value })} required>
-                            <option value="">Select Customer</option>
-                            {customers.map(c => <option key={c.id} value={c.id}>{c.name}</option>)}
-                        </select>
+                        <SearchSelect resource="customers" fields="name,email" placeholder="Search customers by name, email or phone"
+                            label={c => `${c.name} (${c.email})`} onSelect={id => setFormData(data => ({ ...data, customer_id: id }))} />
                     </div>
                     <div className="form-group">
                         <label className="form-label">Order Items</label>
                         {formData.items.map((item, index) => (
                             <div key={index} style={{ display: 'flex', gap: '10px', marginBottom: '10px' }}>
-                                <select className="form-select" value={item.sweet_id} onChange={(e) => updateItem(index, 'sweet_id', e.target.value)} required>
-                                    <option value="">Select Sweet</option>
-                                    {sweets.map(s => <option key={s.id} value={s.id}>{s.name} - ₹{s.price}/kg</option>)}
-                                </select>
+                                <SearchSelect resource="sweets" fields="name,price" placeholder="Search sweets"
+                                    label={s => `${s.name} - ₹${s.price}/kg`} onSelect={id => updateItem(index, 'sweet_id', id)} />
                                 <input type="number" className="form-input" placeholder="Qty (kg)" value={item.quantity} onChange={(e) => updateItem(index, 'quantity', e.target.value)} min="1" required style={{ width: '120px' }} />
                                 <button type="button" className="btn btn-danger btn-sm" onClick={() => removeItem(index)}>Remove</button>
                             </div>